@@ -1,17 +1,63 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from app.routes import ai_routes
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
-# Cargar variables de entorno
+# Cargar variables de entorno (antes de importar los módulos que leen su configuración)
 load_dotenv()
 
+from fastapi import FastAPI, Response
+from fastapi.middleware.cors import CORSMiddleware
+from app.routes import ai_routes
+from app.services.providers import PROVIDER_CLASSES
+from app.services.metrics import (
+    metrics_middleware, monitor_event_loop_lag, register_analyzer, render_metrics, STARTUP_SECONDS
+)
+
+# Presupuesto de arranque (importaciones + lifespan) y calentamiento opcional de
+# proveedores: off (en la primera solicitud), startup (antes de servir) o background
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", 1500))
+AI_WARMUP = os.getenv("AI_WARMUP", "off")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranque liviano: los SDK de IA se importan en el primer uso o en el calentamiento"""
+    analyzer = ai_routes.get_analyzer()
+    register_analyzer(analyzer)
+    loop_lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    warmup = None
+    if AI_WARMUP == "startup":
+        await analyzer.ai_service.warm_up()
+    elif AI_WARMUP == "background":
+        warmup = asyncio.create_task(analyzer.ai_service.warm_up())
+
+    # Solo el primer arranque del proceso se mide contra la importación
+    if getattr(app.state, "startup_ms", None) is None:
+        elapsed = time.perf_counter() - _IMPORT_STARTED
+        STARTUP_SECONDS.set(elapsed)
+        app.state.startup_ms = elapsed * 1000
+        budget = "✅" if elapsed * 1000 <= STARTUP_BUDGET_MS else "⚠️  excede el presupuesto de"
+        print(f"{budget} Arranque en {elapsed * 1000:.0f} ms (presupuesto {STARTUP_BUDGET_MS:.0f} ms)")
+
+    yield
+
+    # Cerrar el pool de conexiones de los proveedores de IA
+    loop_lag_monitor.cancel()
+    if warmup is not None:
+        warmup.cancel()
+    await ai_routes.close_job_manager()
+    await analyzer.ai_service.close()
+    analyzer.compute_pool.shutdown()
+
 # Crear aplicación
 app = FastAPI(
     title="Finanzas Smart AI Service",
     description="Servicio de IA con DeepSeek para análisis financiero",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -25,9 +71,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Métricas: latencia por ruta y estadísticas del analizador en /metrics
+app.middleware("http")(metrics_middleware)
+
 # Registrar rutas
 app.include_router(ai_routes.router)
 
+@app.get("/metrics")
+async def metrics():
+    """Métricas en formato Prometheus"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -42,15 +97,16 @@ async def root():
 async def health_check():
     """Verificar estado del servicio"""
     try:
-        # Verificar que la API key esté configurada
-        api_key = os.getenv("DEEPSEEK_API_KEY")
-        if not api_key:
-            return {"status": "error", "message": "API key no configurada"}
+        # Verificar que la API key del proveedor principal esté configurada
+        ai_service = ai_routes.get_analyzer().ai_service
+        key_var = PROVIDER_CLASSES[ai_service.provider][1]
+        if key_var and not os.getenv(key_var):
+            return {"status": "error", "message": f"API key no configurada ({key_var})"}
         
         return {
             "status": "healthy",
             "api_configured": True,
-            "deepseek": "ready"
+            ai_service.provider: "ready" if ai_service.initialized else "lazy"
         }
     except Exception as e:
         return {"status": "error", "message": str(e)}
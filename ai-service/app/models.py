@@ -1,7 +1,32 @@
-from pydantic import BaseModel, Field
+import re
+import calendar
+from functools import lru_cache
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List, Dict
 from datetime import datetime
 
+_FECHA = re.compile(r"(\d{4})-(\d{2})(?:-(\d{2}))?")
+
+@lru_cache(maxsize=8192)
+def _fecha_existe(prefix: str) -> bool:
+    """'YYYY-MM' o 'YYYY-MM-DD' de un mes y día que existen (las fechas se repiten mucho)"""
+    match = _FECHA.fullmatch(prefix)
+    if match is None:
+        return False
+    year, month, day = int(match[1]), int(match[2]), match[3]
+    return 1 <= month <= 12 and (day is None or 1 <= int(day) <= calendar.monthrange(year, month)[1])
+
+def validate_fecha(fecha: str) -> str:
+    """
+    Aceptar 'YYYY-MM' o 'YYYY-MM-DD' (con hora opcional después), lo mismo que la tabla columnar
+
+    Raises:
+        ValueError: si el mes o el día no existen o el formato es otro
+    """
+    if not _fecha_existe(fecha[:10]):
+        raise ValueError(f"Fecha inválida: {fecha!r} (usa YYYY-MM-DD)")
+    return fecha
+
 class Transaction(BaseModel):
     """Modelo de transacción financiera"""
     id: Optional[int] = None
@@ -12,6 +37,18 @@ class Transaction(BaseModel):
     fecha: str
     tipo: str  # 'gasto' o 'ingreso'
 
+    @field_validator("fecha")
+    @classmethod
+    def _fecha_valida(cls, fecha: str) -> str:
+        return validate_fecha(fecha)
+
+class Budget(BaseModel):
+    """Presupuesto mensual de una categoría de gasto"""
+    id: Optional[int] = None
+    categoria: str
+    monto_limite: float
+    mes: str = Field(pattern=r"^\d{4}-(0[1-9]|1[0-2])(-\d{2})?$")  # 'YYYY-MM' (o una fecha dentro del mes)
+
 class ChatMessage(BaseModel):
     """Mensaje de chat"""
     role: str  # 'user' o 'assistant'
@@ -22,28 +59,61 @@ class ChatRequest(BaseModel):
     message: str
     conversation_history: List[ChatMessage] = []
     user_id: Optional[str] = None
+    session_id: Optional[str] = None  # conversación; reutiliza su resumen de historial
 
 class FinancialData(BaseModel):
     """Datos financieros del usuario"""
     gastos: List[Transaction] = []
     ingresos: List[Transaction] = []
-    presupuestos: List[Dict] = []
+    presupuestos: List[Budget] = []
     
 class AnalysisRequest(BaseModel):
     """Solicitud de análisis financiero"""
-    financial_data: FinancialData
+    financial_data: Optional[FinancialData] = None
     analysis_type: str = "complete"  # complete, spending, savings, budget
+    user_id: Optional[str] = None  # usa el resumen guardado si no se envía financial_data
+
+class BudgetRequest(BaseModel):
+    """Solicitud de seguimiento de presupuestos"""
+    financial_data: Optional[FinancialData] = None
+    user_id: Optional[str] = None  # usa el resumen guardado si no se envía financial_data
+    fecha_referencia: Optional[str] = None  # 'YYYY-MM-DD'; por omisión, hoy
+
+class PatternRequest(BaseModel):
+    """Solicitud de detección de pagos recurrentes y gastos inusuales"""
+    financial_data: FinancialData
+    max_results: Optional[int] = Field(None, ge=1, le=500)  # por omisión PATTERN_MAX_RESULTS
+
+class SummaryDelta(BaseModel):
+    """Cambios en las transacciones de un usuario"""
+    added: List[Transaction] = []
+    removed: List[Transaction] = []
+    presupuestos: Optional[List[Budget]] = None  # reemplaza los presupuestos si se envía
     
 class CategorizationRequest(BaseModel):
     """Solicitud de categorización automática"""
     descripcion: str
     monto: float
     tipo: str  # 'gasto' o 'ingreso'
+    user_id: Optional[str] = None  # cuota de admisión; en un lote cuenta el del lote
+
+class CategorizationFeedback(BaseModel):
+    """Categoría confirmada por el usuario para una transacción"""
+    descripcion: str
+    tipo: str  # 'gasto' o 'ingreso'
+    categoria: str
+
+class BatchCategorizationRequest(BaseModel):
+    """Solicitud de categorización de muchas transacciones"""
+    transactions: List[CategorizationRequest]
+    user_id: Optional[str] = None  # cuota de admisión (o header X-User-Id)
 
 class PredictionRequest(BaseModel):
     """Solicitud de predicción de gastos"""
     historical_data: List[Transaction]
-    months_ahead: int = 1
+    months_ahead: int = Field(1, ge=1, le=24)
+    narrate: bool = False  # pedir a la IA una explicación de los números
+    user_id: Optional[str] = None  # cuota de admisión (o header X-User-Id)
 
 class ChatResponse(BaseModel):
     """Respuesta de chat"""
@@ -56,9 +126,123 @@ class AnalysisResponse(BaseModel):
     insights: List[str] = []
     recommendations: List[str] = []
     risk_level: Optional[str] = None
+    metrics: Optional[Dict] = None
     
 class CategorizationResponse(BaseModel):
     """Respuesta de categorización"""
     categoria: str
     confidence: float
     reasoning: Optional[str] = None
+
+class CategorizationItem(CategorizationResponse):
+    """Categoría que devuelve el modelo para una transacción de un lote (id del prompt)"""
+    id: int
+    confidence: float = 0.8
+
+class BatchCategorizationResult(BaseModel):
+    """Respuesta estructurada del modelo para un lote de categorización"""
+    resultados: List[CategorizationItem]
+
+class BatchCategorizationItem(BaseModel):
+    """Resultado de categorización de una transacción dentro de un lote"""
+    index: int
+    categoria: str
+    confidence: float
+    reasoning: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchCategorizationResponse(BaseModel):
+    """Respuesta de categorización por lotes"""
+    results: List[BatchCategorizationItem]
+    failed: int = 0
+    chunks: int = 0
+
+class ForecastPoint(BaseModel):
+    """Predicción de un mes con intervalo de confianza del 95%"""
+    mes: str
+    monto: float
+    lower: float
+    upper: float
+
+class CategoryForecast(BaseModel):
+    """Predicciones mensuales de una categoría"""
+    categoria: str
+    predicciones: List[ForecastPoint]
+
+class PredictionResponse(BaseModel):
+    """Respuesta de predicción de gastos"""
+    months: List[str]
+    categories: List[CategoryForecast]
+    total: List[ForecastPoint]
+    methods: List[str] = []
+    history_months: int = 0
+    narrative: Optional[str] = None
+
+class BudgetStatus(BaseModel):
+    """Presupuesto contra gasto real de una categoría en un mes"""
+    categoria: str
+    mes: str
+    limite: float
+    gastado: float
+    disponible: float
+    utilizacion: float  # % del límite ya gastado
+    dias_transcurridos: int
+    dias_mes: int
+    gasto_diario: float  # ritmo de gasto (burn rate) en el periodo transcurrido
+    proyeccion: float  # gasto estimado al cierre del mes con el ritmo actual
+    exceso_proyectado: float  # proyección - límite (0 si no se excede)
+    estado: str  # 'excedido', 'en_riesgo', 'ok' o 'futuro'
+
+class BudgetReport(BaseModel):
+    """Seguimiento de todos los presupuestos"""
+    fecha_referencia: str
+    presupuestos: List[BudgetStatus]
+    excedidos: int = 0
+    en_riesgo: int = 0
+    total_limite: float = 0.0
+    total_gastado: float = 0.0
+
+class RecurringCharge(BaseModel):
+    """Pago periódico detectado en el historial"""
+    descripcion: str
+    categoria: str
+    periodicidad: str  # 'semanal', 'quincenal', 'mensual', ... 'anual'
+    intervalo_dias: float
+    monto: float  # monto típico (mediana)
+    ocurrencias: int
+    ultima_fecha: str
+    proxima_fecha: str
+    costo_mensual: float
+    activa: bool
+
+class UnusualExpense(BaseModel):
+    """Gasto inusualmente alto para su categoría"""
+    id: Optional[int] = None
+    fecha: str
+    monto: float
+    categoria: str
+    descripcion: Optional[str] = None
+    mediana_categoria: float
+    veces_mediana: Optional[float] = None
+    puntaje: float  # puntaje z robusto (mediana/MAD)
+
+class PatternReport(BaseModel):
+    """Pagos recurrentes y gastos inusuales"""
+    recurrentes: List[RecurringCharge]
+    inusuales: List[UnusualExpense]
+    recurrentes_activos: int = 0
+    gasto_recurrente_mensual: float = 0.0  # suma del costo mensual de los pagos activos
+
+class JobInfo(BaseModel):
+    """Estado de un trabajo asíncrono"""
+    id: str
+    kind: str  # 'analysis', 'categorization' o 'forecast'
+    status: str  # 'queued', 'running', 'succeeded' o 'failed'
+    created_at: float  # segundos desde epoch
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    expires_at: Optional[float] = None  # el resultado se borra después
+    result: Optional[Dict] = None  # respuesta de la ruta equivalente
+    error: Optional[str] = None
+    status_code: Optional[int] = None  # código HTTP que habría devuelto la ruta al fallar
+    reused: bool = False  # el envío reutilizó un trabajo con la misma clave de idempotencia
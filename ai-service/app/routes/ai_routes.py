@@ -1,93 +1,725 @@
-from fastapi import APIRouter, HTTPException
+import json
+import unicodedata
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Dict, Tuple
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.background import BackgroundTask
 from app.models import (
     ChatRequest, ChatResponse,
     AnalysisRequest, AnalysisResponse,
-    CategorizationRequest, CategorizationResponse
+    CategorizationRequest, CategorizationResponse, CategorizationFeedback,
+    BatchCategorizationRequest, BatchCategorizationResponse,
+    FinancialData, SummaryDelta,
+    PredictionRequest, PredictionResponse,
+    BudgetRequest, BudgetReport,
+    PatternRequest, PatternReport,
+    JobInfo
 )
 from app.services.financial_analyzer import FinancialAnalyzer
+from app.services.conversation_history import with_summary
+from app.services.request_scheduler import PRIORITY_INTERACTIVE
+from app.services.ingestion import StreamingIngestor, format_from_content_type
+from app.services.job_queue import JobManager, JobQueueFull, IdempotencyConflict, FINISHED
+from app.services.admission import AdmissionController, AdmissionRejected, Ticket
 
 router = APIRouter(prefix="/api/ai", tags=["AI"])
 
-analyzer = FinancialAnalyzer()
+# Se construye en el primer uso: importar las rutas no importa los SDK ni exige API keys
+_analyzer: Optional[FinancialAnalyzer] = None
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+def get_analyzer() -> FinancialAnalyzer:
+    """Analizador compartido (dependencia de FastAPI)"""
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = FinancialAnalyzer()
+    return _analyzer
+
+_admission: Optional[AdmissionController] = None
+
+def get_admission() -> AdmissionController:
+    """Control de admisión compartido por las rutas que llaman al modelo"""
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController()
+    return _admission
+
+def _client_identity(http_request: Request, user_id: Optional[str] = None) -> Tuple[str, bool]:
     """
-    Endpoint de chat con contexto financiero
+    Usuario para las cuotas: (user_id o header X-User-Id, False) o (IP del cliente, True)
+
+    El backend reenvía todo desde una sola IP: debe enviar el usuario para
+    que cada uno tenga su cuota y no compartan la de la IP.
     """
+    user = user_id or http_request.headers.get("x-user-id")
+    if user:
+        return user, False
+    return (http_request.client.host if http_request.client else "anonimo"), True
+
+def _request_timeout(http_request: Request) -> Optional[float]:
+    """Segundos que el cliente acepta esperar (header X-Request-Timeout), si es válido"""
     try:
-        # Por ahora, chat simple sin datos financieros
-        # TODO: Integrar con backend de Node.js para obtener datos del usuario
-        
-        messages = [{"role": msg.role, "content": msg.content} for msg in request.conversation_history]
-        
-        response = await analyzer.deepseek.chat_completion(
-            messages=[
-                {"role": "system", "content": "Eres un asistente financiero amigable. Responde en español de forma concisa."},
-                *messages,
-                {"role": "user", "content": request.message}
-            ],
-            temperature=0.7
-        )
-        
-        return ChatResponse(
-            message=response,
-            metadata={"model": "deepseek-chat"}
+        timeout = float(http_request.headers.get("x-request-timeout", ""))
+    except ValueError:
+        return None
+    return timeout if timeout > 0 else None
+
+def _rejected(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+async def _admit(http_request: Request, user_id: Optional[str] = None, degradable: bool = False) -> Ticket:
+    """Turno del control de admisión; 429/503 inmediato con Retry-After si no lo hay"""
+    try:
+        key, by_ip = _client_identity(http_request, user_id)
+        return await get_admission().acquire(key, degradable, _request_timeout(http_request), by_ip)
+    except AdmissionRejected as e:
+        raise _rejected(e)
+
+@asynccontextmanager
+async def _admitted(http_request: Request, response: Response, user_id: Optional[str] = None, degradable: bool = False):
+    """
+    Ejecutar el cuerpo con un turno admitido y liberarlo al terminar
+
+    Si el turno es degradado la respuesta lleva X-Degraded con el motivo y el
+    cuerpo debe resolverse sin llamar al proveedor (ticket.degraded).
+    """
+    ticket = await _admit(http_request, user_id, degradable)
+    if ticket.degraded:
+        # Los headers viajan en ASCII: "límite" llegaría como latin-1 inválido en UTF-8
+        response.headers["X-Degraded"] = (
+            unicodedata.normalize("NFKD", ticket.degraded).encode("ascii", "ignore").decode()
         )
+    try:
+        yield ticket
+    finally:
+        ticket.release()
+
+SIMPLE_CHAT_PROMPT = "Eres un asistente financiero amigable. Responde en español de forma concisa."
+
+async def _simple_chat_messages(analyzer: FinancialAnalyzer, request: ChatRequest):
+    """Mensajes para el chat simple sin datos financieros, con historial compactado"""
+    messages = [{"role": msg.role, "content": msg.content} for msg in request.conversation_history]
+    summary, recent = await analyzer.history_manager.compact(messages, request.session_id)
+    return [
+        {"role": "system", "content": with_summary(SIMPLE_CHAT_PROMPT, summary)},
+        *recent,
+        {"role": "user", "content": request.message}
+    ]
+
+async def _sse(deltas: AsyncIterator[str], ticket: Ticket = None) -> AsyncIterator[str]:
+    """
+    Convertir fragmentos de texto en eventos SSE
+    
+    Cada fragmento se envía como `data: {"delta": "..."}` y el final con
+    `data: [DONE]`. Si el cliente se desconecta, Starlette cancela este
+    generador y el flujo con el proveedor se cierra. El turno de admisión
+    se ocupa hasta el final del flujo.
+    """
+    try:
+        async for delta in deltas:
+            yield f"data: {json.dumps({'delta': delta}, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)}, ensure_ascii=False)}\n\n"
+    finally:
+        await deltas.aclose()
+        if ticket is not None:
+            ticket.release()
+
+def _sse_response(deltas: AsyncIterator[str], ticket: Ticket = None) -> StreamingResponse:
+    """Respuesta text/event-stream sin buffering en proxies"""
+    return StreamingResponse(
+        _sse(deltas, ticket),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Libera el turno también si el flujo nunca llega a empezar (release es idempotente)
+        background=BackgroundTask(ticket.release) if ticket is not None else None
+    )
+
+def _resolve_financial_data(
+    analyzer: FinancialAnalyzer,
+    financial_data: Optional[FinancialData],
+    user_id: Optional[str]
+) -> Tuple[FinancialData, Optional[Dict]]:
+    """
+    Usar los datos enviados o, si faltan, el resumen guardado del usuario
+    
+    Returns:
+        (datos financieros, métricas precalculadas o None)
+    """
+    if financial_data is not None or not user_id:
+        return financial_data or FinancialData(), None
+    
+    summary = analyzer.summary_store.get(user_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"No hay resumen financiero para el usuario {user_id}")
+    return FinancialData(presupuestos=summary.presupuestos), summary.metrics()
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(
+    request: ChatRequest,
+    http_request: Request,
+    response: Response,
+    analyzer: FinancialAnalyzer = Depends(get_analyzer)
+):
+    """
+    Endpoint de chat con contexto financiero
+    """
+    async with _admitted(http_request, response, request.user_id):
+        try:
+            # Por ahora, chat simple sin datos financieros
+            # TODO: Integrar con backend de Node.js para obtener datos del usuario
+            
+            reply = await analyzer.ai_service.chat_completion(
+                messages=await _simple_chat_messages(analyzer, request),
+                temperature=0.7,
+                session_id=request.session_id,
+                priority=PRIORITY_INTERACTIVE
+            )
+            
+            return ChatResponse(
+                message=reply,
+                metadata={"model": analyzer.ai_service.model_name}
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request, analyzer: FinancialAnalyzer = Depends(get_analyzer)):
+    """
+    Chat simple con respuesta en streaming (Server-Sent Events)
+    """
+    ticket = await _admit(http_request, request.user_id)
+    try:
+        messages = await _simple_chat_messages(analyzer, request)
+    except BaseException:
+        ticket.release()
+        raise
+    return _sse_response(
+        analyzer.ai_service.chat_completion_stream(
+            messages=messages,
+            temperature=0.7,
+            session_id=request.session_id,
+            priority=PRIORITY_INTERACTIVE
+        ),
+        ticket
+    )
+
+@router.get("/providers")
+async def provider_stats(analyzer: FinancialAnalyzer = Depends(get_analyzer)):
+    """
+    Estado de los proveedores de IA: circuit breakers, latencias y coberturas
+    """
+    return analyzer.ai_service.stats()
+
+@router.get("/queue")
+async def queue_stats(analyzer: FinancialAnalyzer = Depends(get_analyzer)):
+    """
+    Cola hacia los proveedores: profundidad, tiempos de espera, coalescencia y micro-lotes
+    """
+    return analyzer.ai_service.queue_stats()
+
+@router.get("/admission")
+async def admission_stats():
+    """
+    Control de admisión: lugares en curso, cola, cuotas y decisiones (admitidas, degradadas, rechazadas)
+    """
+    return get_admission().stats()
+
+@router.get("/compute")
+async def compute_stats(analyzer: FinancialAnalyzer = Depends(get_analyzer)):
+    """
+    Pool de cómputo local: modo, umbral y cálculos hechos en el loop o fuera de él
+    """
+    return analyzer.compute_pool.stats()
 
 @router.post("/analyze", response_model=AnalysisResponse)
-async def analyze_finances(request: AnalysisRequest):
+async def analyze_finances(
+    request: AnalysisRequest,
+    http_request: Request,
+    response: Response,
+    analyzer: FinancialAnalyzer = Depends(get_analyzer)
+):
     """
-    Generar análisis financiero completo
+    Generar análisis financiero (complete, spending, savings o budget)
+
+    Con el servicio saturado responde el análisis guardado o uno local sin IA (header X-Degraded).
     """
+    async with _admitted(http_request, response, request.user_id, degradable=True) as ticket:
+        return await _analysis(request, analyzer, ticket.degraded is not None)
+
+async def _analysis(request: AnalysisRequest, analyzer: FinancialAnalyzer, degraded: bool = False) -> AnalysisResponse:
+    financial_data, metrics = _resolve_financial_data(analyzer, request.financial_data, request.user_id)
     try:
-        result = await analyzer.generate_complete_analysis(request.financial_data)
+        result = await analyzer.analyze(
+            financial_data,
+            metrics,
+            analysis_type=request.analysis_type,
+            degraded=degraded
+        )
         
         return AnalysisResponse(
             analysis=result["analysis"],
             insights=result["insights"],
             recommendations=result["recommendations"],
-            risk_level=result["risk_level"]
+            risk_level=result["risk_level"],
+            metrics=result.get("metrics")
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en análisis: {str(e)}")
 
+@router.get("/analyze/cache")
+async def analysis_cache_stats(analyzer: FinancialAnalyzer = Depends(get_analyzer)):
+    """
+    Estadísticas de la caché de análisis
+    """
+    return analyzer.analysis_cache.stats()
+
+@router.post("/predict", response_model=PredictionResponse)
+async def predict_spending(
+    request: PredictionRequest,
+    http_request: Request,
+    response: Response,
+    analyzer: FinancialAnalyzer = Depends(get_analyzer)
+):
+    """
+    Pronosticar el gasto mensual por categoría
+
+    Sin `narrate` no se llama al modelo; con el servicio saturado se omite la narrativa.
+    """
+    if not request.narrate:
+        return await _prediction(request, analyzer)
+    async with _admitted(http_request, response, request.user_id, degradable=True) as ticket:
+        return await _prediction(request, analyzer, ticket.degraded is not None)
+
+async def _prediction(request: PredictionRequest, analyzer: FinancialAnalyzer, degraded: bool = False) -> PredictionResponse:
+    try:
+        result = await analyzer.predict_spending(
+            request.historical_data,
+            request.months_ahead,
+            request.narrate and not degraded
+        )
+        
+        return PredictionResponse(**result)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en predicción: {str(e)}")
+
+@router.post("/budgets", response_model=BudgetReport)
+async def track_budgets(request: BudgetRequest, analyzer: FinancialAnalyzer = Depends(get_analyzer)):
+    """
+    Presupuesto vs gasto real: utilización, ritmo y proyección al cierre (sin IA)
+    """
+    financial_data, metrics = _resolve_financial_data(analyzer, request.financial_data, request.user_id)
+    try:
+        return await analyzer.track_budgets(financial_data, metrics, request.fecha_referencia)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en presupuestos: {str(e)}")
+
+@router.get("/budgets/{user_id}", response_model=BudgetReport)
+async def user_budgets(
+    user_id: str,
+    fecha_referencia: Optional[str] = None,
+    analyzer: FinancialAnalyzer = Depends(get_analyzer)
+):
+    """
+    Presupuestos de un usuario contra su resumen guardado
+    """
+    financial_data, metrics = _resolve_financial_data(analyzer, None, user_id)
+    try:
+        return await analyzer.track_budgets(financial_data, metrics, fecha_referencia)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/patterns", response_model=PatternReport)
+async def detect_patterns(request: PatternRequest, analyzer: FinancialAnalyzer = Depends(get_analyzer)):
+    """
+    Pagos recurrentes y gastos inusuales del historial (sin IA)
+    """
+    try:
+        return await analyzer.detect_patterns(request.financial_data, request.max_results)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en detección de patrones: {str(e)}")
+
 @router.post("/categorize", response_model=CategorizationResponse)
-async def categorize_transaction(request: CategorizationRequest):
+async def categorize_transaction(
+    request: CategorizationRequest,
+    http_request: Request,
+    response: Response,
+    analyzer: FinancialAnalyzer = Depends(get_analyzer)
+):
     """
     Categorizar automáticamente una transacción
+
+    Con el servicio saturado solo usa la caché y el clasificador local (header X-Degraded).
     """
+    async with _admitted(http_request, response, request.user_id, degradable=True) as ticket:
+        try:
+            result = await analyzer.categorize_transaction(
+                request.descripcion,
+                request.monto,
+                request.tipo,
+                degraded=ticket.degraded is not None,
+                priority=PRIORITY_INTERACTIVE
+            )
+            
+            return CategorizationResponse(**result)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error en categorización: {str(e)}")
+
+@router.post("/categorize/batch", response_model=BatchCategorizationResponse)
+async def categorize_batch(
+    request: BatchCategorizationRequest,
+    http_request: Request,
+    response: Response,
+    analyzer: FinancialAnalyzer = Depends(get_analyzer)
+):
+    """
+    Categorizar muchas transacciones con pocas llamadas al modelo
+
+    Con el servicio saturado solo usa la caché y el clasificador local (header X-Degraded);
+    las transacciones sin estimación local quedan como fallidas.
+    """
+    async with _admitted(http_request, response, request.user_id, degradable=True) as ticket:
+        return await _categorization_batch(request, analyzer, ticket.degraded is not None)
+
+async def _categorization_batch(
+    request: BatchCategorizationRequest,
+    analyzer: FinancialAnalyzer,
+    degraded: bool = False
+) -> BatchCategorizationResponse:
     try:
-        result = await analyzer.categorize_transaction(
-            request.descripcion,
-            request.monto,
-            request.tipo
+        result = await analyzer.categorize_batch(
+            [t.model_dump() for t in request.transactions],
+            degraded=degraded
         )
         
-        return CategorizationResponse(**result)
+        return BatchCategorizationResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en categorización: {str(e)}")
 
+@router.post("/categorize/feedback", response_model=CategorizationResponse)
+async def categorization_feedback(request: CategorizationFeedback, analyzer: FinancialAnalyzer = Depends(get_analyzer)):
+    """
+    Confirmar la categoría de una transacción (entrena el clasificador local)
+    """
+    try:
+        result = analyzer.confirm_categorization(
+            request.descripcion,
+            request.tipo,
+            request.categoria
+        )
+        return CategorizationResponse(**result)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/categorize/cache")
+async def categorization_cache_stats(analyzer: FinancialAnalyzer = Depends(get_analyzer)):
+    """
+    Estadísticas de la caché de categorización
+    """
+    return analyzer.categorization_cache.stats()
+
+@router.delete("/categorize/cache")
+async def invalidate_categorization_cache(tipo: Optional[str] = None, analyzer: FinancialAnalyzer = Depends(get_analyzer)):
+    """
+    Invalidar la caché de categorización (toda o solo un tipo)
+    """
+    return {"deleted": analyzer.categorization_cache.invalidate(tipo)}
+
+def _invalid_financial_data(e: ValidationError) -> HTTPException:
+    """422 con los errores de financial_data, como la validación del cuerpo en las demás rutas"""
+    return HTTPException(status_code=422, detail=[
+        {**error, "loc": ("body", "financial_data", *error["loc"])}
+        for error in e.errors(include_url=False, include_context=False)
+    ])
+
 @router.post("/chat-financial")
-async def chat_with_financial_context(request: dict):
+async def chat_with_financial_context(
+    request: dict,
+    http_request: Request,
+    response: Response,
+    analyzer: FinancialAnalyzer = Depends(get_analyzer)
+):
     """
     Chat con contexto financiero completo
+    
+    Si no se envía `financial_data` pero sí `user_id`, usa el resumen guardado.
     """
     try:
-        from app.models import FinancialData
-        
         message = request.get("message")
         conversation_history = request.get("conversation_history", [])
-        financial_data = FinancialData(**request.get("financial_data", {}))
-        
-        response = await analyzer.chat_with_context(
+        raw_data = request.get("financial_data")
+        financial_data = FinancialData(**raw_data) if raw_data is not None else None
+    except ValidationError as e:
+        raise _invalid_financial_data(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    financial_data, metrics = _resolve_financial_data(analyzer, financial_data, request.get("user_id"))
+    async with _admitted(http_request, response, request.get("user_id")):
+        try:
+            reply = await analyzer.chat_with_context(
+                message,
+                conversation_history,
+                financial_data,
+                metrics,
+                request.get("session_id")
+            )
+            
+            return {"message": reply}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/chat-financial/stream")
+async def chat_with_financial_context_stream(
+    request: dict,
+    http_request: Request,
+    analyzer: FinancialAnalyzer = Depends(get_analyzer)
+):
+    """
+    Chat con contexto financiero completo en streaming (Server-Sent Events)
+    """
+    try:
+        message = request.get("message")
+        conversation_history = request.get("conversation_history", [])
+        raw_data = request.get("financial_data")
+        financial_data = FinancialData(**raw_data) if raw_data is not None else None
+    except ValidationError as e:
+        raise _invalid_financial_data(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    financial_data, metrics = _resolve_financial_data(analyzer, financial_data, request.get("user_id"))
+    ticket = await _admit(http_request, request.get("user_id"))
+    return _sse_response(
+        analyzer.chat_with_context_stream(
             message,
             conversation_history,
-            financial_data
+            financial_data,
+            metrics,
+            request.get("session_id")
+        ),
+        ticket
+    )
+
+@router.put("/summary/{user_id}")
+async def load_summary(user_id: str, financial_data: FinancialData, analyzer: FinancialAnalyzer = Depends(get_analyzer)):
+    """
+    Cargar el historial completo de un usuario y calcular su resumen
+    """
+    summary = analyzer.summary_store.replace(user_id, financial_data)
+    return summary.to_dict()
+
+@router.post("/summary/{user_id}/delta")
+async def update_summary(user_id: str, delta: SummaryDelta, analyzer: FinancialAnalyzer = Depends(get_analyzer)):
+    """
+    Aplicar transacciones agregadas/eliminadas al resumen de un usuario
+    """
+    summary = analyzer.summary_store.apply_delta(
+        user_id,
+        delta.added,
+        delta.removed,
+        delta.presupuestos
+    )
+    return summary.to_dict()
+
+@router.post("/summary/{user_id}/ingest")
+async def ingest_summary(
+    user_id: str,
+    request: Request,
+    format: Optional[str] = None,
+    mode: str = "replace",
+    analyzer: FinancialAnalyzer = Depends(get_analyzer)
+):
+    """
+    Cargar transacciones en streaming (NDJSON o CSV) sin leer todo el cuerpo
+
+    El formato se toma de `format` o del Content-Type. La carga se resume
+    aparte y solo al terminar reemplaza al resumen anterior (mode=replace) o
+    se suma a él (mode=append): si falla a mitad, el resumen guardado no
+    cambia. Las filas inválidas se cuentan y se omiten.
+    """
+    if mode not in ("replace", "append"):
+        raise HTTPException(status_code=400, detail="mode debe ser 'replace' o 'append'")
+    fmt = format or format_from_content_type(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Formato no reconocido: usa ?format=ndjson|csv o Content-Type application/x-ndjson / text/csv"
         )
-        
-        return {"message": response}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+    try:
+        ingestor = StreamingIngestor(fmt)
+        async for chunk in request.stream():
+            ingestor.feed(chunk)
+        summary = ingestor.finish()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    current = analyzer.summary_store.get(user_id)
+    if mode == "append" and current is not None:
+        current.merge(summary)
+        summary = current
+    if ingestor.presupuestos:
+        summary.presupuestos = ingestor.presupuestos
+    elif mode == "replace" and current is not None:
+        summary.presupuestos = current.presupuestos
+    analyzer.summary_store.put(user_id, summary)
+
+    return {**ingestor.report(), "summary": summary.to_dict()}
+
+@router.get("/summary/{user_id}")
+async def get_summary(user_id: str, analyzer: FinancialAnalyzer = Depends(get_analyzer)):
+    """
+    Resumen financiero precalculado de un usuario
+    """
+    summary = analyzer.summary_store.get(user_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"No hay resumen financiero para el usuario {user_id}")
+    return summary.to_dict()
+
+@router.delete("/summary/{user_id}")
+async def delete_summary(user_id: str, analyzer: FinancialAnalyzer = Depends(get_analyzer)):
+    """
+    Eliminar el resumen de un usuario
+    """
+    return {"deleted": analyzer.summary_store.delete(user_id)}
+
+# Trabajos asíncronos: se crean en el primer uso, igual que el analizador
+_jobs: Optional[JobManager] = None
+# Segundos sugeridos (Retry-After) con la cola llena y entre revisiones de /jobs/{id}/events
+JOB_RETRY_AFTER = 5
+JOB_EVENTS_INTERVAL = 2.0
+
+def get_job_manager() -> JobManager:
+    """Trabajos en segundo plano; cada tipo ejecuta la ruta equivalente"""
+    global _jobs
+    if _jobs is None:
+        _jobs = JobManager({
+            "analysis": lambda p: _analysis(AnalysisRequest.model_validate(p), get_analyzer()),
+            "categorization": lambda p: _categorization_batch(BatchCategorizationRequest.model_validate(p), get_analyzer()),
+            "forecast": lambda p: _prediction(PredictionRequest.model_validate(p), get_analyzer()),
+        })
+    return _jobs
+
+async def close_job_manager():
+    """Detener los workers de trabajos (al apagar el servicio)"""
+    if _jobs is not None:
+        await _jobs.close()
+
+def _submit_job(
+    jobs: JobManager,
+    kind: str,
+    payload: Dict,
+    idempotency_key: Optional[str],
+    http_request: Request,
+    user_id: Optional[str] = None
+) -> Dict:
+    """
+    Encolar un trabajo; un envío nuevo descuenta de la cuota del usuario (los
+    workers ya están acotados). Repetir una clave de idempotencia devuelve el
+    trabajo existente sin descontar.
+    """
+    key, by_ip = _client_identity(http_request, user_id)
+    try:
+        return jobs.submit(kind, payload, idempotency_key, on_enqueue=lambda: get_admission().charge(key, by_ip))
+    except AdmissionRejected as e:
+        raise _rejected(e)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(JOB_RETRY_AFTER)})
+
+@router.post("/jobs/analyze", response_model=JobInfo, status_code=202)
+async def submit_analysis_job(
+    request: AnalysisRequest,
+    http_request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    jobs: JobManager = Depends(get_job_manager)
+):
+    """
+    Encolar un análisis financiero; el resultado es el de /analyze
+    """
+    return _submit_job(jobs, "analysis", request.model_dump(), idempotency_key, http_request, request.user_id)
+
+@router.post("/jobs/categorize-batch", response_model=JobInfo, status_code=202)
+async def submit_categorization_job(
+    request: BatchCategorizationRequest,
+    http_request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    jobs: JobManager = Depends(get_job_manager)
+):
+    """
+    Encolar una categorización por lotes; el resultado es el de /categorize/batch
+    """
+    return _submit_job(jobs, "categorization", request.model_dump(), idempotency_key, http_request, request.user_id)
+
+@router.post("/jobs/predict", response_model=JobInfo, status_code=202)
+async def submit_forecast_job(
+    request: PredictionRequest,
+    http_request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    jobs: JobManager = Depends(get_job_manager)
+):
+    """
+    Encolar un pronóstico de gastos; el resultado es el de /predict
+    """
+    return _submit_job(jobs, "forecast", request.model_dump(), idempotency_key, http_request, request.user_id)
+
+@router.get("/jobs")
+async def job_stats(jobs: JobManager = Depends(get_job_manager)):
+    """
+    Estado de la cola de trabajos asíncronos
+    """
+    return jobs.stats()
+
+@router.get("/jobs/{job_id}", response_model=JobInfo)
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=30),
+    jobs: JobManager = Depends(get_job_manager)
+):
+    """
+    Estado y resultado de un trabajo; con `wait` espera hasta esos segundos a que termine
+    """
+    job = await jobs.wait(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo {job_id} no encontrado o vencido")
+    return job
+
+async def _job_events(jobs: JobManager, job_id: str) -> AsyncIterator[str]:
+    """Eventos SSE con cada cambio de estado del trabajo, hasta que termina"""
+    job = jobs.get(job_id)
+    last_status = None
+    while True:
+        if job is None:
+            yield f"event: error\ndata: {json.dumps({'detail': 'Trabajo no encontrado o vencido'})}\n\n"
+            return
+        if job["status"] != last_status:
+            last_status = job["status"]
+            yield f"event: status\ndata: {json.dumps(job, ensure_ascii=False)}\n\n"
+        else:
+            yield ": keepalive\n\n"
+        if job["status"] in FINISHED:
+            return
+        job = await jobs.wait(job_id, JOB_EVENTS_INTERVAL)
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, jobs: JobManager = Depends(get_job_manager)):
+    """
+    Suscribirse a un trabajo (Server-Sent Events): un evento `status` por cambio de estado
+    """
+    if jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo {job_id} no encontrado o vencido")
+    return StreamingResponse(
+        _job_events(jobs, job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,284 @@
+import os
+import math
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+from app.services.request_scheduler import TokenBucket
+from app.services.metrics import ADMISSION_DECISIONS, ADMISSION_IN_FLIGHT
+
+# Cuota por usuario: solicitudes/minuto, ráfaga y solicitudes simultáneas (0 = sin límite)
+ADMISSION_USER_RATE = float(os.getenv("ADMISSION_USER_RATE", 30))
+ADMISSION_USER_BURST = int(os.getenv("ADMISSION_USER_BURST", 10))
+ADMISSION_USER_CONCURRENCY = int(os.getenv("ADMISSION_USER_CONCURRENCY", 4))
+# Cuota de los clientes sin usuario (por IP): detrás de un NAT o del backend,
+# que reenvía todo desde una sola dirección, muchos usuarios la comparten
+ADMISSION_IP_RATE = float(os.getenv("ADMISSION_IP_RATE", 300))
+ADMISSION_IP_BURST = int(os.getenv("ADMISSION_IP_BURST", 50))
+ADMISSION_IP_CONCURRENCY = int(os.getenv("ADMISSION_IP_CONCURRENCY", 16))
+# Límite global: solicitudes/minuto y ráfaga (0 = sin límite), lugares en curso y en espera
+ADMISSION_GLOBAL_RATE = float(os.getenv("ADMISSION_GLOBAL_RATE", 600))
+ADMISSION_GLOBAL_BURST = int(os.getenv("ADMISSION_GLOBAL_BURST", 50))
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", 32))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 64))
+# Espera máxima en la cola (segundos); el cliente puede acortarla con X-Request-Timeout
+ADMISSION_DEADLINE = float(os.getenv("ADMISSION_DEADLINE", 10))
+# Fracción de lugares ocupados desde la que las rutas con alternativa local se degradan
+ADMISSION_DEGRADE_AT = float(os.getenv("ADMISSION_DEGRADE_AT", 0.8))
+# Usuarios con cuota en memoria (los más antiguos se olvidan)
+ADMISSION_MAX_USERS = int(os.getenv("ADMISSION_MAX_USERS", 10000))
+
+# Duración estimada de una solicitud hasta tener mediciones (segundos)
+_INITIAL_SERVICE_TIME = 1.0
+_SERVICE_TIME_ALPHA = 0.2
+
+DECISIONS = ("admitted", "queued", "degraded", "rejected_user", "rejected_global", "expired")
+
+class AdmissionRejected(Exception):
+    """Solicitud rechazada sin esperar: 429 (cuota del usuario) o 503 (servicio saturado)"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+
+class _UserState:
+    __slots__ = ("bucket", "in_flight", "rate", "concurrency")
+
+    def __init__(self, rate: float, burst: int, concurrency: int):
+        self.bucket = TokenBucket(rate / 60, burst) if rate > 0 else None
+        self.in_flight = 0
+        self.rate = rate
+        self.concurrency = concurrency
+
+class Ticket:
+    """
+    Turno concedido por el control de admisión
+
+    Con `degraded` (motivo) la solicitud no ocupa lugar y debe resolverse
+    sin llamar al proveedor. release() es idempotente.
+    """
+
+    def __init__(self, controller: "AdmissionController" = None, user: _UserState = None, degraded: str = None):
+        self._controller = controller
+        self._user = user
+        self.degraded = degraded
+        self.started_at = time.monotonic()
+
+    def release(self):
+        if self._controller is not None:
+            controller, self._controller = self._controller, None
+            controller._release(self._user, time.monotonic() - self.started_at)
+
+class AdmissionController:
+    """
+    Control de admisión de las rutas que llaman al modelo
+
+    Cada solicitud pasa por:
+    1. La cuota de su usuario (token bucket y simultáneas): sin cuota, 429
+       inmediato con Retry-After; un cliente en bucle no consume la de los demás.
+       Un cliente identificado solo por su IP (`by_ip`) usa la cuota más
+       amplia ADMISSION_IP_*, porque esa IP puede ser la de muchos usuarios.
+    2. El token bucket global y ADMISSION_MAX_CONCURRENCY lugares en curso.
+       Sin lugar libre espera en una cola FIFO acotada, pero solo si la espera
+       estimada (posición x duración media / lugares) cabe en su plazo; si no,
+       o si el plazo vence esperando, 503 inmediato con Retry-After en lugar
+       de un timeout lento.
+    3. Las rutas con alternativa local (degradable) no hacen cola: desde
+       ADMISSION_DEGRADE_AT de los lugares ocupados, o cuando se rechazarían,
+       reciben un turno degradado y responden con caché o cálculo local. Así
+       el chat, que no tiene alternativa, conserva lugares.
+
+    Los límites son por proceso (cada worker de uvicorn tiene los suyos).
+    """
+
+    def __init__(
+        self,
+        user_rate: float = ADMISSION_USER_RATE,
+        user_burst: int = ADMISSION_USER_BURST,
+        user_concurrency: int = ADMISSION_USER_CONCURRENCY,
+        ip_rate: float = ADMISSION_IP_RATE,
+        ip_burst: int = ADMISSION_IP_BURST,
+        ip_concurrency: int = ADMISSION_IP_CONCURRENCY,
+        global_rate: float = ADMISSION_GLOBAL_RATE,
+        global_burst: int = ADMISSION_GLOBAL_BURST,
+        max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        deadline: float = ADMISSION_DEADLINE,
+        degrade_at: float = ADMISSION_DEGRADE_AT,
+        max_users: int = ADMISSION_MAX_USERS
+    ):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.user_concurrency = user_concurrency
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.ip_concurrency = ip_concurrency
+        self.global_bucket = TokenBucket(global_rate / 60, global_burst) if global_rate > 0 else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.degrade_slots = max(1, math.ceil(self.max_concurrency * degrade_at))
+        self.max_users = max_users
+        self._users: "OrderedDict[str, _UserState]" = OrderedDict()
+        self._in_flight = 0
+        self._waiters: deque = deque()
+        self.service_time = _INITIAL_SERVICE_TIME
+        self.decisions = {d: 0 for d in DECISIONS}
+
+    def _count(self, decision: str):
+        self.decisions[decision] += 1
+        ADMISSION_DECISIONS.labels(decision).inc()
+
+    def _user(self, key: str, by_ip: bool = False) -> _UserState:
+        # Espacios separados: un user_id igual a una IP no comparte su cuota
+        key = f"ip:{key}" if by_ip else f"user:{key}"
+        state = self._users.get(key)
+        if state is None:
+            if by_ip:
+                state = _UserState(self.ip_rate, self.ip_burst, self.ip_concurrency)
+            else:
+                state = _UserState(self.user_rate, self.user_burst, self.user_concurrency)
+            self._users[key] = state
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(key)
+        return state
+
+    def _charge(self, state: _UserState):
+        if state.bucket is not None:
+            wait = state.bucket.try_acquire()
+            if wait > 0:
+                self._count("rejected_user")
+                raise AdmissionRejected(
+                    429, f"Límite de solicitudes por usuario alcanzado ({state.rate:g}/min)", wait
+                )
+
+    def charge(self, key: str, by_ip: bool = False):
+        """
+        Descontar una solicitud de la cuota del usuario sin ocupar lugar (envío de trabajos)
+
+        Raises:
+            AdmissionRejected: 429 si el usuario no tiene cuota
+        """
+        self._charge(self._user(key, by_ip))
+
+    def _shed(self, degradable: bool, reason: str, retry_after: float) -> Ticket:
+        """Turno degradado si la ruta tiene alternativa local; si no, 503 inmediato"""
+        if self.global_bucket is not None:
+            self.global_bucket.refund()
+        if degradable:
+            self._count("degraded")
+            return Ticket(degraded=reason)
+        self._count("rejected_global")
+        raise AdmissionRejected(503, f"Servicio saturado: {reason}", retry_after)
+
+    def _take(self, state: _UserState) -> Ticket:
+        state.in_flight += 1
+        ADMISSION_IN_FLIGHT.set(self._in_flight)
+        return Ticket(self, state)
+
+    async def acquire(self, key: str, degradable: bool = False, deadline: float = None, by_ip: bool = False) -> Ticket:
+        """
+        Turno para una solicitud del usuario `key`
+
+        Args:
+            by_ip: `key` es la IP del cliente y no un usuario (cuota ADMISSION_IP_*)
+            degradable: la ruta puede responder sin el proveedor (caché o cálculo local)
+            deadline: segundos que el cliente acepta esperar (como máximo ADMISSION_DEADLINE)
+
+        Raises:
+            AdmissionRejected: 429 por la cuota del usuario, 503 si no hay lugar a tiempo
+        """
+        state = self._user(key, by_ip)
+        if state.concurrency > 0 and state.in_flight >= state.concurrency:
+            self._count("rejected_user")
+            raise AdmissionRejected(
+                429, f"Demasiadas solicitudes simultáneas del usuario (máximo {state.concurrency})",
+                self.service_time
+            )
+        self._charge(state)
+
+        if self.global_bucket is not None:
+            wait = self.global_bucket.try_acquire()
+            if wait > 0:
+                if degradable:
+                    self._count("degraded")
+                    return Ticket(degraded="límite global de solicitudes")
+                self._count("rejected_global")
+                raise AdmissionRejected(503, "Servicio saturado: límite global de solicitudes", wait)
+
+        if degradable and self._in_flight >= self.degrade_slots:
+            return self._shed(True, "alta demanda", 0)
+
+        if self._in_flight < self.max_concurrency and not self._waiters:
+            self._in_flight += 1
+            self._count("admitted")
+            return self._take(state)
+
+        # Sin lugar: esperar solo si la espera estimada cabe en el plazo
+        budget = min(deadline, self.deadline) if deadline else self.deadline
+        estimate = (len(self._waiters) + 1) * self.service_time / self.max_concurrency
+        if len(self._waiters) >= self.max_queue:
+            return self._shed(degradable, f"cola llena ({self.max_queue})", estimate)
+        if estimate > budget:
+            return self._shed(degradable, f"espera estimada de {estimate:.1f}s supera el plazo de {budget:g}s", estimate)
+
+        self._count("queued")
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        state.in_flight += 1
+        try:
+            await asyncio.wait({future}, timeout=budget)
+        except BaseException:
+            # El cliente se fue: devolver el lugar si ya se lo habían pasado
+            state.in_flight -= 1
+            if future.done() and not future.cancelled():
+                self._release_slot()
+            future.cancel()
+            raise
+        state.in_flight -= 1
+        if not future.done():
+            future.cancel()
+            self._count("expired")
+            if self.global_bucket is not None:
+                self.global_bucket.refund()
+            raise AdmissionRejected(503, f"Servicio saturado: sin lugar en {budget:g}s", self.service_time)
+        # _release ya contó el lugar traspasado en _in_flight
+        return self._take(state)
+
+    def _release(self, state: _UserState, duration: float):
+        state.in_flight -= 1
+        self.service_time += _SERVICE_TIME_ALPHA * (duration - self.service_time)
+        self._release_slot()
+
+    def _release_slot(self):
+        """Traspasar el lugar al primero que sigue esperando o liberarlo"""
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self._in_flight -= 1
+        ADMISSION_IN_FLIGHT.set(self._in_flight)
+
+    def stats(self) -> Dict:
+        return {
+            "user_rate_per_min": self.user_rate or None,
+            "user_burst": self.user_burst,
+            "user_concurrency": self.user_concurrency or None,
+            "ip_rate_per_min": self.ip_rate or None,
+            "ip_burst": self.ip_burst,
+            "ip_concurrency": self.ip_concurrency or None,
+            "global_rate_per_min": self.global_bucket.rate * 60 if self.global_bucket else None,
+            "max_concurrency": self.max_concurrency,
+            "degrade_at_slots": self.degrade_slots,
+            "max_queue": self.max_queue,
+            "deadline_s": self.deadline,
+            "in_flight": self._in_flight,
+            "queued": sum(1 for f in self._waiters if not f.done()),
+            "users": len(self._users),
+            "service_time_ms": round(self.service_time * 1000, 1),
+            "decisions": dict(self.decisions),
+        }
@@ -1,158 +1,233 @@
 import os
-from typing import List, Dict
+import asyncio
+import threading
+from typing import List, Dict, AsyncIterator, Optional, Type
 import json
+from pydantic import BaseModel
+from app.services.providers import PROVIDER_CLASSES, create_provider
+from app.services.provider_router import ProviderRouter
+from app.services.request_scheduler import RequestScheduler, PRIORITY_NORMAL
+from app.services.response_cache import fingerprint
+from app.services.metrics import stage, STRUCTURED_OUTPUTS
+from app.services.structured_output import StructuredOutputError, parse_structured, json_schema, repair_prompt
 
-# Determinar proveedor
-AI_PROVIDER = os.getenv('AI_PROVIDER', 'gemini')
-
-if AI_PROVIDER == 'gemini':
-    import google.generativeai as genai
-else:
-    from openai import OpenAI
+# Reintentos con prompt de reparación cuando la respuesta estructurada no parsea
+STRUCTURED_REPAIR_RETRIES = int(os.getenv('STRUCTURED_REPAIR_RETRIES', 1))
 
 class AIService:
     """Servicio unificado para múltiples proveedores de IA"""
-    
-    def __init__(self):
-        self.provider = AI_PROVIDER
-        
-        if self.provider == 'gemini':
-            api_key = os.getenv('GEMINI_API_KEY')
-            if not api_key:
-                raise ValueError("GEMINI_API_KEY no está configurada")
-            
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
-            print("✅ Gemini AI inicializado")
-            
-        else:  # deepseek
-            api_key = os.getenv('DEEPSEEK_API_KEY')
-            if not api_key:
-                raise ValueError("DEEPSEEK_API_KEY no está configurada")
-                
-            self.client = OpenAI(
-                api_key=api_key,
-                base_url='https://api.deepseek.com/v1'
-            )
-            self.model_name = "deepseek-chat"
-            print("✅ DeepSeek AI inicializado")
-        
+
+    def __init__(self, providers: List = None):
+        """
+        Los proveedores (y sus SDK) se crean en la primera llamada, no al
+        construir el servicio: el arranque no depende de las API keys.
+
+        Args:
+            providers: Proveedores ya construidos (el primero es el principal);
+                por omisión se crean según AI_PROVIDER y las API keys
+        """
+        if providers:
+            self.provider = providers[0].name
+            self.model_name = providers[0].model_name
+        else:
+            # AI_PROVIDER es el preferido; el resto con API key configurada sirve de respaldo
+            self.provider = os.getenv('AI_PROVIDER', 'gemini')
+            if self.provider not in PROVIDER_CLASSES:
+                raise ValueError(f"AI_PROVIDER inválido: {self.provider}")
+            self.model_name = PROVIDER_CLASSES[self.provider][0].model_name
+
+        self._initial_providers = providers
+        self._router = None
+        self._router_lock = threading.Lock()
+        self.providers = {}
+        self.scheduler = RequestScheduler()
+
+    @property
+    def router(self) -> ProviderRouter:
+        """Router entre proveedores, construido en el primer uso"""
+        if self._router is not None:
+            return self._router
+        # El calentamiento puede estar construyéndolo en otro hilo
+        with self._router_lock:
+            if self._router is None:
+                providers = self._initial_providers
+                if not providers:
+                    providers = [create_provider(self.provider)]
+                    for name in PROVIDER_CLASSES:
+                        if name != self.provider:
+                            backup = create_provider(name, required=False)
+                            if backup is not None:
+                                providers.append(backup)
+                self.providers = {p.name: p for p in providers}
+                self._router = ProviderRouter(providers, primary=self.provider)
+                print(f"✅ IA inicializada: {', '.join(self.providers)} (principal: {self.provider})")
+        return self._router
+
+    @property
+    def initialized(self) -> bool:
+        return self._router is not None
+
+    async def warm_up(self):
+        """
+        Construir los proveedores fuera del camino de la primera solicitud
+
+        Las importaciones de los SDK se hacen en un hilo para no bloquear el
+        event loop mientras se atienden otras solicitudes.
+        """
+        await asyncio.to_thread(lambda: self.router)
+
+    async def close(self):
+        """Cerrar conexiones abiertas con los proveedores"""
+        await self.scheduler.close()
+        for provider in self.providers.values():
+            await provider.close()
+
+    def stats(self) -> Dict:
+        """Estado del enrutamiento entre proveedores"""
+        if not self.initialized:
+            return {"primary": self.provider, "initialized": False, "order": [], "providers": {}}
+        return {"initialized": True, **self.router.stats()}
+
+    def queue_stats(self) -> Dict:
+        """Profundidad de cola, tiempos de espera, coalescencia y micro-lotes"""
+        return self.scheduler.stats()
+
     async def chat_completion(
-        self, 
-        messages: List[Dict[str, str]], 
+        self,
+        messages: List[Dict[str, str]],
         temperature: float = 0.7,
-        max_tokens: int = 1024
+        max_tokens: int = 1024,
+        session_id: str = None,
+        priority: int = PRIORITY_NORMAL,
+        response_schema: Optional[Dict] = None
     ) -> str:
         """
-        Obtener respuesta de chat del proveedor configurado
-        
+        Obtener respuesta de chat del proveedor más sano disponible
+
         Args:
             messages: Lista de mensajes [{"role": "user", "content": "..."}]
             temperature: Creatividad (0-1)
             max_tokens: Tokens máximos en respuesta
-            
+            session_id: Conversación; con Gemini reutiliza la sesión de chat
+            priority: Turno en la cola cuando se alcanza el límite de tasa
+            response_schema: Esquema JSON para el modo JSON del proveedor
+
         Returns:
             Respuesta del modelo
         """
+        async def call():
+            await self.scheduler.admit(priority)
+            return await self.router.complete(messages, temperature, max_tokens, session_id, response_schema)
+
         try:
-            if self.provider == 'gemini':
-                return await self._gemini_completion(messages, temperature, max_tokens)
-            else:
-                return await self._deepseek_completion(messages, temperature, max_tokens)
+            # Sin sesión, las solicitudes idénticas en vuelo comparten la llamada
+            if session_id:
+                return await call()
+            key = fingerprint(
+                json.dumps(messages, sort_keys=True), str(temperature), str(max_tokens),
+                json.dumps(response_schema, sort_keys=True)
+            )
+            return await self.scheduler.coalesce(key, call)
         except Exception as e:
             raise Exception(f"Error en {self.provider} API: {str(e)}")
-    
-    async def _gemini_completion(self, messages, temperature, max_tokens):
-        """Completion usando Gemini"""
-        # Separar system prompt del resto
-        system_prompt = None
-        chat_messages = []
-        
-        for msg in messages:
-            if msg['role'] == 'system':
-                system_prompt = msg['content']
-            else:
-                chat_messages.append(msg)
-        
-        # Convertir historial para Gemini
-        history = []
-        for msg in chat_messages[:-1]:
-            history.append({
-                'role': 'model' if msg['role'] == 'assistant' else 'user',
-                'parts': [msg['content']]
-            })
-        
-        # Configurar chat
-        chat = self.model.start_chat(
-            history=history
-        )
-        
-        # Preparar último mensaje con system prompt
-        last_message = chat_messages[-1]['content']
-        if system_prompt:
-            last_message = f"{system_prompt}\n\n{last_message}"
-        
-        # Generar respuesta
-        response = chat.send_message(
-            last_message,
-            generation_config={
-                'temperature': temperature,
-                'max_output_tokens': max_tokens,
-            }
-        )
-        
-        return response.text
-    
-    async def _deepseek_completion(self, messages, temperature, max_tokens):
-        """Completion usando DeepSeek"""
-        response = self.client.chat.completions.create(
-            model=self.model_name,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens
-        )
-        return response.choices[0].message.content
-    
+
+    async def chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 1024,
+        session_id: str = None,
+        priority: int = PRIORITY_NORMAL
+    ) -> AsyncIterator[str]:
+        """
+        Obtener la respuesta de chat como flujo de fragmentos de texto
+
+        Si el consumidor deja de iterar (cliente desconectado), el flujo
+        con el proveedor se cierra para no seguir generando tokens.
+
+        Args:
+            messages: Lista de mensajes [{"role": "user", "content": "..."}]
+            temperature: Creatividad (0-1)
+            max_tokens: Tokens máximos en respuesta
+            session_id: Conversación; con Gemini reutiliza la sesión de chat
+            priority: Turno en la cola cuando se alcanza el límite de tasa
+
+        Yields:
+            Fragmentos de texto en el orden en que llegan
+        """
+        await self.scheduler.admit(priority)
+        stream = self.router.stream(messages, temperature, max_tokens, session_id)
+        try:
+            async for delta in stream:
+                yield delta
+        except Exception as e:
+            raise Exception(f"Error en {self.provider} API: {str(e)}")
+        finally:
+            await stream.aclose()
+
     async def structured_completion(
         self,
         prompt: str,
         system_prompt: str = None,
-        temperature: float = 0.5
+        temperature: float = 0.5,
+        max_tokens: int = 800,
+        priority: int = PRIORITY_NORMAL,
+        response_model: Type[BaseModel] = None
     ) -> Dict:
         """
         Obtener respuesta estructurada en JSON
-        
+
+        Con response_model se pide el modo JSON del proveedor y el resultado
+        se valida contra el modelo. El texto pasa por un extractor tolerante
+        (bloques ```json, llaves equilibradas, comas finales); solo si aun así
+        no hay JSON válido se reintenta una vez con un prompt de reparación.
+
         Args:
             prompt: Pregunta del usuario
             system_prompt: Instrucciones del sistema
             temperature: Creatividad
-            
+            max_tokens: Tokens máximos en respuesta
+            priority: Turno en la cola cuando se alcanza el límite de tasa
+            response_model: Modelo de Pydantic que debe cumplir la respuesta
+
         Returns:
-            Diccionario con la respuesta parseada
+            Diccionario con la respuesta parseada (y validada)
         """
         messages = []
-        
+
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
-            
+
         messages.append({"role": "user", "content": prompt})
-        
+        schema_name = response_model.__name__ if response_model else "json"
+        schema = json_schema(response_model) if response_model else None
+
         try:
-            response = await self.chat_completion(
-                messages=messages,
-                temperature=temperature,
-                max_tokens=800
-            )
-            
-            # Intentar parsear JSON
-            try:
-                return json.loads(response)
-            except json.JSONDecodeError:
-                # Si no es JSON válido, extraer entre ```json y ```
-                if "```json" in response:
-                    json_str = response.split("```json")[1].split("```")[0].strip()
-                    return json.loads(json_str)
-                return {"raw_response": response}
-                
+            for attempt in range(STRUCTURED_REPAIR_RETRIES + 1):
+                response = await self.chat_completion(
+                    messages=messages,
+                    temperature=temperature if attempt == 0 else 0.0,
+                    max_tokens=max_tokens,
+                    priority=priority,
+                    response_schema=schema
+                )
+
+                with stage("structured", "json_parse"):
+                    try:
+                        result, how = parse_structured(response, response_model)
+                    except StructuredOutputError as e:
+                        error = e
+                        STRUCTURED_OUTPUTS.labels(schema_name, "invalid" if attempt == 0 else "retry_failed").inc()
+                    else:
+                        STRUCTURED_OUTPUTS.labels(schema_name, how if attempt == 0 else "retry_ok").inc()
+                        return result
+
+                # Reparación: el modelo ve su respuesta y el error concreto
+                messages = messages[:2 if system_prompt else 1] + [
+                    {"role": "assistant", "content": response or ""},
+                    {"role": "user", "content": repair_prompt(str(error))},
+                ]
+            raise error
+
         except Exception as e:
             raise Exception(f"Error al obtener respuesta estructurada: {str(e)}")
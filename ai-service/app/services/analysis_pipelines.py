@@ -0,0 +1,165 @@
+from typing import Dict, List
+from app.models import FinancialData
+from app.services.financial_metrics import category_month_totals, risk_level_from_savings
+from app.services.budget_engine import budget_report, format_status
+from app.services.pattern_detection import PATTERN_CONTEXT_ITEMS, format_patterns
+from app.services.transaction_table import TransactionTable
+
+# Meta de ahorro usada en el análisis de ahorro (% de los ingresos)
+SAVINGS_TARGET = 20.0
+
+# Aviso de los análisis servidos sin IA cuando el servicio está saturado
+DEGRADED_NOTICE = "⚠️ Análisis generado sin IA por alta demanda: se muestran los indicadores calculados localmente."
+
+# Configuración de los análisis acotados: prompt corto y pocos tokens
+PIPELINES = {
+    "spending": {
+        "max_tokens": 450,
+        "system_prompt": """Eres un asesor financiero experto. Analiza SOLO la distribución de gastos.
+
+Responde en español con:
+1. **DIAGNÓSTICO** (1-2 oraciones sobre en qué se va el dinero)
+2. **RECOMENDACIONES** (2-3 puntos concretos para reducir gasto, con números)""",
+    },
+    "savings": {
+        "max_tokens": 350,
+        "system_prompt": """Eres un asesor financiero experto. Analiza SOLO la capacidad de ahorro.
+
+Responde en español con:
+1. **DIAGNÓSTICO** (1-2 oraciones sobre la tasa de ahorro)
+2. **RECOMENDACIONES** (2-3 puntos concretos para ahorrar más, con números)""",
+    },
+    "budget": {
+        "max_tokens": 400,
+        "system_prompt": """Eres un asesor financiero experto. Analiza SOLO el cumplimiento de presupuestos.
+
+Responde en español con:
+1. **DIAGNÓSTICO** (1-2 oraciones sobre los presupuestos excedidos o en riesgo)
+2. **RECOMENDACIONES** (2-3 puntos concretos para ajustarse al presupuesto)""",
+    },
+}
+
+def spending_context(data: FinancialData, metrics: Dict) -> Dict:
+    """Distribución de gastos por categoría con participación y concentración"""
+    total = metrics["total_gastos"]
+    distribucion = [
+        {"categoria": cat, "monto": round(monto, 2), "porcentaje": round(monto / total * 100, 1) if total > 0 else 0.0}
+        for cat, monto in metrics["gastos_por_categoria"]
+    ]
+    top3 = sum(d["porcentaje"] for d in distribucion[:3])
+
+    context = f"💸 GASTOS TOTALES: ${total:,.2f}\n\nDISTRIBUCIÓN POR CATEGORÍA:\n"
+    for d in distribucion:
+        context += f"   • {d['categoria']}: ${d['monto']:,.2f} ({d['porcentaje']:.1f}%)\n"
+
+    insights = []
+    if distribucion:
+        principal = distribucion[0]
+        insights.append(f"{principal['categoria']} concentra el {principal['porcentaje']:.1f}% del gasto (${principal['monto']:,.2f})")
+        if len(distribucion) > 3:
+            insights.append(f"Las 3 categorías principales suman el {top3:.1f}% del gasto")
+
+    result_metrics = {"total_gastos": total, "distribucion": distribucion, "concentracion_top3": round(top3, 1)}
+
+    # Pagos recurrentes y gastos inusuales, si se calcularon sobre el historial completo
+    patrones = metrics.get("patrones")
+    if patrones:
+        context += format_patterns(patrones, PATTERN_CONTEXT_ITEMS)
+        if patrones["recurrentes_activos"]:
+            insights.append(
+                f"{patrones['recurrentes_activos']} pagos recurrentes suman ${patrones['gasto_recurrente_mensual']:,.2f} al mes"
+            )
+        if patrones["inusuales"]:
+            inusual = patrones["inusuales"][0]
+            insights.append(f"Gasto inusual de ${inusual['monto']:,.2f} en {inusual['categoria']} el {inusual['fecha']}")
+        result_metrics["gasto_recurrente_mensual"] = patrones["gasto_recurrente_mensual"]
+
+    return {
+        "context": context,
+        "metrics": result_metrics,
+        "insights": insights,
+    }
+
+def savings_context(data: FinancialData, metrics: Dict) -> Dict:
+    """Tasa de ahorro y distancia a la meta"""
+    ingresos = metrics["total_ingresos"]
+    saldo = metrics["saldo"]
+    rate = metrics["savings_rate"]
+    faltante = max(0.0, ingresos * SAVINGS_TARGET / 100 - saldo)
+
+    context = f"""💰 AHORRO:
+   • Total Ingresos: ${ingresos:,.2f}
+   • Total Gastos: ${metrics['total_gastos']:,.2f}
+   • Saldo: ${saldo:,.2f}
+   • Tasa de Ahorro: {rate:.1f}% (meta: {SAVINGS_TARGET:.0f}%)
+   • Ahorro faltante para la meta: ${faltante:,.2f}
+"""
+    if metrics["gastos_por_categoria"]:
+        context += "\nMAYORES GASTOS:\n"
+        for cat, monto in metrics["gastos_por_categoria"][:3]:
+            context += f"   • {cat}: ${monto:,.2f}\n"
+
+    insights = [f"Tasa de ahorro del {rate:.1f}% (meta {SAVINGS_TARGET:.0f}%)"]
+    if faltante > 0:
+        insights.append(f"Faltan ${faltante:,.2f} de ahorro para llegar a la meta")
+
+    return {
+        "context": context,
+        "metrics": {
+            "total_ingresos": ingresos,
+            "saldo": saldo,
+            "savings_rate": rate,
+            "meta": SAVINGS_TARGET,
+            "faltante_meta": round(faltante, 2),
+        },
+        "insights": insights,
+    }
+
+def budget_actuals(data: FinancialData, metrics: Dict) -> Dict:
+    """Gasto real por (categoría, mes 'YYYY-MM'), del resumen o de la tabla de transacciones"""
+    if "gastos_por_categoria_mes" in metrics:
+        return metrics["gastos_por_categoria_mes"]
+    return category_month_totals(TransactionTable.from_financial_data(data))
+
+def budget_context(data: FinancialData, metrics: Dict) -> Dict:
+    """Presupuesto contra gasto real, ritmo y proyección al cierre de cada categoría/mes"""
+    report = budget_report(data.presupuestos, budget_actuals(data, metrics))
+    comparacion = report["presupuestos"]
+
+    if comparacion:
+        context = f"🎯 PRESUPUESTO VS GASTO REAL (al {report['fecha_referencia']}):\n"
+        for c in comparacion:
+            context += f"   • {format_status(c)}\n"
+    else:
+        context = "🎯 El usuario no tiene presupuestos definidos.\n"
+
+    insights = [
+        f"{c['categoria']} ({c['mes']}) excedido por ${c['gastado'] - c['limite']:,.2f}"
+        for c in comparacion if c["estado"] == "excedido"
+    ] + [
+        f"{c['categoria']} ({c['mes']}) al {c['utilizacion']:.1f}% del presupuesto"
+        + (f", proyecta exceder por ${c['exceso_proyectado']:,.2f}" if c["exceso_proyectado"] > 0 else "")
+        for c in comparacion if c["estado"] == "en_riesgo"
+    ]
+
+    return {
+        "context": context,
+        "metrics": {"presupuestos": comparacion, "excedidos": report["excedidos"], "en_riesgo": report["en_riesgo"]},
+        "insights": insights[:5],
+    }
+
+CONTEXT_BUILDERS = {
+    "spending": spending_context,
+    "savings": savings_context,
+    "budget": budget_context,
+}
+
+def build_pipeline(analysis_type: str, data: FinancialData, metrics: Dict) -> Dict:
+    """Contexto, métricas deterministas, insights locales y nivel de riesgo de un análisis acotado"""
+    result = CONTEXT_BUILDERS[analysis_type](data, metrics)
+    result["risk_level"] = risk_level_from_savings(metrics["savings_rate"])
+    return result
+
+def local_analysis(insights: List[str]) -> str:
+    """Texto del análisis armado con los insights locales (modo degradado, sin IA)"""
+    return DEGRADED_NOTICE + "".join(f"\n• {i}" for i in insights)
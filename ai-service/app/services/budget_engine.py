@@ -0,0 +1,100 @@
+import os
+import calendar
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from app.models import Budget
+
+# Porcentaje de utilización a partir del cual un presupuesto está en riesgo
+BUDGET_RISK_THRESHOLD = float(os.getenv("BUDGET_RISK_THRESHOLD", 80))
+
+def parse_reference_date(value: Optional[str]) -> date:
+    """'YYYY-MM-DD' -> date (hoy si no se envía)"""
+    if not value:
+        return date.today()
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        raise ValueError(f"fecha_referencia inválida: {value!r} (usa YYYY-MM-DD)")
+
+def budget_status(budget: Budget, gastado: float, hoy: date) -> Dict:
+    """
+    Utilización, ritmo de gasto y proyección al cierre de un presupuesto
+
+    En el mes en curso el ritmo es lo gastado entre los días transcurridos
+    y la proyección lo extiende al mes completo; un mes cerrado proyecta lo
+    gastado y un mes futuro no tiene días transcurridos.
+    """
+    year, month = int(budget.mes[:4]), int(budget.mes[5:7])
+    dias_mes = calendar.monthrange(year, month)[1]
+    if (year, month) < (hoy.year, hoy.month):
+        dias = dias_mes
+    elif (year, month) == (hoy.year, hoy.month):
+        dias = hoy.day
+    else:
+        dias = 0
+
+    limite = budget.monto_limite
+    gasto_diario = gastado / dias if dias else 0.0
+    proyeccion = gasto_diario * dias_mes if 0 < dias < dias_mes else gastado
+    utilizacion = gastado / limite * 100 if limite > 0 else 0.0
+
+    if gastado > limite:
+        estado = "excedido"
+    elif dias == 0:
+        estado = "futuro"
+    elif proyeccion > limite or utilizacion >= BUDGET_RISK_THRESHOLD:
+        estado = "en_riesgo"
+    else:
+        estado = "ok"
+
+    return {
+        "categoria": budget.categoria,
+        "mes": budget.mes[:7],
+        "limite": round(limite, 2),
+        "gastado": round(gastado, 2),
+        "disponible": round(limite - gastado, 2),
+        "utilizacion": round(utilizacion, 1),
+        "dias_transcurridos": dias,
+        "dias_mes": dias_mes,
+        "gasto_diario": round(gasto_diario, 2),
+        "proyeccion": round(proyeccion, 2),
+        "exceso_proyectado": round(max(0.0, proyeccion - limite), 2),
+        "estado": estado,
+    }
+
+def budget_report(
+    presupuestos: List[Budget],
+    actuals: Dict[Tuple[str, str], float],
+    hoy: Optional[date] = None
+) -> Dict:
+    """
+    Presupuesto contra gasto real de todos los presupuestos
+
+    actuals es el índice {(categoría, 'YYYY-MM'): gasto} que ya calculan las
+    métricas (un solo agrupamiento de los gastos) o el resumen incremental;
+    cada presupuesto es una búsqueda en O(1), así que el total es
+    O(transacciones + presupuestos). Ordenado por utilización proyectada.
+    """
+    hoy = hoy or date.today()
+    statuses = [
+        budget_status(p, actuals.get((p.categoria, p.mes[:7]), 0.0), hoy)
+        for p in presupuestos
+    ]
+    statuses.sort(key=lambda s: s["proyeccion"] / s["limite"] if s["limite"] > 0 else 0.0, reverse=True)
+    return {
+        "fecha_referencia": hoy.isoformat(),
+        "presupuestos": statuses,
+        "excedidos": sum(1 for s in statuses if s["estado"] == "excedido"),
+        "en_riesgo": sum(1 for s in statuses if s["estado"] == "en_riesgo"),
+        "total_limite": round(sum(s["limite"] for s in statuses), 2),
+        "total_gastado": round(sum(s["gastado"] for s in statuses), 2),
+    }
+
+def format_status(s: Dict) -> str:
+    """Línea de contexto para el prompt con las cifras exactas de un presupuesto"""
+    line = f"{s['categoria']} ({s['mes']}): ${s['gastado']:,.2f} de ${s['limite']:,.2f} ({s['utilizacion']:.1f}%)"
+    if 0 < s["dias_transcurridos"] < s["dias_mes"]:
+        line += f", ${s['gasto_diario']:,.2f}/día, proyección al cierre ${s['proyeccion']:,.2f}"
+        if s["exceso_proyectado"] > 0:
+            line += f" (excede por ${s['exceso_proyectado']:,.2f})"
+    return f"{line} [{s['estado']}]"
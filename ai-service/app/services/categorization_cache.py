@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Configuración de la caché de categorización
+CATEGORIZATION_CACHE_PATH = os.getenv("CATEGORIZATION_CACHE_PATH", "data/categorization_cache.db")
+CATEGORIZATION_CACHE_TTL = float(os.getenv("CATEGORIZATION_CACHE_TTL", 30 * 24 * 3600))
+CATEGORIZATION_CACHE_SIZE = int(os.getenv("CATEGORIZATION_CACHE_SIZE", 10000))
+CATEGORIZATION_CACHE_DISK_SIZE = int(os.getenv("CATEGORIZATION_CACHE_DISK_SIZE", 200000))
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_HAS_DIGIT = re.compile(r"\d")
+
+def normalize_description(descripcion: str) -> str:
+    """
+    Normalizar una descripción de comercio para usarla como clave
+
+    "OXXO 1234" -> "oxxo", "UBER *TRIP" -> "uber trip", "NETFLIX.COM" -> "netflix com"
+    """
+    text = unicodedata.normalize("NFKD", descripcion or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = _NON_WORD.sub(" ", text).replace("_", " ")
+    # Descartar números de tienda, referencias y folios
+    return " ".join(token for token in text.split() if not _HAS_DIGIT.search(token))
+
+def categories_version(categorias: List[str]) -> str:
+    """Huella corta de una lista de categorías; cambia si la lista cambia"""
+    return hashlib.sha1("|".join(categorias).encode("utf-8")).hexdigest()[:8]
+
+class CategorizationCache:
+    """
+    Caché de categorizaciones: LRU en memoria respaldada por SQLite
+
+    La clave es descripción normalizada + tipo + versión de la lista de
+    categorías, así que modificar CATEGORIAS invalida las entradas viejas
+    sin tener que borrarlas a mano.
+    """
+
+    def __init__(
+        self,
+        path: str = CATEGORIZATION_CACHE_PATH,
+        ttl: float = CATEGORIZATION_CACHE_TTL,
+        max_size: int = CATEGORIZATION_CACHE_SIZE,
+        max_disk_size: int = CATEGORIZATION_CACHE_DISK_SIZE
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.max_disk_size = max_disk_size
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS categorizations (
+                key TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_created_at ON categorizations(created_at)")
+
+    @staticmethod
+    def make_key(descripcion: str, tipo: str, categorias: List[str]) -> Optional[str]:
+        """
+        Clave de caché para una transacción
+
+        None si la descripción queda vacía al normalizarla (solo números o
+        signos): todas esas descripciones compartirían la misma clave.
+        """
+        normalized = normalize_description(descripcion)
+        if not normalized:
+            return None
+        return f"{tipo}:{categories_version(categorias)}:{normalized}"
+
+    def get(self, descripcion: str, tipo: str, categorias: List[str]) -> Optional[Dict]:
+        """Buscar una categorización; None si no existe, expiró o no se puede cachear"""
+        key = self.make_key(descripcion, tipo, categorias)
+        if key is None:
+            return None
+        now = time.time()
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            result, created_at = entry
+            if now - created_at <= self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return dict(result)
+            del self._memory[key]
+
+        row = self._db.execute(
+            "SELECT result, created_at FROM categorizations WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None and now - row[1] <= self.ttl:
+            result = json.loads(row[0])
+            self._remember(key, result, row[1])
+            self.hits += 1
+            return dict(result)
+
+        self.misses += 1
+        return None
+
+    def set(self, descripcion: str, tipo: str, categorias: List[str], result: Dict):
+        """Guardar una categorización en memoria y en disco"""
+        self.set_many([(descripcion, tipo, categorias, result)])
+
+    def set_many(self, entries: List[Tuple[str, str, List[str], Dict]]):
+        """
+        Guardar varias categorizaciones (descripcion, tipo, categorias, result)
+
+        Todas las filas se escriben en una sola transacción; un lote de
+        categorize_batch cuesta un commit y no uno por transacción.
+        """
+        now = time.time()
+        rows = []
+        for descripcion, tipo, categorias, result in entries:
+            key = self.make_key(descripcion, tipo, categorias)
+            if key is None:
+                continue
+            self._remember(key, result, now)
+            rows.append((key, tipo, json.dumps(result, ensure_ascii=False), now))
+        if not rows:
+            return
+
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO categorizations (key, tipo, result, created_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+
+            # Poda periódica del almacenamiento en disco
+            before = self._writes
+            self._writes += len(rows)
+            if self._writes // 500 != before // 500:
+                self._evict_disk(now)
+
+    def invalidate(self, tipo: Optional[str] = None) -> int:
+        """Borrar entradas (todas o solo las de un tipo); devuelve cuántas se borraron"""
+        if tipo is None:
+            self._memory.clear()
+            return self._db.execute("DELETE FROM categorizations").rowcount
+
+        prefix = f"{tipo}:"
+        for key in [k for k in self._memory if k.startswith(prefix)]:
+            del self._memory[key]
+        return self._db.execute("DELETE FROM categorizations WHERE tipo = ?", (tipo,)).rowcount
+
+    def stats(self) -> Dict:
+        """Contadores de aciertos/fallos y tamaño actual"""
+        total = self.hits + self.misses
+        disk_size = self._db.execute("SELECT COUNT(*) FROM categorizations").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "memory_size": len(self._memory),
+            "disk_size": disk_size,
+        }
+
+    def _remember(self, key: str, result: Dict, created_at: float):
+        """Insertar en la LRU en memoria respetando el tamaño máximo"""
+        self._memory[key] = (result, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now: float):
+        """Eliminar entradas expiradas y las más antiguas por encima del límite"""
+        self._db.execute("DELETE FROM categorizations WHERE created_at < ?", (now - self.ttl,))
+        self._db.execute(
+            """DELETE FROM categorizations WHERE key IN (
+                SELECT key FROM categorizations ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.max_disk_size,)
+        )
@@ -0,0 +1,184 @@
+import os
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, Tuple
+import numpy as np
+from app.services.transaction_table import TransactionTable
+
+# Dónde corren los cálculos pesados: inline (en el loop), thread o process, y a
+# partir de cuántas transacciones se sacan del loop
+COMPUTE_EXECUTOR = os.getenv("COMPUTE_EXECUTOR", "process")
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", min(4, os.cpu_count() or 1)))
+COMPUTE_OFFLOAD_MIN_ROWS = int(os.getenv("COMPUTE_OFFLOAD_MIN_ROWS", 20000))
+
+EXECUTOR_MODES = ("inline", "thread", "process")
+# Columnas numéricas que viajan por memoria compartida
+_SHARED_COLUMNS = ("dias", "montos", "es_gasto", "ids", "etiquetas")
+# Separador de las descripciones dentro del bloque compartido
+_SEP = "\x00"
+
+def _align(size: int) -> int:
+    return -(-size // 8) * 8
+
+def export_table(table: TransactionTable) -> Tuple[SharedMemory, Dict]:
+    """
+    Copiar las columnas a un bloque de memoria compartida
+
+    Es la única copia de los datos: el proceso hijo arma sus arreglos como
+    vistas sobre el mismo bloque. Las descripciones viajan como un solo
+    texto UTF-8 separado por \\x00 (más una máscara de las que son None),
+    así no se serializa un objeto por fila; si alguna contiene el separador
+    se envían serializadas. Quien exporta debe cerrar y liberar (unlink) el
+    bloque cuando el hijo termina.
+
+    Returns:
+        (bloque, descripción serializable para attach_table)
+    """
+    sin_descripcion = np.equal(table.descripciones, None).astype(bool)
+    descripciones = table.descripciones.copy()
+    descripciones[sin_descripcion] = ""
+    texto = _SEP.join(descripciones.tolist())
+    inline_text = texto.count(_SEP) == max(len(table) - 1, 0)
+    encoded = texto.encode("utf-8") if inline_text else b""
+
+    columns = [(name, getattr(table, name)) for name in _SHARED_COLUMNS]
+    columns.append(("sin_descripcion", sin_descripcion))
+    layout = []
+    offset = 0
+    for name, column in columns:
+        layout.append((name, column.dtype.str, offset))
+        offset += _align(column.nbytes)
+    shm = SharedMemory(create=True, size=max(offset + len(encoded), 1))
+    for (name, column), (_, dtype, start) in zip(columns, layout):
+        np.ndarray(column.shape, dtype=dtype, buffer=shm.buf, offset=start)[:] = column
+    shm.buf[offset:offset + len(encoded)] = encoded
+
+    spec = {
+        "shm": shm.name,
+        "rows": len(table),
+        "layout": layout,
+        "texto": (offset, len(encoded)) if inline_text else None,
+        "descripciones": None if inline_text else table.descripciones,
+        "vocab_etiquetas": table.vocab_etiquetas,
+    }
+    return shm, spec
+
+def attach_table(shm: SharedMemory, spec: Dict) -> TransactionTable:
+    """TransactionTable con columnas que son vistas (sin copia) sobre el bloque compartido"""
+    columns = {
+        name: np.ndarray((spec["rows"],), dtype=dtype, buffer=shm.buf, offset=start)
+        for name, dtype, start in spec["layout"]
+    }
+    sin_descripcion = columns.pop("sin_descripcion")
+    descripciones = spec["descripciones"]
+    if descripciones is None:
+        start, size = spec["texto"]
+        partes = bytes(shm.buf[start:start + size]).decode("utf-8").split(_SEP) if spec["rows"] else []
+        descripciones = np.empty(spec["rows"], dtype=object)
+        descripciones[:] = partes
+        descripciones[sin_descripcion] = None
+    return TransactionTable(
+        descripciones=descripciones,
+        vocab_etiquetas=spec["vocab_etiquetas"],
+        **columns,
+    )
+
+def _run_on_shared_table(spec: Dict, fn: Callable, args: Tuple) -> Any:
+    """Ejecutar fn(tabla, *args) en el proceso hijo (el resultado no debe contener vistas del bloque)"""
+    shm = SharedMemory(name=spec["shm"])
+    try:
+        table = attach_table(shm, spec)
+        result = fn(table, *args)
+        del table
+        return result
+    finally:
+        shm.close()
+
+class ComputePool:
+    """
+    Ejecutor de los cálculos sobre TransactionTable (métricas, patrones, pronóstico)
+
+    Las tablas chicas se calculan en el loop: cuestan menos que el viaje a
+    otro proceso. Desde COMPUTE_OFFLOAD_MIN_ROWS filas van a un hilo
+    (COMPUTE_EXECUTOR=thread; libera el loop mientras NumPy suelta el GIL) o
+    a un pool de procesos (process), con las columnas en memoria compartida.
+    fn debe ser una función de módulo (se envía por referencia). Los
+    procesos se crean en el primer uso; si el pool se rompe (un worker
+    murió) se recrea y esa llamada se calcula en el loop.
+    """
+
+    def __init__(
+        self,
+        mode: str = COMPUTE_EXECUTOR,
+        workers: int = COMPUTE_WORKERS,
+        min_rows: int = COMPUTE_OFFLOAD_MIN_ROWS
+    ):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"COMPUTE_EXECUTOR inválido: {mode} (usa {', '.join(EXECUTOR_MODES)})")
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.min_rows = min_rows
+        self._executor: Executor = None
+        self._lock = threading.Lock()
+        self.inline = 0
+        self.offloaded = 0
+        self.failures = 0
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.mode == "process":
+                    # spawn: el loop y los hilos del proceso padre no se heredan a medias
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="compute")
+            return self._executor
+
+    async def run(self, fn: Callable, table: TransactionTable, *args) -> Any:
+        """Resultado de fn(table, *args), calculado donde corresponda según el tamaño"""
+        if self.mode == "inline" or len(table) < self.min_rows:
+            self.inline += 1
+            return fn(table, *args)
+
+        loop = asyncio.get_running_loop()
+        self.offloaded += 1
+        if self.mode == "thread":
+            return await loop.run_in_executor(self._get_executor(), fn, table, *args)
+
+        shm, spec = export_table(table)
+        try:
+            return await loop.run_in_executor(self._get_executor(), _run_on_shared_table, spec, fn, args)
+        except BrokenProcessPool:
+            self.failures += 1
+            self._reset()
+            return fn(table, *args)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def _reset(self, wait: bool = False):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def shutdown(self):
+        """Cerrar los workers esperando a que terminen (al apagar el servicio)"""
+        self._reset(wait=True)
+
+    def stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "min_rows": self.min_rows,
+            "started": self._executor is not None,
+            "inline": self.inline,
+            "offloaded": self.offloaded,
+            "failures": self.failures,
+        }
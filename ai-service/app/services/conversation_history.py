@@ -0,0 +1,129 @@
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.services.response_cache import fingerprint
+from app.services.request_scheduler import PRIORITY_INTERACTIVE
+
+# Presupuesto de tokens para el historial enviado al modelo
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", 1500))
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", 300))
+CHAT_SUMMARY_CACHE_SIZE = int(os.getenv("CHAT_SUMMARY_CACHE_SIZE", 5000))
+CHAT_MIN_RECENT_MESSAGES = 2
+
+# Tokens fijos por mensaje (rol, separadores)
+_MESSAGE_OVERHEAD = 4
+
+SUMMARY_PROMPT = """Resume la conversación entre un usuario y su asistente financiero.
+Escribe en español, máximo 5 viñetas breves. Conserva cifras, metas, decisiones y
+preguntas pendientes del usuario. No agregues información nueva."""
+
+def estimate_tokens(text: str) -> int:
+    """Estimación rápida de tokens (~4 caracteres por token)"""
+    return len(text) // 4 + 1
+
+def message_tokens(message: Dict) -> int:
+    return estimate_tokens(message.get("content") or "") + _MESSAGE_OVERHEAD
+
+def _prefix_fingerprint(messages: List[Dict]) -> str:
+    return fingerprint(*(f"{m.get('role')}:{m.get('content')}" for m in messages))
+
+class HistoryManager:
+    """
+    Compactación del historial de chat dentro de un presupuesto de tokens
+
+    Los turnos recientes se envían tal cual; los anteriores se reemplazan por
+    un resumen acumulado que se calcula una vez por sesión y se reutiliza en
+    los turnos siguientes (solo se amplía cuando el historial reciente vuelve
+    a exceder el presupuesto).
+    """
+
+    def __init__(
+        self,
+        ai_service,
+        token_budget: int = CHAT_HISTORY_TOKEN_BUDGET,
+        summary_max_tokens: int = CHAT_SUMMARY_MAX_TOKENS,
+        cache_size: int = CHAT_SUMMARY_CACHE_SIZE
+    ):
+        self.ai_service = ai_service
+        self.token_budget = token_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.cache_size = cache_size
+        # sesión -> (mensajes cubiertos, huella de esos mensajes, resumen)
+        self._summaries: "OrderedDict[str, Tuple[int, str, str]]" = OrderedDict()
+
+    async def compact(
+        self,
+        history: List[Dict],
+        session_id: Optional[str] = None
+    ) -> Tuple[Optional[str], List[Dict]]:
+        """
+        Ajustar el historial al presupuesto
+
+        Returns:
+            (resumen de los turnos anteriores o None, turnos recientes verbatim)
+        """
+        if sum(message_tokens(m) for m in history) <= self.token_budget:
+            return None, history
+
+        key = session_id or _prefix_fingerprint(history[:1])
+        cached = self._summaries.get(key)
+        covered, summary = 0, None
+        if cached is not None:
+            n, prefix_fp, text = cached
+            if n <= len(history) and _prefix_fingerprint(history[:n]) == prefix_fp:
+                covered, summary = n, text
+                self._summaries.move_to_end(key)
+
+        # Reutilizar el resumen si lo que queda después de él cabe en el presupuesto
+        if summary is not None and sum(message_tokens(m) for m in history[covered:]) <= self.token_budget:
+            return summary, history[covered:]
+
+        # Nuevo corte: dejar la mitad del presupuesto a los turnos recientes para
+        # que el resumen sirva durante varios turnos antes de volver a ampliarse
+        cut = len(history)
+        used = 0
+        while cut > covered:
+            tokens = message_tokens(history[cut - 1])
+            if used + tokens > self.token_budget // 2 and len(history) - cut >= CHAT_MIN_RECENT_MESSAGES:
+                break
+            used += tokens
+            cut -= 1
+
+        if cut <= covered:
+            return summary, history[covered:]
+
+        try:
+            summary = await self._summarize(summary, history[covered:cut])
+        except Exception:
+            # Sin resumen: se descartan los turnos anteriores
+            return summary, history[cut:]
+
+        self._summaries[key] = (cut, _prefix_fingerprint(history[:cut]), summary)
+        self._summaries.move_to_end(key)
+        while len(self._summaries) > self.cache_size:
+            self._summaries.popitem(last=False)
+        return summary, history[cut:]
+
+    async def _summarize(self, previous: Optional[str], messages: List[Dict]) -> str:
+        """Integrar nuevos mensajes al resumen anterior"""
+        transcript = "\n".join(
+            f"{'Usuario' if m.get('role') == 'user' else 'Asistente'}: {m.get('content')}"
+            for m in messages
+        )
+        prompt = f"RESUMEN PREVIO:\n{previous}\n\n" if previous else ""
+        prompt += f"NUEVOS MENSAJES:\n{transcript}"
+        return await self.ai_service.chat_completion(
+            [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=self.summary_max_tokens,
+            priority=PRIORITY_INTERACTIVE
+        )
+
+def with_summary(system_prompt: str, summary: Optional[str]) -> str:
+    """Agregar el resumen de la conversación al system prompt"""
+    if not summary:
+        return system_prompt
+    return f"{system_prompt}\n\nRESUMEN DE LA CONVERSACIÓN ANTERIOR:\n{summary}"
@@ -0,0 +1,152 @@
+import os
+import re
+import json
+import random
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional
+from app.services.conversation_history import estimate_tokens
+from app.services.metrics import record_usage
+
+# Proveedor local para benchmarks y desarrollo sin red (AI_PROVIDER=fake)
+FAKE_LLM_LATENCY_MS = float(os.getenv('FAKE_LLM_LATENCY_MS', 0))
+FAKE_LLM_LATENCY_JITTER_MS = float(os.getenv('FAKE_LLM_LATENCY_JITTER_MS', 0))
+FAKE_LLM_DISTRIBUTION = os.getenv('FAKE_LLM_DISTRIBUTION', 'constant')
+FAKE_LLM_JSON_FORMAT = os.getenv('FAKE_LLM_JSON_FORMAT', 'plain')
+FAKE_LLM_ERROR_RATE = float(os.getenv('FAKE_LLM_ERROR_RATE', 0))
+FAKE_LLM_STREAM_CHUNK = int(os.getenv('FAKE_LLM_STREAM_CHUNK', 16))
+FAKE_LLM_SEED = os.getenv('FAKE_LLM_SEED')
+
+DISTRIBUTIONS = ('constant', 'uniform', 'normal', 'lognormal')
+JSON_FORMATS = ('plain', 'fenced', 'trailing_comma', 'prose')
+
+ANALYSIS_TEXT = """**DIAGNÓSTICO ACTUAL**
+Tus finanzas están estables, con margen para mejorar el ahorro.
+
+**INSIGHTS CLAVE**
+- La categoría principal concentra la mayor parte del gasto
+- Hay gastos pequeños y frecuentes que suman una cantidad relevante
+- Los ingresos son estables mes a mes
+
+**RECOMENDACIONES ACCIONABLES**
+1. Define un presupuesto mensual para la categoría principal
+2. Automatiza una transferencia de ahorro al recibir ingresos
+3. Revisa las suscripciones que no usas
+
+**NIVEL DE RIESGO**: Medio"""
+
+class FakeLLMError(Exception):
+    status_code = 503
+
+class FakeProvider:
+    """
+    Proveedor simulado: sin red, con latencia y formato de salida configurables
+
+    Genera respuestas con la forma que espera cada llamada del servicio:
+    JSON de categorización (individual o por lotes) cuando el system prompt
+    pide JSON, y un análisis en markdown con secciones y viñetas en otro caso.
+
+    Latencia: `constant` (latency_ms), `uniform` (± jitter_ms), `normal`
+    (desviación jitter_ms) o `lognormal` (mediana latency_ms, cola larga).
+    Formato JSON: `plain`, `fenced` (dentro de ```json, con texto alrededor),
+    `trailing_comma` (JSON con comas finales, que requiere reparación) o
+    `prose` (sin JSON, para medir el reintento y el camino no parseable).
+    El modo JSON (response_schema) se ignora: simula un modelo que no lo respeta.
+    """
+
+    name = 'fake'
+    model_name = 'fake-llm'
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        latency_ms: float = FAKE_LLM_LATENCY_MS,
+        jitter_ms: float = FAKE_LLM_LATENCY_JITTER_MS,
+        distribution: str = FAKE_LLM_DISTRIBUTION,
+        json_format: str = FAKE_LLM_JSON_FORMAT,
+        error_rate: float = FAKE_LLM_ERROR_RATE,
+        seed: Optional[int] = None
+    ):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Distribución no válida: {distribution}. Usa: {', '.join(DISTRIBUTIONS)}")
+        if json_format not in JSON_FORMATS:
+            raise ValueError(f"Formato no válido: {json_format}. Usa: {', '.join(JSON_FORMATS)}")
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.json_format = json_format
+        self.error_rate = error_rate
+        self.rng = random.Random(seed if seed is not None else FAKE_LLM_SEED)
+        self.semaphore = asyncio.Semaphore(int(os.getenv('FAKE_MAX_CONCURRENCY', 1024)))
+        self.calls = 0
+
+    def sample_latency(self) -> float:
+        """Latencia en segundos según la distribución configurada"""
+        base, jitter = self.latency_ms, self.jitter_ms
+        if self.distribution == 'uniform':
+            ms = self.rng.uniform(base - jitter, base + jitter)
+        elif self.distribution == 'normal':
+            ms = self.rng.gauss(base, jitter)
+        elif self.distribution == 'lognormal':
+            # jitter_ms actúa como sigma relativa (ms) sobre la mediana
+            sigma = jitter / base if base > 0 else 0.0
+            ms = base * self.rng.lognormvariate(0, sigma)
+        else:
+            ms = base
+        return max(0.0, ms) / 1000
+
+    def respond(self, messages: List[Dict]) -> str:
+        """Texto de respuesta para los mensajes dados"""
+        system = "\n".join(m['content'] for m in messages if m['role'] == 'system')
+        prompt = "\n".join(m['content'] for m in messages if m['role'] == 'user')
+
+        if '"resultados"' in system:
+            ids = re.findall(r'^(\d+)\. ', prompt, flags=re.MULTILINE)
+            categorias = _categories_from(system)
+            payload = {"resultados": [
+                {"id": int(i), "categoria": self.rng.choice(categorias), "confidence": 0.9, "reasoning": "Simulado"}
+                for i in ids
+            ]}
+        elif '"categoria"' in system:
+            payload = {"categoria": self.rng.choice(_categories_from(system)), "confidence": 0.9, "reasoning": "Simulado"}
+        else:
+            return ANALYSIS_TEXT
+
+        if self.json_format == 'fenced':
+            return f"Aquí está el resultado:\n```json\n{json.dumps(payload, ensure_ascii=False)}\n```"
+        if self.json_format == 'trailing_comma':
+            return json.dumps(payload, ensure_ascii=False).replace('}', ',}').replace(']', ',]')
+        if self.json_format == 'prose':
+            return "No pude determinar la categoría con certeza."
+        return json.dumps(payload, ensure_ascii=False)
+
+    async def complete(self, messages, temperature, max_tokens, session_id=None, response_schema=None) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.sample_latency())
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise FakeLLMError("error simulado")
+        text = self.respond(messages)
+        record_usage(self.name, sum(estimate_tokens(m['content']) for m in messages), estimate_tokens(text))
+        return text
+
+    async def stream(self, messages, temperature, max_tokens, session_id=None) -> AsyncIterator[str]:
+        self.calls += 1
+        text = self.respond(messages)
+        pieces = [text[i:i + FAKE_LLM_STREAM_CHUNK] for i in range(0, len(text), FAKE_LLM_STREAM_CHUNK)]
+        # La latencia total se reparte: primer fragmento y el resto entre fragmentos
+        total = self.sample_latency()
+        await asyncio.sleep(total / 2)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise FakeLLMError("error simulado")
+        for piece in pieces:
+            yield piece
+            await asyncio.sleep(total / 2 / max(1, len(pieces)))
+
+    async def close(self):
+        pass
+
+def _categories_from(system_prompt: str) -> List[str]:
+    """Categorías listadas en el prompt de categorización"""
+    for line in system_prompt.splitlines():
+        if ', ' in line and 'Otros' in line:
+            return [c.strip() for c in line.split(',')]
+    return ["Otros"]
@@ -1,33 +1,83 @@
-from typing import List, Dict
-from app.models import Transaction, FinancialData
+import os
+import asyncio
+from typing import List, Dict, AsyncIterator
+from app.models import Transaction, FinancialData, BatchCategorizationResult
 from app.services.ai_service import AIService
+from app.services.categorization_cache import CategorizationCache
+from app.services.local_classifier import LocalClassifier, LOCAL_CLASSIFIER_THRESHOLD
+from app.services.financial_metrics import category_month_totals, compute_financial_metrics, risk_level_from_savings
+from app.services.summary_store import SummaryStore
+from app.services.response_cache import ResponseCache, fingerprint
+from app.services.forecasting import forecast_spending
+from app.services.transaction_table import TransactionTable
+from app.services.analysis_pipelines import PIPELINES, build_pipeline, budget_actuals, local_analysis
+from app.services.budget_engine import budget_report, format_status, parse_reference_date
+from app.services.pattern_detection import PATTERN_CONTEXT_ITEMS, PATTERN_MAX_RESULTS, detect_patterns, format_patterns
+from app.services.conversation_history import HistoryManager, with_summary
+from app.services.request_scheduler import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from app.services.metrics import stage
+from app.services.compute_pool import ComputePool
 from datetime import datetime
 
+# Categorías permitidas por tipo de transacción
+CATEGORIAS = {
+    "gasto": [
+        "Alimentación", "Transporte", "Vivienda", "Servicios",
+        "Entretenimiento", "Salud", "Educación", "Ropa", "Otros"
+    ],
+    "ingreso": [
+        "Salario", "Freelance", "Negocio", "Inversiones", "Regalo", "Otros"
+    ],
+}
+
+# Categorización por lotes: transacciones por prompt y prompts simultáneos
+CATEGORIZE_BATCH_SIZE = int(os.getenv("CATEGORIZE_BATCH_SIZE", 50))
+CATEGORIZE_BATCH_CONCURRENCY = int(os.getenv("CATEGORIZE_BATCH_CONCURRENCY", 4))
+
+# Presupuestos (los más comprometidos) incluidos en el contexto del análisis completo
+BUDGET_CONTEXT_ITEMS = int(os.getenv("BUDGET_CONTEXT_ITEMS", 5))
+
+def categorias_para(tipo: str) -> List[str]:
+    """Lista de categorías permitidas para un tipo ('gasto' o 'ingreso')"""
+    return CATEGORIAS["gasto"] if tipo == "gasto" else CATEGORIAS["ingreso"]
+
 class FinancialAnalyzer:
     """Analizador financiero usando IA"""
     
-    def __init__(self):
-        self.ai_service = AIService()
+    def __init__(self, ai_service: AIService = None):
+        self.ai_service = ai_service or AIService()
+        self.categorization_cache = CategorizationCache()
+        self.local_classifier = LocalClassifier()
+        self.summary_store = SummaryStore()
+        self.analysis_cache = ResponseCache()
+        self.history_manager = HistoryManager(self.ai_service)
+        self.compute_pool = ComputePool()
         
-    def _prepare_financial_context(self, data: FinancialData) -> str:
+    async def _local_metrics(self, data: FinancialData, patterns: bool = True) -> Dict:
+        """
+        Métricas y, si se piden, pagos recurrentes y gastos inusuales sobre la tabla columnar del historial
+
+        Con historiales grandes ambos cálculos corren en paralelo en el pool de cómputo.
+        """
+        table = TransactionTable.from_financial_data(data)
+        if not patterns:
+            return await self.compute_pool.run(compute_financial_metrics, table)
+        metrics, patrones = await asyncio.gather(
+            self.compute_pool.run(compute_financial_metrics, table),
+            self.compute_pool.run(detect_patterns, table, PATTERN_CONTEXT_ITEMS),
+        )
+        metrics["patrones"] = patrones
+        return metrics
+
+    def _prepare_financial_context(self, data: FinancialData, metrics: Dict = None) -> str:
         """Preparar contexto financiero para la IA"""
         
-        # Calcular métricas básicas
-        total_ingresos = sum(float(i.monto) for i in data.ingresos)
-        total_gastos = sum(float(g.monto) for g in data.gastos)
-        saldo = total_ingresos - total_gastos
-        
-        # Gastos por categoría
-        gastos_por_categoria = {}
-        for gasto in data.gastos:
-            cat = gasto.categoria or "Sin categoría"
-            gastos_por_categoria[cat] = gastos_por_categoria.get(cat, 0) + float(gasto.monto)
-        
-        # Ingresos por fuente
-        ingresos_por_fuente = {}
-        for ingreso in data.ingresos:
-            fuente = ingreso.fuente or "Sin fuente"
-            ingresos_por_fuente[fuente] = ingresos_por_fuente.get(fuente, 0) + float(ingreso.monto)
+        # Calcular métricas básicas (sobre la tabla columnar)
+        if metrics is None:
+            metrics = compute_financial_metrics(TransactionTable.from_financial_data(data))
+        total_ingresos = metrics["total_ingresos"]
+        total_gastos = metrics["total_gastos"]
+        saldo = metrics["saldo"]
         
         # Construir contexto
         context = f"""
@@ -38,45 +88,106 @@ RESUMEN FINANCIERO:
    • Total Ingresos: ${total_ingresos:,.2f}
    • Total Gastos: ${total_gastos:,.2f}
    • Saldo Actual: ${saldo:,.2f}
-   • Tasa de Ahorro: {(saldo/total_ingresos*100 if total_ingresos > 0 else 0):.1f}%
-   • Número de Transacciones: {len(data.gastos) + len(data.ingresos)}
+   • Tasa de Ahorro: {metrics["savings_rate"]:.1f}%
+   • Número de Transacciones: {metrics["num_transacciones"]}
 
 💸 DISTRIBUCIÓN DE GASTOS:
 """
         # Top categorías de gasto
-        sorted_gastos = sorted(gastos_por_categoria.items(), key=lambda x: x[1], reverse=True)
-        for cat, monto in sorted_gastos[:5]:
+        for cat, monto in metrics["gastos_por_categoria"][:5]:
             percentage = (monto / total_gastos * 100) if total_gastos > 0 else 0
             context += f"   • {cat}: ${monto:,.2f} ({percentage:.1f}%)\n"
         
         context += "\n💰 FUENTES DE INGRESO:\n"
-        for fuente, monto in sorted(ingresos_por_fuente.items(), key=lambda x: x[1], reverse=True):
+        for fuente, monto in metrics["ingresos_por_fuente"]:
             percentage = (monto / total_ingresos * 100) if total_ingresos > 0 else 0
             context += f"   • {fuente}: ${monto:,.2f} ({percentage:.1f}%)\n"
         
         # Últimas transacciones
-        if data.gastos:
+        if metrics["ultimos_gastos"]:
             context += "\n📉 ÚLTIMOS 5 GASTOS:\n"
-            for gasto in sorted(data.gastos, key=lambda x: x.fecha, reverse=True)[:5]:
+            for gasto in metrics["ultimos_gastos"]:
                 context += f"   • {gasto.fecha[:10]}: ${gasto.monto} - {gasto.categoria} - {gasto.descripcion or 'N/A'}\n"
         
-        if data.ingresos:
+        if metrics["ultimos_ingresos"]:
             context += "\n📈 ÚLTIMOS 3 INGRESOS:\n"
-            for ingreso in sorted(data.ingresos, key=lambda x: x.fecha, reverse=True)[:3]:
+            for ingreso in metrics["ultimos_ingresos"]:
                 context += f"   • {ingreso.fecha[:10]}: ${ingreso.monto} - {ingreso.fuente}\n"
         
-        # Presupuestos
+        # Pagos recurrentes y gastos inusuales (solo con el historial completo, no con el resumen)
+        if metrics.get("patrones"):
+            context += format_patterns(metrics["patrones"], PATTERN_CONTEXT_ITEMS)
+
+        # Presupuestos: los más comprometidos, con gasto real y proyección
         if data.presupuestos:
-            context += f"\n🎯 PRESUPUESTOS ACTIVOS: {len(data.presupuestos)}\n"
-            for p in data.presupuestos[:3]:
-                context += f"   • {p.get('categoria')}: ${p.get('monto_limite')} ({p.get('mes')})\n"
+            report = budget_report(data.presupuestos, budget_actuals(data, metrics))
+            context += f"\n🎯 PRESUPUESTOS ACTIVOS: {len(data.presupuestos)} ({report['excedidos']} excedidos, {report['en_riesgo']} en riesgo)\n"
+            for status in report["presupuestos"][:BUDGET_CONTEXT_ITEMS]:
+                context += f"   • {format_status(status)}\n"
         
         return context
     
-    async def generate_complete_analysis(self, data: FinancialData) -> Dict:
-        """Generar análisis financiero completo"""
+    async def generate_complete_analysis(
+        self,
+        data: FinancialData,
+        metrics: Dict = None,
+        analysis_type: str = "complete",
+        degraded: bool = False
+    ) -> Dict:
+        """
+        Generar análisis financiero completo
         
-        context = self._prepare_financial_context(data)
+        El resultado se guarda en caché con la huella del contexto y el tipo de
+        análisis: si los datos no cambiaron no se vuelve a llamar al proveedor,
+        y las solicitudes idénticas simultáneas comparten la llamada. La clave
+        no incluye el proveedor: tras un failover responde otro distinto del
+        configurado, y cualquier respuesta es válida para el mismo contexto
+        hasta que venza ANALYSIS_CACHE_TTL.
+        Con degraded (servicio saturado) no se llama al proveedor: se devuelve
+        el análisis guardado o uno armado con los insights locales.
+        """
+        
+        with stage("complete", "context_build"):
+            if metrics is None:
+                metrics = await self._local_metrics(data)
+            context = self._prepare_financial_context(data, metrics)
+        
+        key = fingerprint(context, analysis_type)
+        if degraded:
+            return self._cached_or_local(key, lambda: self._local_complete_analysis(data, metrics))
+        result = await self.analysis_cache.get_or_compute(
+            key, lambda: self._run_complete_analysis(context, metrics)
+        )
+        return dict(result)
+    
+    def _cached_or_local(self, key: str, local) -> Dict:
+        """Análisis guardado con la misma huella o, si no hay, el calculado sin IA (que no se guarda)"""
+        cached = self.analysis_cache.lookup(key)
+        if cached is not None:
+            return dict(cached)
+        return local()
+    
+    def _local_complete_analysis(self, data: FinancialData, metrics: Dict) -> Dict:
+        """Análisis completo sin IA: insights de gasto, ahorro y presupuestos"""
+        insights = []
+        for analysis_type in PIPELINES:
+            if analysis_type != "budget" or data.presupuestos:
+                insights += build_pipeline(analysis_type, data, metrics)["insights"]
+        return {
+            "analysis": local_analysis(insights),
+            "insights": insights,
+            "recommendations": [],
+            "risk_level": risk_level_from_savings(metrics["savings_rate"]),
+            "metrics": {
+                "total_ingresos": metrics["total_ingresos"],
+                "total_gastos": metrics["total_gastos"],
+                "saldo": metrics["saldo"],
+                "savings_rate": metrics["savings_rate"]
+            }
+        }
+    
+    async def _run_complete_analysis(self, context: str, metrics: Dict) -> Dict:
+        """Llamar al modelo y extraer insights, recomendaciones y nivel de riesgo"""
         
         system_prompt = """Eres un asesor financiero experto certificado. 
         
@@ -109,23 +220,16 @@ Usa emojis ocasionalmente 💰📊✨ y sé motivador pero honesto."""
             {"role": "user", "content": prompt}
         ]
         
-        analysis_text = await self.ai_service.chat_completion(messages, temperature=0.7, max_tokens=1200)
+        with stage("complete", "provider_call"):
+            analysis_text = await self.ai_service.chat_completion(messages, temperature=0.7, max_tokens=1200)
         
         # Extraer insights y recomendaciones del texto
-        insights = self._extract_bullet_points(analysis_text, ["insights", "hallazgos", "patrones"])
-        recommendations = self._extract_bullet_points(analysis_text, ["recomendaciones", "acciones", "sugerencias"])
+        with stage("complete", "bullet_extraction"):
+            insights = self._extract_bullet_points(analysis_text, ["insights", "hallazgos", "patrones"])
+            recommendations = self._extract_bullet_points(analysis_text, ["recomendaciones", "acciones", "sugerencias"])
         
         # Determinar nivel de riesgo
-        total_ingresos = sum(float(i.monto) for i in data.ingresos)
-        total_gastos = sum(float(g.monto) for g in data.gastos)
-        savings_rate = ((total_ingresos - total_gastos) / total_ingresos * 100) if total_ingresos > 0 else 0
-        
-        if savings_rate >= 20:
-            risk_level = "Bajo"
-        elif savings_rate >= 10:
-            risk_level = "Medio"
-        else:
-            risk_level = "Alto"
+        risk_level = risk_level_from_savings(metrics["savings_rate"])
         
         return {
             "analysis": analysis_text,
@@ -133,75 +237,370 @@ Usa emojis ocasionalmente 💰📊✨ y sé motivador pero honesto."""
             "recommendations": recommendations,
             "risk_level": risk_level,
             "metrics": {
-                "total_ingresos": total_ingresos,
-                "total_gastos": total_gastos,
-                "saldo": total_ingresos - total_gastos,
-                "savings_rate": savings_rate
+                "total_ingresos": metrics["total_ingresos"],
+                "total_gastos": metrics["total_gastos"],
+                "saldo": metrics["saldo"],
+                "savings_rate": metrics["savings_rate"]
             }
         }
     
-    async def categorize_transaction(self, descripcion: str, monto: float, tipo: str) -> Dict:
-        """Categorizar automáticamente una transacción"""
+    async def analyze(
+        self,
+        data: FinancialData,
+        metrics: Dict = None,
+        analysis_type: str = "complete",
+        degraded: bool = False
+    ) -> Dict:
+        """Ejecutar el análisis correspondiente a analysis_type (sin IA si degraded)"""
+        if analysis_type == "complete":
+            return await self.generate_complete_analysis(data, metrics, analysis_type, degraded)
+        if analysis_type not in PIPELINES:
+            raise ValueError(
+                f"Tipo de análisis '{analysis_type}' no válido. Usa: complete, {', '.join(PIPELINES)}"
+            )
+        return await self.generate_focused_analysis(data, metrics, analysis_type, degraded)
+    
+    async def generate_focused_analysis(
+        self,
+        data: FinancialData,
+        metrics: Dict = None,
+        analysis_type: str = "spending",
+        degraded: bool = False
+    ) -> Dict:
+        """
+        Análisis acotado (spending, savings o budget)
         
-        if tipo == "gasto":
-            categorias = [
-                "Alimentación", "Transporte", "Vivienda", "Servicios",
-                "Entretenimiento", "Salud", "Educación", "Ropa", "Otros"
-            ]
-        else:  # ingreso
-            categorias = [
-                "Salario", "Freelance", "Negocio", "Inversiones", "Regalo", "Otros"
-            ]
+        Solo arma la sección de contexto que necesita, calcula las métricas e
+        insights localmente y usa un prompt corto con pocos tokens para el texto.
+        """
+        with stage(analysis_type, "context_build"):
+            if metrics is None:
+                metrics = await self._local_metrics(data, patterns=analysis_type == "spending")
+            pipeline = build_pipeline(analysis_type, data, metrics)
+        config = PIPELINES[analysis_type]
         
-        system_prompt = f"""Eres un experto en finanzas personales. 
+        async def run() -> Dict:
+            messages = [
+                {"role": "system", "content": config["system_prompt"]},
+                {"role": "user", "content": pipeline["context"]}
+            ]
+            with stage(analysis_type, "provider_call"):
+                analysis_text = await self.ai_service.chat_completion(
+                    messages, temperature=0.5, max_tokens=config["max_tokens"]
+                )
+            with stage(analysis_type, "bullet_extraction"):
+                recommendations = self._extract_bullet_points(analysis_text, ["recomendaciones", "acciones", "sugerencias"])
+            return {
+                "analysis": analysis_text,
+                "insights": pipeline["insights"],
+                "recommendations": recommendations,
+                "risk_level": pipeline["risk_level"],
+                "metrics": pipeline["metrics"]
+            }
         
-Categoriza la siguiente transacción en UNA de estas categorías:
-{', '.join(categorias)}
+        key = fingerprint(pipeline["context"], analysis_type)
+        if degraded:
+            return self._cached_or_local(key, lambda: {
+                "analysis": local_analysis(pipeline["insights"]),
+                "insights": pipeline["insights"],
+                "recommendations": [],
+                "risk_level": pipeline["risk_level"],
+                "metrics": pipeline["metrics"]
+            })
+        result = await self.analysis_cache.get_or_compute(key, run)
+        return dict(result)
+    
+    async def detect_patterns(self, data: FinancialData, max_results: int = None) -> Dict:
+        """Pagos recurrentes y gastos inusuales del historial, sin IA"""
+        with stage("patterns", "metrics"):
+            return await self.compute_pool.run(
+                detect_patterns, TransactionTable.from_financial_data(data), max_results or PATTERN_MAX_RESULTS
+            )
 
-Responde SOLO con un JSON en este formato:
-{{
-    "categoria": "nombre_de_categoria",
-    "confidence": 0.95,
-    "reasoning": "breve explicación"
-}}"""
+    async def track_budgets(self, data: FinancialData, metrics: Dict = None, fecha_referencia: str = None) -> Dict:
+        """
+        Presupuesto contra gasto real, sin IA
 
-        prompt = f"""Transacción:
-- Descripción: {descripcion}
-- Monto: ${monto}
-- Tipo: {tipo}
+        Usa el índice (categoría, mes) del resumen si se envían sus métricas;
+        si no, lo calcula con un solo agrupamiento sobre la tabla columnar.
+        """
+        hoy = parse_reference_date(fecha_referencia)
+        with stage("budgets", "metrics"):
+            if metrics and "gastos_por_categoria_mes" in metrics:
+                actuals = metrics["gastos_por_categoria_mes"]
+            else:
+                actuals = await self.compute_pool.run(category_month_totals, TransactionTable.from_financial_data(data))
+            return budget_report(data.presupuestos, actuals, hoy)
 
-Categorízala."""
+    async def predict_spending(
+        self,
+        historical_data: List[Transaction],
+        months_ahead: int = 1,
+        narrate: bool = False
+    ) -> Dict:
+        """
+        Pronosticar el gasto mensual por categoría
+        
+        Los números se calculan localmente; la IA solo se usa, si se pide,
+        para explicarlos en lenguaje natural.
+        """
+        with stage("predict", "forecast"):
+            forecast = await self.compute_pool.run(
+                forecast_spending, TransactionTable.from_transactions(historical_data), months_ahead
+            )
+        forecast["narrative"] = None
+        
+        if narrate and forecast["total"]:
+            lines = ["Total: " + ", ".join(f"{p['mes']} ${p['monto']:,.2f} (${p['lower']:,.2f}-${p['upper']:,.2f})" for p in forecast["total"])]
+            for c in forecast["categories"]:
+                lines.append(f"{c['categoria']}: " + ", ".join(f"{p['mes']} ${p['monto']:,.2f}" for p in c["predicciones"]))
+            
+            messages = [
+                {"role": "system", "content": "Eres un asesor financiero. Explica en español, en 1-2 párrafos breves, el pronóstico de gastos que recibes. No inventes cifras."},
+                {"role": "user", "content": "PRONÓSTICO DE GASTOS:\n" + "\n".join(lines)}
+            ]
+            try:
+                forecast["narrative"] = await self.ai_service.chat_completion(messages, temperature=0.5, max_tokens=300)
+            except Exception:
+                # El pronóstico numérico sigue siendo válido sin la narrativa
+                pass
+        
+        return forecast
+    
+    async def categorize_transaction(
+        self,
+        descripcion: str,
+        monto: float,
+        tipo: str,
+        degraded: bool = False,
+        priority: int = PRIORITY_BACKGROUND
+    ) -> Dict:
+        """
+        Categorizar automáticamente una transacción (con degraded, solo caché y clasificador local)
 
+        Solo se juntan en un lote las solicitudes de la misma prioridad: una
+        categorización interactiva no espera turno como las de segundo plano.
+        """
+        
+        categorias = categorias_para(tipo)
+        
+        cached = self.categorization_cache.get(descripcion, tipo, categorias)
+        if cached is not None:
+            return cached
+        
+        # Clasificador local: si está seguro, no hace falta llamar al modelo
+        local = self.local_classifier.classify(descripcion, tipo, categorias)
+        if local is not None and local["confidence"] >= LOCAL_CLASSIFIER_THRESHOLD:
+            return local
+        if degraded:
+            return local or {
+                "categoria": "Otros",
+                "confidence": 0.0,
+                "reasoning": "Sin IA por alta demanda"
+            }
+        
         try:
-            result = await self.ai_service.structured_completion(prompt, system_prompt, temperature=0.3)
+            # Las solicitudes concurrentes del mismo tipo se juntan en un solo prompt
+            result = await self.ai_service.scheduler.batch(
+                ("categorize", tipo, priority),
+                {"descripcion": descripcion, "monto": monto},
+                lambda items: self._categorize_chunk(tipo, items, priority),
+                max_size=CATEGORIZE_BATCH_SIZE
+            )
+            if result.get("error"):
+                raise Exception(result["error"])
+            categoria = result["categoria"]
             
-            # Validar que la categoría esté en la lista
-            categoria = result.get("categoria", "Otros")
-            if categoria not in categorias:
-                categoria = "Otros"
-            
-            return {
+            categorization = {
                 "categoria": categoria,
                 "confidence": result.get("confidence", 0.8),
                 "reasoning": result.get("reasoning", "Categorización automática")
             }
+            if not result.get("coerced"):
+                self.categorization_cache.set(descripcion, tipo, categorias, categorization)
+            return categorization
         except Exception as e:
-            # Fallback: categoría por defecto
+            # Fallback: mejor estimación local o categoría por defecto
+            if local is not None:
+                return local
             return {
                 "categoria": "Otros",
                 "confidence": 0.5,
                 "reasoning": f"Error en categorización: {str(e)}"
             }
     
-    async def chat_with_context(
-        self, 
-        message: str, 
+    def confirm_categorization(self, descripcion: str, tipo: str, categoria: str) -> Dict:
+        """
+        Registrar la categoría confirmada por el usuario
+        
+        Entrena el clasificador local y reemplaza la entrada de la caché.
+        """
+        categorias = categorias_para(tipo)
+        if categoria not in categorias:
+            raise ValueError(f"Categoría '{categoria}' no válida para {tipo}")
+        
+        self.local_classifier.learn(descripcion, tipo, categoria)
+        categorization = {
+            "categoria": categoria,
+            "confidence": 1.0,
+            "reasoning": "Confirmada por el usuario"
+        }
+        self.categorization_cache.set(descripcion, tipo, categorias, categorization)
+        return categorization
+    
+    async def categorize_batch(self, transactions: List[Dict], degraded: bool = False) -> Dict:
+        """
+        Categorizar muchas transacciones empaquetándolas en pocos prompts
+        
+        Las transacciones se agrupan por tipo y se dividen en bloques de
+        CATEGORIZE_BATCH_SIZE; cada bloque es una sola llamada al modelo y
+        los bloques se procesan en paralelo con un límite de concurrencia.
+        Las transacciones ya presentes en la caché o que el clasificador local
+        resuelve con confianza suficiente no se envían al modelo. Con degraded
+        (servicio saturado) no se llama al modelo: el resto queda con la mejor
+        estimación local o, sin ella, como fallido para reintentar más tarde.
+        
+        Args:
+            transactions: Lista de {"descripcion", "monto", "tipo"}
+            
+        Returns:
+            {"results": [...], "failed": n, "chunks": n} con un resultado por
+            transacción en el orden de entrada; los fallidos llevan "error"
+        """
+        results: List[Dict] = [None] * len(transactions)
+        
+        por_tipo = {"gasto": [], "ingreso": []}
+        for i, t in enumerate(transactions):
+            tipo = "gasto" if t["tipo"] == "gasto" else "ingreso"
+            cached = self.categorization_cache.get(t["descripcion"], tipo, categorias_para(tipo))
+            if cached is None:
+                local = self.local_classifier.classify(t["descripcion"], tipo, categorias_para(tipo))
+                if local is not None and local["confidence"] >= LOCAL_CLASSIFIER_THRESHOLD:
+                    cached = local
+                elif degraded:
+                    # Sin modelo: la mejor estimación local aunque tenga poca confianza
+                    cached = local
+            if cached is not None:
+                results[i] = {"index": i, **cached, "error": None}
+            elif degraded:
+                results[i] = {"index": i, "categoria": "Otros", "confidence": 0.0, "reasoning": None, "error": "Sin IA por alta demanda"}
+            else:
+                por_tipo[tipo].append(i)
+        
+        chunks = []
+        for tipo, indices in por_tipo.items():
+            for start in range(0, len(indices), CATEGORIZE_BATCH_SIZE):
+                chunks.append((tipo, indices[start:start + CATEGORIZE_BATCH_SIZE]))
+        
+        semaphore = asyncio.Semaphore(CATEGORIZE_BATCH_CONCURRENCY)
+        
+        async def run_chunk(tipo: str, indices: List[int]):
+            async with semaphore:
+                try:
+                    chunk_results = await self._categorize_chunk(tipo, [transactions[i] for i in indices])
+                except Exception as e:
+                    chunk_results = [{"error": f"Error en categorización: {str(e)}"}] * len(indices)
+            for i, result in zip(indices, chunk_results):
+                if result.get("error"):
+                    result = {
+                        "categoria": "Otros",
+                        "confidence": 0.0,
+                        "reasoning": None,
+                        "error": result["error"]
+                    }
+                else:
+                    coerced = result.pop("coerced", False)
+                    if not coerced:
+                        to_cache.append((
+                            transactions[i]["descripcion"], tipo, categorias_para(tipo),
+                            {k: result[k] for k in ("categoria", "confidence", "reasoning")}
+                        ))
+                results[i] = {"index": i, **result}
+        
+        to_cache = []
+        await asyncio.gather(*(run_chunk(tipo, indices) for tipo, indices in chunks))
+        # Una sola transacción de SQLite para todo el lote
+        self.categorization_cache.set_many(to_cache)
+        
+        return {
+            "results": results,
+            "failed": sum(1 for r in results if r.get("error")),
+            "chunks": len(chunks)
+        }
+    
+    async def _categorize_chunk(self, tipo: str, transactions: List[Dict], priority: int = PRIORITY_BACKGROUND) -> List[Dict]:
+        """Categorizar un bloque de transacciones del mismo tipo en una sola llamada"""
+        categorias = categorias_para(tipo)
+        
+        system_prompt = f"""Eres un experto en finanzas personales.
+
+Categoriza CADA transacción en UNA de estas categorías:
+{', '.join(categorias)}
+
+Responde SOLO con un JSON en este formato, con un elemento por transacción:
+{{
+    "resultados": [
+        {{"id": 0, "categoria": "nombre_de_categoria", "confidence": 0.95, "reasoning": "breve explicación"}}
+    ]
+}}"""
+
+        lines = [
+            f"{n}. {t['descripcion']} | ${t['monto']}"
+            for n, t in enumerate(transactions)
+        ]
+        prompt = f"Transacciones ({tipo}), formato id. descripción | monto:\n" + "\n".join(lines)
+        
+        result = await self.ai_service.structured_completion(
+            prompt,
+            system_prompt,
+            temperature=0.3,
+            max_tokens=min(8192, 200 + 60 * len(transactions)),
+            priority=priority,
+            response_model=BatchCategorizationResult
+        )
+        
+        by_id = {item["id"]: item for item in result["resultados"]}
+        
+        chunk_results = []
+        for n in range(len(transactions)):
+            item = by_id.get(n)
+            if item is None:
+                chunk_results.append({"error": "Sin respuesta del modelo para esta transacción"})
+                continue
+            
+            # Validar que la categoría esté en la lista; las corregidas no se cachean
+            categoria = item.get("categoria", "Otros")
+            coerced = categoria not in categorias
+            if coerced:
+                categoria = "Otros"
+            
+            chunk_results.append({
+                "categoria": categoria,
+                "confidence": item["confidence"],
+                "reasoning": item["reasoning"] or "Categorización automática",
+                "error": None,
+                "coerced": coerced
+            })
+        return chunk_results
+    
+    async def _build_chat_messages(
+        self,
+        message: str,
         conversation_history: List[Dict],
-        financial_data: FinancialData
-    ) -> str:
-        """Chat contextual con datos financieros"""
+        financial_data: FinancialData,
+        metrics: Dict = None,
+        session_id: str = None
+    ) -> List[Dict]:
+        """
+        Construir mensajes de chat con el contexto financiero como system prompt
+        
+        El historial se compacta al presupuesto de tokens: los turnos antiguos
+        llegan como resumen dentro del system prompt.
+        """
         
-        context = self._prepare_financial_context(financial_data)
+        if metrics is None:
+            metrics = await self._local_metrics(financial_data)
+        context = self._prepare_financial_context(financial_data, metrics)
         
         system_prompt = f"""Eres "FinBot", un asistente financiero personal inteligente y amigable.
 
@@ -228,13 +627,49 @@ DATOS FINANCIEROS DEL USUARIO:
 
 Responde SIEMPRE en español, de forma clara y motivadora."""
 
-        messages = [{"role": "system", "content": system_prompt}]
-        messages.extend(conversation_history)
-        messages.append({"role": "user", "content": message})
+        summary, recent = await self.history_manager.compact(conversation_history, session_id)
         
-        response = await self.ai_service.chat_completion(messages, temperature=0.7, max_tokens=800)
+        messages = [{"role": "system", "content": with_summary(system_prompt, summary)}]
+        messages.extend(recent)
+        messages.append({"role": "user", "content": message})
+        return messages
+    
+    async def chat_with_context(
+        self, 
+        message: str, 
+        conversation_history: List[Dict],
+        financial_data: FinancialData,
+        metrics: Dict = None,
+        session_id: str = None
+    ) -> str:
+        """Chat contextual con datos financieros"""
+        messages = await self._build_chat_messages(
+            message, conversation_history, financial_data, metrics, session_id
+        )
+        response = await self.ai_service.chat_completion(
+            messages, temperature=0.7, max_tokens=800, session_id=session_id,
+            priority=PRIORITY_INTERACTIVE
+        )
         return response
     
+    async def chat_with_context_stream(
+        self,
+        message: str,
+        conversation_history: List[Dict],
+        financial_data: FinancialData,
+        metrics: Dict = None,
+        session_id: str = None
+    ) -> AsyncIterator[str]:
+        """Chat contextual con datos financieros, devolviendo fragmentos a medida que llegan"""
+        messages = await self._build_chat_messages(
+            message, conversation_history, financial_data, metrics, session_id
+        )
+        async for delta in self.ai_service.chat_completion_stream(
+            messages, temperature=0.7, max_tokens=800, session_id=session_id,
+            priority=PRIORITY_INTERACTIVE
+        ):
+            yield delta
+    
     def _extract_bullet_points(self, text: str, keywords: List[str]) -> List[str]:
         """Extraer puntos de una lista en el texto"""
         points = []
@@ -0,0 +1,94 @@
+from typing import List, Dict, Tuple, Union
+import numpy as np
+from app.models import Transaction, FinancialData
+from app.services.transaction_table import TransactionTable, month_label
+
+def _top_k_desc(values: np.ndarray, k: int) -> np.ndarray:
+    """Índices de los k valores mayores, de mayor a menor, sin ordenar todo el arreglo"""
+    n = len(values)
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        candidates = np.argpartition(values, n - k)[n - k:]
+    else:
+        candidates = np.arange(n)
+    return candidates[np.argsort(values[candidates], kind="stable")[::-1]]
+
+def _group_sums(codes: np.ndarray, names: List[str], amounts: np.ndarray) -> List[Tuple[str, float]]:
+    """Sumar montos por código de etiqueta en una sola pasada; devuelve [(etiqueta, suma)] de mayor a menor"""
+    if len(codes) == 0:
+        return []
+    sums = np.bincount(codes, weights=amounts, minlength=len(names))
+    present = np.bincount(codes, minlength=len(names)) > 0
+    order = [i for i in _top_k_desc(sums, len(names)) if present[i]]
+    return [(names[i], float(sums[i])) for i in order]
+
+def _sums_by_label_month(codes: np.ndarray, names: List[str], months: np.ndarray, amounts: np.ndarray) -> Dict:
+    """{(etiqueta, 'YYYY-MM'): suma} agrupando por código y mes enteros"""
+    if len(codes) == 0:
+        return {}
+    first = int(months.min())
+    n_months = int(months.max()) - first + 1
+    keys = codes.astype(np.int64) * n_months + (months - first)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    sums = np.bincount(inverse, weights=amounts)
+    return {
+        (names[k // n_months], month_label(first + k % n_months)): float(total)
+        for k, total in zip(unique.tolist(), sums.tolist())
+    }
+
+def compute_financial_metrics(
+    data: Union[TransactionTable, FinancialData],
+    recent_gastos: int = 5,
+    recent_ingresos: int = 3
+) -> Dict:
+    """
+    Calcular métricas financieras sobre la tabla columnar de transacciones
+
+    Obtiene totales, agregados por categoría/fuente y por categoría/mes,
+    tasa de ahorro y las transacciones más recientes (selección parcial
+    sobre los días enteros, no ordenamiento completo). FinancialData se
+    convierte a TransactionTable si hace falta.
+    """
+    table = data if isinstance(data, TransactionTable) else TransactionTable.from_financial_data(data)
+    gastos = table.gastos()
+    ingresos = table.ingresos()
+
+    total_gastos = float(gastos.montos.sum())
+    total_ingresos = float(ingresos.montos.sum())
+    saldo = total_ingresos - total_gastos
+    savings_rate = (saldo / total_ingresos * 100) if total_ingresos > 0 else 0
+
+    categoria_codes, categorias = gastos.label_codes("Sin categoría")
+    fuente_codes, fuentes = ingresos.label_codes("Sin fuente")
+
+    return {
+        "total_ingresos": total_ingresos,
+        "total_gastos": total_gastos,
+        "saldo": saldo,
+        "savings_rate": savings_rate,
+        "num_transacciones": len(table),
+        "gastos_por_categoria": _group_sums(categoria_codes, categorias, gastos.montos),
+        "ingresos_por_fuente": _group_sums(fuente_codes, fuentes, ingresos.montos),
+        "ultimos_gastos": _most_recent(gastos, recent_gastos),
+        "ultimos_ingresos": _most_recent(ingresos, recent_ingresos),
+        "gastos_por_categoria_mes": _sums_by_label_month(categoria_codes, categorias, gastos.meses(), gastos.montos),
+    }
+
+def category_month_totals(table: TransactionTable) -> Dict:
+    """Índice {(categoría, 'YYYY-MM'): gasto} en un solo agrupamiento de los gastos"""
+    gastos = table.gastos()
+    codes, categorias = gastos.label_codes("Sin categoría")
+    return _sums_by_label_month(codes, categorias, gastos.meses(), gastos.montos)
+
+def _most_recent(table: TransactionTable, k: int) -> List[Transaction]:
+    """Las k transacciones con fecha más reciente (selección parcial sobre los días)"""
+    return [table.row(i) for i in _top_k_desc(table.dias, k)]
+
+def risk_level_from_savings(savings_rate: float) -> str:
+    """Nivel de riesgo según la tasa de ahorro"""
+    if savings_rate >= 20:
+        return "Bajo"
+    elif savings_rate >= 10:
+        return "Medio"
+    return "Alto"
@@ -0,0 +1,125 @@
+import os
+from typing import List, Dict, Union
+import numpy as np
+from app.models import Transaction
+from app.services.transaction_table import TransactionTable, month_label
+
+# Parámetros de los modelos de pronóstico
+FORECAST_SMOOTHING_ALPHA = float(os.getenv("FORECAST_SMOOTHING_ALPHA", 0.4))
+FORECAST_TREND_WINDOW = int(os.getenv("FORECAST_TREND_WINDOW", 24))
+FORECAST_Z = 1.96  # intervalo de confianza del 95%
+
+def monthly_matrix(transactions: Union[TransactionTable, List[Transaction]]) -> Dict:
+    """
+    Agrupar gastos en una matriz categorías x meses
+
+    Returns:
+        {"categories": [...], "first_month": int, "matrix": ndarray (K, M)}
+        o matrix vacía si no hay gastos
+    """
+    if not isinstance(transactions, TransactionTable):
+        transactions = TransactionTable.from_transactions(transactions)
+    gastos = transactions.gastos()
+    if len(gastos) == 0:
+        return {"categories": [], "first_month": 0, "matrix": np.zeros((0, 0))}
+
+    codes, names = gastos.label_codes("Sin categoría")
+    # Solo las categorías presentes, en orden de aparición
+    present, codes = np.unique(codes, return_inverse=True)
+    order = np.argsort(np.unique(codes, return_index=True)[1], kind="stable")
+    months = gastos.meses()
+
+    first = int(months.min())
+    n_months = int(months.max()) - first + 1
+    n_categories = len(present)
+    flat = np.bincount(codes * n_months + (months - first), weights=gastos.montos, minlength=n_categories * n_months)
+    return {
+        "categories": [names[present[i]] for i in order],
+        "first_month": first,
+        "matrix": flat.reshape(n_categories, n_months)[order],
+    }
+
+def _exponential_smoothing(y: np.ndarray, alpha: float):
+    """Suavizamiento exponencial simple para todas las filas a la vez; devuelve (nivel, residuos)"""
+    level = y[:, 0].copy()
+    residuals = np.empty((y.shape[0], y.shape[1] - 1))
+    for t in range(1, y.shape[1]):
+        residuals[:, t - 1] = y[:, t] - level
+        level = alpha * y[:, t] + (1 - alpha) * level
+    return level, residuals
+
+def forecast_matrix(y: np.ndarray, months_ahead: int, alpha: float = FORECAST_SMOOTHING_ALPHA) -> Dict:
+    """
+    Pronosticar cada fila de y (K series mensuales) para los próximos meses
+
+    Promedia los métodos disponibles según el historial: suavizamiento
+    exponencial (siempre), tendencia lineal (3+ meses) y estacional ingenuo
+    (12+ meses). El intervalo usa la desviación de los errores a un paso,
+    creciendo con la raíz del horizonte.
+    """
+    k, m = y.shape
+    horizon = np.arange(1, months_ahead + 1)
+    methods = []
+
+    level, residuals = _exponential_smoothing(y, alpha)
+    methods.append(("exponential_smoothing", np.repeat(level[:, None], months_ahead, axis=1)))
+
+    if m >= 3:
+        window = min(m, FORECAST_TREND_WINDOW)
+        t = np.arange(m - window, m)
+        slope, intercept = np.polyfit(t, y[:, -window:].T, 1)
+        future_t = (m - 1 + horizon)[None, :]
+        methods.append(("linear_trend", slope[:, None] * future_t + intercept[:, None]))
+
+    if m >= 12:
+        methods.append(("seasonal_naive", y[:, m - 12 + (horizon - 1) % 12]))
+
+    point = np.clip(np.mean([f for _, f in methods], axis=0), 0, None)
+
+    if residuals.shape[1] >= 2:
+        sigma = residuals.std(axis=1, ddof=1)
+    else:
+        sigma = np.abs(point[:, 0]) * 0.25
+    spread = FORECAST_Z * sigma[:, None] * np.sqrt(horizon)[None, :]
+
+    return {
+        "point": point,
+        "lower": np.clip(point - spread, 0, None),
+        "upper": point + spread,
+        "methods": [name for name, _ in methods],
+    }
+
+def forecast_spending(transactions: Union[TransactionTable, List[Transaction]], months_ahead: int = 1) -> Dict:
+    """Pronóstico mensual de gasto por categoría y total"""
+    grouped = monthly_matrix(transactions)
+    y = grouped["matrix"]
+    if y.size == 0:
+        return {"months": [], "categories": [], "total": [], "methods": [], "history_months": 0}
+
+    last_month = grouped["first_month"] + y.shape[1] - 1
+    months = [month_label(last_month + h) for h in range(1, months_ahead + 1)]
+
+    by_category = forecast_matrix(y, months_ahead)
+    total = forecast_matrix(y.sum(axis=0, keepdims=True), months_ahead)
+
+    def points(result: Dict, row: int) -> List[Dict]:
+        return [
+            {
+                "mes": mes,
+                "monto": round(float(result["point"][row, h]), 2),
+                "lower": round(float(result["lower"][row, h]), 2),
+                "upper": round(float(result["upper"][row, h]), 2),
+            }
+            for h, mes in enumerate(months)
+        ]
+
+    return {
+        "months": months,
+        "categories": [
+            {"categoria": categoria, "predicciones": points(by_category, i)}
+            for i, categoria in enumerate(grouped["categories"])
+        ],
+        "total": points(total, 0),
+        "methods": by_category["methods"],
+        "history_months": int(y.shape[1]),
+    }
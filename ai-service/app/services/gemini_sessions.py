@@ -0,0 +1,154 @@
+import os
+import time
+import asyncio
+import datetime
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import google.generativeai as genai
+from app.services.response_cache import fingerprint
+from app.services.conversation_history import estimate_tokens
+
+# Sesiones de chat reutilizables por conversación
+GEMINI_SESSION_CACHE_SIZE = int(os.getenv('GEMINI_SESSION_CACHE_SIZE', 500))
+GEMINI_SESSION_IDLE_TTL = float(os.getenv('GEMINI_SESSION_IDLE_TTL', 1800))
+GEMINI_MODEL_CACHE_SIZE = int(os.getenv('GEMINI_MODEL_CACHE_SIZE', 64))
+
+# Caché de contexto del proveedor: solo para system prompts grandes y estables
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv('GEMINI_CONTEXT_CACHE_MIN_TOKENS', 4096))
+GEMINI_CONTEXT_CACHE_TTL = int(os.getenv('GEMINI_CONTEXT_CACHE_TTL', 3600))
+
+def _history_fingerprint(messages: List[Dict]) -> str:
+    return fingerprint(*(f"{m['role']}:{m['content']}" for m in messages))
+
+def _to_gemini_history(messages: List[Dict]) -> List[Dict]:
+    return [
+        {'role': 'model' if m['role'] == 'assistant' else 'user', 'parts': [m['content']]}
+        for m in messages
+    ]
+
+class GeminiSessionPool:
+    """
+    Modelos y sesiones de chat de Gemini reutilizables
+
+    - Un GenerativeModel por system prompt, con el prompt como
+      system_instruction nativa (o como contenido en caché del proveedor
+      si es suficientemente grande).
+    - Una ChatSession por conversación: si el historial que envía el cliente
+      coincide con el de la sesión, solo se envía el último mensaje en lugar
+      de reconstruir el chat completo.
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._models: "OrderedDict[str, Tuple[genai.GenerativeModel, float]]" = OrderedDict()
+        self._uncacheable = set()
+        # sesión -> (chat, huella del system prompt, huella del historial, último uso)
+        self._sessions: "OrderedDict[str, Tuple[genai.ChatSession, str, str, float]]" = OrderedDict()
+        self.session_hits = 0
+        self.session_misses = 0
+
+    async def model_for(self, system_prompt: Optional[str]) -> genai.GenerativeModel:
+        """Modelo configurado con el system prompt dado"""
+        key = fingerprint(system_prompt or "")
+        now = time.monotonic()
+        entry = self._models.get(key)
+        if entry is not None and entry[1] > now:
+            self._models.move_to_end(key)
+            return entry[0]
+
+        model, expires_at = None, float('inf')
+        if (
+            system_prompt
+            and key not in self._uncacheable
+            and estimate_tokens(system_prompt) >= GEMINI_CONTEXT_CACHE_MIN_TOKENS
+        ):
+            try:
+                cached = await asyncio.to_thread(
+                    genai.caching.CachedContent.create,
+                    model=self.model_name,
+                    system_instruction=system_prompt,
+                    ttl=datetime.timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL)
+                )
+                model = genai.GenerativeModel.from_cached_content(cached)
+                # Renovar antes de que el proveedor expire el contenido
+                expires_at = now + GEMINI_CONTEXT_CACHE_TTL * 0.9
+            except Exception as e:
+                # Modelo o tamaño no soportado: usar system_instruction normal
+                self._uncacheable.add(key)
+                print(f"⚠️  Caché de contexto de Gemini no disponible: {str(e)}")
+
+        if model is None:
+            model = genai.GenerativeModel(self.model_name, system_instruction=system_prompt or None)
+
+        self._models[key] = (model, expires_at)
+        self._models.move_to_end(key)
+        while len(self._models) > GEMINI_MODEL_CACHE_SIZE:
+            self._models.popitem(last=False)
+        return model
+
+    async def checkout(
+        self,
+        session_id: Optional[str],
+        system_prompt: Optional[str],
+        chat_messages: List[Dict]
+    ) -> genai.ChatSession:
+        """
+        Obtener una sesión lista para enviar el último de chat_messages
+
+        La sesión se retira del pool mientras está en uso, así dos solicitudes
+        simultáneas de la misma conversación nunca comparten el objeto.
+        """
+        self._evict_idle()
+        system_fp = fingerprint(system_prompt or "")
+        history = chat_messages[:-1]
+
+        if session_id:
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None:
+                chat, stored_system_fp, stored_history_fp, _ = entry
+                if stored_system_fp == system_fp and stored_history_fp == _history_fingerprint(history):
+                    self.session_hits += 1
+                    return chat
+            self.session_misses += 1
+
+        model = await self.model_for(system_prompt)
+        return model.start_chat(history=_to_gemini_history(history))
+
+    def checkin(
+        self,
+        session_id: Optional[str],
+        chat: genai.ChatSession,
+        system_prompt: Optional[str],
+        chat_messages: List[Dict],
+        reply: str
+    ):
+        """Devolver la sesión al pool con el historial ya actualizado"""
+        if not session_id:
+            return
+        history = [*chat_messages, {'role': 'assistant', 'content': reply}]
+        self._sessions[session_id] = (
+            chat,
+            fingerprint(system_prompt or ""),
+            _history_fingerprint(history),
+            time.monotonic()
+        )
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > GEMINI_SESSION_CACHE_SIZE:
+            self._sessions.popitem(last=False)
+
+    def _evict_idle(self):
+        """Descartar sesiones sin uso por más de GEMINI_SESSION_IDLE_TTL"""
+        limit = time.monotonic() - GEMINI_SESSION_IDLE_TTL
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            if entry[3] >= limit:
+                break
+            del self._sessions[session_id]
+
+    def stats(self) -> Dict:
+        return {
+            "sessions": len(self._sessions),
+            "models": len(self._models),
+            "session_hits": self.session_hits,
+            "session_misses": self.session_misses,
+        }
@@ -0,0 +1,214 @@
+import os
+import csv
+import json
+import math
+from typing import Dict, List, Optional
+from app.models import Transaction, Budget, validate_fecha
+from app.services.summary_store import UserFinancialSummary
+
+# Límites de la ingesta en streaming: largo máximo de una línea, errores
+# reportados y presupuestos aceptados por carga
+INGEST_MAX_LINE_BYTES = int(os.getenv("INGEST_MAX_LINE_BYTES", 64 * 1024))
+INGEST_MAX_ERRORS_REPORTED = int(os.getenv("INGEST_MAX_ERRORS_REPORTED", 20))
+INGEST_MAX_PRESUPUESTOS = int(os.getenv("INGEST_MAX_PRESUPUESTOS", 1000))
+
+FORMATS = ("ndjson", "csv")
+CSV_COLUMNS = ("id", "monto", "categoria", "fuente", "descripcion", "fecha", "tipo")
+
+def format_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    """'ndjson' o 'csv' según el Content-Type, o None si no se reconoce"""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return "ndjson"
+    if content_type in ("text/csv", "application/csv"):
+        return "csv"
+    return None
+
+def _text(row: Dict, field: str) -> Optional[str]:
+    """Campo de texto opcional; otro tipo de JSON (lista, objeto, número) es inválido"""
+    value = row.get(field)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"campo {field} inválido: {value!r}")
+    return value or None
+
+def _to_transaction(row: Dict) -> Transaction:
+    """Validación mínima de una fila (sin construir el modelo completo de Pydantic)"""
+    tipo = (_text(row, "tipo") or "").strip().lower()
+    if tipo not in ("gasto", "ingreso"):
+        raise ValueError(f"tipo inválido: {row.get('tipo')!r}")
+    fecha = validate_fecha(str(row.get("fecha") or "").strip())
+    try:
+        monto = float(row.get("monto"))
+    except (TypeError, ValueError):
+        raise ValueError(f"monto inválido: {row.get('monto')!r}")
+    # nan/inf envenenarían el resumen (y su JSON) hasta recargarlo
+    if not math.isfinite(monto):
+        raise ValueError(f"monto inválido: {row.get('monto')!r}")
+    raw_id = row.get("id")
+    try:
+        # bool es int en Python, pero true/false no es un id
+        if isinstance(raw_id, bool):
+            raise TypeError
+        transaction_id = int(raw_id) if raw_id not in (None, "") else None
+    except (TypeError, ValueError):
+        raise ValueError(f"id inválido: {raw_id!r}")
+    return Transaction.model_construct(
+        id=transaction_id,
+        monto=monto,
+        categoria=_text(row, "categoria"),
+        fuente=_text(row, "fuente"),
+        descripcion=_text(row, "descripcion"),
+        fecha=fecha,
+        tipo=tipo,
+    )
+
+class StreamingIngestor:
+    """
+    Ingesta incremental de transacciones en NDJSON o CSV
+
+    Los bytes se procesan a medida que llegan: cada línea completa se
+    valida y se suma al resumen, y solo se retiene la línea incompleta del
+    final del fragmento. La memoria no depende del tamaño de la carga sino
+    de INGEST_MAX_LINE_BYTES y del tamaño del resumen (categorías, meses y
+    las transacciones recientes). Un registro CSV de varias líneas (campo
+    entre comillas) tiene el mismo límite: si lo supera, por ejemplo por una
+    comilla sin cerrar, se rechaza y la ingesta sigue en la línea siguiente.
+
+    NDJSON: un objeto por línea con los campos de Transaction; las líneas con
+    "tipo": "presupuesto" se guardan como presupuestos.
+    CSV: encabezado con columnas de CSV_COLUMNS, separador ',' o ';'.
+    """
+
+    def __init__(self, fmt: str, summary: UserFinancialSummary = None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato '{fmt}' no válido. Usa: {', '.join(FORMATS)}")
+        self.fmt = fmt
+        self.summary = summary if summary is not None else UserFinancialSummary()
+        self.presupuestos: List[Budget] = []
+        self.ingested = 0
+        self.rejected = 0
+        self.errors: List[str] = []
+        self.bytes = 0
+        self._buffer = b""
+        self._line_number = 0
+        self._header: Optional[List[str]] = None
+        self._delimiter = ","
+        self._pending_csv: List[str] = []
+        self._pending_bytes = 0
+        self._skipping = False
+
+    def feed(self, chunk: bytes):
+        """Procesar un fragmento de bytes"""
+        self.bytes += len(chunk)
+        data = self._buffer + chunk
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end < 0:
+                break
+            self._line(data[start:end])
+            start = end + 1
+        self._buffer = data[start:]
+        if len(self._buffer) > INGEST_MAX_LINE_BYTES:
+            # Línea demasiado larga: se descarta hasta el próximo salto de línea
+            if not self._skipping:
+                self._line_number += 1
+                self._reject(f"línea de más de {INGEST_MAX_LINE_BYTES} bytes")
+                self._skipping = True
+            self._buffer = b""
+
+    def finish(self) -> UserFinancialSummary:
+        """Procesar la última línea (sin salto final) y devolver el resumen"""
+        if self._buffer:
+            self._line(self._buffer)
+            self._buffer = b""
+        if self._pending_csv:
+            self._reject("comillas sin cerrar al final del CSV")
+            self._pending_csv = []
+        return self.summary
+
+    def _line(self, raw: bytes):
+        if self._skipping:
+            self._skipping = False
+            return
+        self._line_number += 1
+        if len(raw) > INGEST_MAX_LINE_BYTES:
+            self._reject(f"línea de más de {INGEST_MAX_LINE_BYTES} bytes")
+            return
+        try:
+            line = raw.decode("utf-8-sig" if self._line_number == 1 else "utf-8").rstrip("\r")
+        except UnicodeDecodeError:
+            self._reject("no es UTF-8 válido")
+            return
+        if not line.strip() and not self._pending_csv:
+            return
+        if self.fmt == "ndjson":
+            self._ndjson_line(line)
+        else:
+            self._csv_line(line)
+
+    def _ndjson_line(self, line: str):
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError("se esperaba un objeto JSON")
+            if str(row.get("tipo", "")).lower() == "presupuesto":
+                self._add_presupuesto(row)
+                return
+            self._add(_to_transaction(row))
+        except (TypeError, ValueError) as e:
+            self._reject(str(e))
+
+    def _csv_line(self, line: str):
+        # Un campo entre comillas puede contener saltos de línea: juntar hasta cerrar
+        odd_quotes = line.count('"') % 2
+        if self._pending_csv:
+            self._pending_csv.append(line)
+            self._pending_bytes += len(line.encode("utf-8")) + 1
+            if self._pending_bytes > INGEST_MAX_LINE_BYTES:
+                self._reject(f"registro CSV de más de {INGEST_MAX_LINE_BYTES} bytes (¿comillas sin cerrar?)")
+                self._pending_csv = []
+                return
+            if not odd_quotes:
+                return
+            line = "\n".join(self._pending_csv)
+            self._pending_csv = []
+        elif odd_quotes:
+            self._pending_csv = [line]
+            self._pending_bytes = len(line.encode("utf-8"))
+            return
+
+        if self._header is None:
+            self._delimiter = ";" if line.count(";") > line.count(",") else ","
+            self._header = [h.strip().lower() for h in next(csv.reader([line], delimiter=self._delimiter))]
+            if not {"monto", "fecha", "tipo"} <= set(self._header):
+                raise ValueError("El encabezado CSV debe incluir monto, fecha y tipo")
+            return
+        values = next(csv.reader([line], delimiter=self._delimiter))
+        try:
+            self._add(_to_transaction(dict(zip(self._header, values))))
+        except (TypeError, ValueError) as e:
+            self._reject(str(e))
+
+    def _add(self, t: Transaction):
+        self.summary.apply(added=[t])
+        self.ingested += 1
+
+    def _add_presupuesto(self, row: Dict):
+        if len(self.presupuestos) >= INGEST_MAX_PRESUPUESTOS:
+            raise ValueError(f"más de {INGEST_MAX_PRESUPUESTOS} presupuestos")
+        self.presupuestos.append(Budget.model_validate({k: v for k, v in row.items() if k != "tipo"}))
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        if len(self.errors) < INGEST_MAX_ERRORS_REPORTED:
+            self.errors.append(f"línea {self._line_number}: {reason}")
+
+    def report(self) -> Dict:
+        return {
+            "format": self.fmt,
+            "bytes": self.bytes,
+            "ingested": self.ingested,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
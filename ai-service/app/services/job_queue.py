@@ -0,0 +1,334 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+from typing import Any, Awaitable, Callable, Dict, Optional
+from pydantic import BaseModel
+from app.services.response_cache import fingerprint
+
+# Trabajos asíncronos: workers simultáneos, trabajos en espera y vida de los resultados
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 100))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", 24 * 3600))
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "data/jobs.db")
+# Intervalo de consulta al esperar un trabajo de otro proceso
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 0.5))
+
+FINISHED = ("succeeded", "failed")
+
+# Identificador de este arranque: tras reiniciar, el pid puede repetirse (pid 1 en un contenedor)
+BOOT_ID = uuid.uuid4().hex
+
+class JobQueueFull(Exception):
+    """No hay lugar en la cola de trabajos"""
+
+class IdempotencyConflict(Exception):
+    """La clave de idempotencia ya se usó con otra solicitud"""
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class JobStore:
+    """
+    Trabajos persistidos en SQLite (compartido por los workers de uvicorn)
+
+    Cada trabajo guarda su solicitud, estado, resultado o error y el pid y
+    BOOT_ID del proceso que lo ejecuta; los terminados vencen a los
+    JOB_RESULT_TTL segundos y se podan periódicamente. Cada proceso registra
+    su pid con su BOOT_ID al abrir el almacén, así un trabajo sin terminar de
+    un arranque anterior se reconoce aunque el pid se haya reutilizado.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH, ttl: float = JOB_RESULT_TTL):
+        self.ttl = ttl
+        self._writes = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                idempotency_key TEXT,
+                request_hash TEXT NOT NULL,
+                request TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                status_code INTEGER,
+                pid INTEGER NOT NULL,
+                boot_id TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                expires_at REAL
+            )"""
+        )
+        self._db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_idempotency ON jobs(kind, idempotency_key)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs(expires_at)")
+        # Tablas creadas antes de registrar el arranque
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "boot_id" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN boot_id TEXT")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS processes (pid INTEGER PRIMARY KEY, boot_id TEXT NOT NULL)"
+        )
+        self._db.execute(
+            "INSERT OR REPLACE INTO processes (pid, boot_id) VALUES (?, ?)", (os.getpid(), BOOT_ID)
+        )
+
+    def create(self, kind: str, payload: Dict, request_hash: str, idempotency_key: Optional[str]) -> Dict:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._db.execute(
+            """INSERT INTO jobs (id, kind, status, idempotency_key, request_hash, request, pid, boot_id, created_at)
+               VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?)""",
+            (
+                job_id, kind, idempotency_key, request_hash, json.dumps(payload, ensure_ascii=False),
+                os.getpid(), BOOT_ID, now
+            )
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.prune(now)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._live(row)
+
+    def find(self, kind: str, idempotency_key: str) -> Optional[Dict]:
+        row = self._db.execute(
+            "SELECT * FROM jobs WHERE kind = ? AND idempotency_key = ?", (kind, idempotency_key)
+        ).fetchone()
+        return self._live(row)
+
+    def request(self, job_id: str) -> Dict:
+        return json.loads(self._db.execute("SELECT request FROM jobs WHERE id = ?", (job_id,)).fetchone()[0])
+
+    def mark_running(self, job_id: str):
+        self._db.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def finish(self, job_id: str, result: Any = None, error: str = None, status_code: int = None):
+        now = time.time()
+        self._db.execute(
+            """UPDATE jobs SET status = ?, result = ?, error = ?, status_code = ?, finished_at = ?, expires_at = ?
+               WHERE id = ?""",
+            (
+                "failed" if error is not None else "succeeded",
+                json.dumps(result, ensure_ascii=False) if error is None else None,
+                error, status_code, now, now + self.ttl, job_id
+            )
+        )
+
+    def release_key(self, kind: str, idempotency_key: str):
+        """Liberar una clave de idempotencia (su trabajo falló) para un nuevo intento"""
+        self._db.execute("DELETE FROM jobs WHERE kind = ? AND idempotency_key = ?", (kind, idempotency_key))
+
+    def prune(self, now: float = None) -> int:
+        """Borrar los trabajos vencidos"""
+        return self._db.execute("DELETE FROM jobs WHERE expires_at < ?", (now or time.time(),)).rowcount
+
+    def _live(self, row) -> Optional[Dict]:
+        """Trabajo como diccionario; None si venció. Marca fallidos los de un proceso que ya no existe"""
+        if row is None:
+            return None
+        job = dict(row)
+        if job["expires_at"] is not None and job["expires_at"] < time.time():
+            return None
+        if job["status"] not in FINISHED and not self._owner_alive(job):
+            self.finish(job["id"], error="Trabajo interrumpido: el proceso que lo ejecutaba terminó", status_code=503)
+            return self.get(job["id"])
+        return job
+
+    def _owner_alive(self, job: Dict) -> bool:
+        """El proceso que creó el trabajo sigue siendo el mismo arranque"""
+        if job["pid"] == os.getpid():
+            return job["boot_id"] == BOOT_ID
+        row = self._db.execute("SELECT boot_id FROM processes WHERE pid = ?", (job["pid"],)).fetchone()
+        if row is not None and row["boot_id"] != job["boot_id"]:
+            # El pid ya lo registró otro arranque
+            return False
+        return _pid_alive(job["pid"])
+
+def job_view(job: Dict, reused: bool = False) -> Dict:
+    """Representación pública de un trabajo"""
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "expires_at": job["expires_at"],
+        "result": json.loads(job["result"]) if job["result"] is not None else None,
+        "error": job["error"],
+        "status_code": job["status_code"],
+        "reused": reused,
+    }
+
+class JobManager:
+    """
+    Trabajos en segundo plano con un pool acotado de workers asyncio
+
+    submit() guarda la solicitud y la encola; JOB_WORKERS tareas la ejecutan
+    con el handler de su tipo y guardan el resultado. Con una clave de
+    idempotencia, repetir el envío devuelve el trabajo en curso o terminado
+    en lugar de crear otro (solo un trabajo fallido se vuelve a ejecutar).
+    Los workers se inician en el primer envío.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, Callable[[Dict], Awaitable[Any]]],
+        store: JobStore = None,
+        workers: int = JOB_WORKERS,
+        queue_size: int = JOB_QUEUE_SIZE
+    ):
+        self.handlers = handlers
+        self.store = store or JobStore()
+        self.workers = workers
+        self._queue: asyncio.Queue = None
+        self._queue_size = queue_size
+        self._tasks = []
+        self._done: Dict[str, asyncio.Event] = {}
+        self.submitted = 0
+        self.reused = 0
+
+    def _start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self._queue_size)
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(
+        self,
+        kind: str,
+        payload: Dict,
+        idempotency_key: Optional[str] = None,
+        on_enqueue: Callable[[], None] = None
+    ) -> Dict:
+        """
+        Encolar un trabajo (o devolver el existente con la misma clave de idempotencia)
+
+        Args:
+            on_enqueue: se llama solo si se va a crear un trabajo nuevo (p. ej.
+                descontar la cuota); sus excepciones cancelan el envío. Reutilizar
+                un trabajo existente no lo llama.
+
+        Raises:
+            IdempotencyConflict: si la clave ya se usó con otra solicitud
+            JobQueueFull: si la cola está llena
+        """
+        self._start()
+        request_hash = fingerprint(kind, json.dumps(payload, sort_keys=True, ensure_ascii=False))
+        if idempotency_key:
+            existing = self.store.find(kind, idempotency_key)
+            if existing is not None:
+                if existing["request_hash"] != request_hash:
+                    raise IdempotencyConflict(
+                        f"La clave de idempotencia '{idempotency_key}' ya se usó con otra solicitud"
+                    )
+                if existing["status"] != "failed":
+                    self.reused += 1
+                    return job_view(existing, reused=True)
+            # Vencida o fallida: liberar la clave para el nuevo intento
+            self.store.release_key(kind, idempotency_key)
+
+        if self._queue.full():
+            raise JobQueueFull(f"La cola de trabajos está llena ({self._queue_size})")
+        if on_enqueue is not None:
+            on_enqueue()
+        try:
+            job = self.store.create(kind, payload, request_hash, idempotency_key)
+        except sqlite3.IntegrityError:
+            # Otro worker de uvicorn creó el trabajo con la misma clave al mismo tiempo
+            self.reused += 1
+            return job_view(self.store.find(kind, idempotency_key), reused=True)
+        self._done[job["id"]] = asyncio.Event()
+        self._queue.put_nowait(job["id"])
+        self.submitted += 1
+        return job_view(job)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        job = self.store.get(job_id)
+        return job_view(job) if job is not None else None
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict]:
+        """Esperar hasta timeout segundos a que el trabajo termine y devolverlo"""
+        job = self.get(job_id)
+        if job is None or job["status"] in FINISHED or timeout <= 0:
+            return job
+        deadline = time.monotonic() + timeout
+        done = self._done.get(job_id)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            if done is not None:
+                # Trabajo de este proceso: despertar al terminar
+                try:
+                    await asyncio.wait_for(done.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                # Trabajo de otro worker de uvicorn: consultar el almacenamiento
+                await asyncio.sleep(min(JOB_POLL_INTERVAL, remaining))
+            job = self.get(job_id)
+            if job is None or job["status"] in FINISHED:
+                return job
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+                done = self._done.pop(job_id, None)
+                if done is not None:
+                    done.set()
+
+    async def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        self.store.mark_running(job_id)
+        try:
+            result = await self.handlers[job["kind"]](self.store.request(job_id))
+        except Exception as e:
+            # Los handlers de las rutas levantan HTTPException con status_code y detail
+            self.store.finish(
+                job_id, error=str(getattr(e, "detail", e)), status_code=getattr(e, "status_code", 500)
+            )
+        else:
+            if isinstance(result, BaseModel):
+                result = result.model_dump()
+            self.store.finish(job_id, result=result)
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self._queue_size,
+            "submitted": self.submitted,
+            "reused": self.reused,
+        }
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
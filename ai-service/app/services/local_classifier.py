@@ -0,0 +1,206 @@
+import os
+import math
+import sqlite3
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from app.services.categorization_cache import normalize_description
+
+# Configuración del clasificador local
+LOCAL_CLASSIFIER_PATH = os.getenv("LOCAL_CLASSIFIER_PATH", "data/local_classifier.db")
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", 0.85))
+LOCAL_CLASSIFIER_MIN_EXAMPLES = int(os.getenv("LOCAL_CLASSIFIER_MIN_EXAMPLES", 20))
+
+# Confianza asignada cuando una regla de comercio coincide
+RULE_CONFIDENCE = 0.95
+# Palabras genéricas ("super" también es "super bowl", "gas" también es
+# "gas pimienta"): su regla queda por debajo de LOCAL_CLASSIFIER_THRESHOLD,
+# así que solo sirve de estimación y la transacción sigue yendo al modelo
+AMBIGUOUS_RULE_CONFIDENCE = 0.6
+AMBIGUOUS_KEYWORDS = {
+    "super", "mercado", "cafe", "comida", "metro", "mantenimiento", "consulta",
+    "curso", "gas", "agua", "luz", "venta", "ventas", "negocio", "regalo",
+}
+
+# Reglas de palabra clave/comercio -> categoría. Los bigramas se evalúan
+# antes que las palabras sueltas ("uber eats" es comida, "uber" es transporte).
+KEYWORD_RULES = {
+    "gasto": {
+        "Alimentación": [
+            "uber eats", "didi food", "oxxo", "walmart", "soriana", "chedraui", "bodega aurrera",
+            "costco", "sams", "supermercado", "super", "mercado", "restaurante", "rappi",
+            "starbucks", "cafe", "cafeteria", "comida", "panaderia", "tortilleria", "pizza",
+            "tacos", "mcdonalds", "burger",
+        ],
+        "Transporte": [
+            "uber", "didi", "cabify", "taxi", "metro", "metrobus", "autobus", "gasolina",
+            "gasolinera", "pemex", "estacionamiento", "peaje", "caseta", "vuelo", "aeromexico",
+            "volaris", "vivaaerobus",
+        ],
+        "Vivienda": [
+            "renta", "alquiler", "hipoteca", "predial", "mantenimiento", "infonavit",
+        ],
+        "Servicios": [
+            "cfe", "luz", "agua", "gas natural", "gas", "telmex", "izzi", "totalplay",
+            "megacable", "internet", "telcel", "movistar", "telefono", "celular",
+        ],
+        "Entretenimiento": [
+            "netflix", "spotify", "cine", "cinepolis", "cinemex", "disney", "hbo",
+            "prime video", "steam", "playstation", "xbox", "nintendo", "concierto", "ticketmaster",
+        ],
+        "Salud": [
+            "farmacia", "farmacias", "doctor", "medico", "hospital", "dentista", "laboratorio",
+            "consulta", "clinica", "optica",
+        ],
+        "Educación": [
+            "colegiatura", "escuela", "universidad", "curso", "udemy", "coursera", "platzi",
+            "libreria", "libros", "inscripcion",
+        ],
+        "Ropa": [
+            "zara", "h m", "ropa", "zapatos", "calzado", "zapateria", "nike", "adidas", "shein",
+            "pull bear", "bershka",
+        ],
+    },
+    "ingreso": {
+        "Salario": ["nomina", "salario", "sueldo", "quincena", "aguinaldo"],
+        "Freelance": ["freelance", "honorarios", "upwork", "fiverr", "workana"],
+        "Negocio": ["venta", "ventas", "negocio", "mercado libre", "mercadolibre"],
+        "Inversiones": ["dividendos", "dividendo", "intereses", "rendimiento", "rendimientos", "cetes", "inversion"],
+        "Regalo": ["regalo", "obsequio", "cumpleanos"],
+    },
+}
+
+def _features(tokens: List[str]) -> List[str]:
+    """Unigramas y bigramas de tokens"""
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+class _NaiveBayes:
+    """Naive Bayes multinomial incremental sobre n-gramas de tokens"""
+
+    def __init__(self):
+        self.class_counts: Dict[str, int] = defaultdict(int)
+        self.feature_counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.feature_totals: Dict[str, int] = defaultdict(int)
+        self.vocabulary = set()
+        self.examples = 0
+
+    def learn(self, features: List[str], categoria: str):
+        self.examples += 1
+        self.class_counts[categoria] += 1
+        counts = self.feature_counts[categoria]
+        for f in features:
+            counts[f] += 1
+            self.vocabulary.add(f)
+        self.feature_totals[categoria] += len(features)
+
+    def predict(self, features: List[str]) -> Optional[tuple]:
+        """(categoría, probabilidad posterior) o None si no hay evidencia"""
+        known = [f for f in features if f in self.vocabulary]
+        if not known or not self.class_counts:
+            return None
+
+        vocab_size = len(self.vocabulary)
+        log_scores = {}
+        for categoria, n in self.class_counts.items():
+            counts = self.feature_counts[categoria]
+            denominator = self.feature_totals[categoria] + vocab_size
+            score = math.log(n / self.examples)
+            for f in known:
+                score += math.log((counts.get(f, 0) + 1) / denominator)
+            log_scores[categoria] = score
+
+        best = max(log_scores, key=log_scores.get)
+        top = log_scores[best]
+        total = sum(math.exp(s - top) for s in log_scores.values())
+        return best, 1.0 / total
+
+class LocalClassifier:
+    """
+    Clasificador local de transacciones: reglas de comercio + Naive Bayes
+
+    El modelo se entrena con categorizaciones confirmadas por el usuario,
+    que se guardan en SQLite y se vuelven a cargar al iniciar.
+    """
+
+    def __init__(self, path: str = LOCAL_CLASSIFIER_PATH, min_examples: int = LOCAL_CLASSIFIER_MIN_EXAMPLES):
+        self.min_examples = min_examples
+        self._models: Dict[str, _NaiveBayes] = defaultdict(_NaiveBayes)
+        self._rules = {
+            tipo: sorted(
+                ((kw.split(), categoria) for categoria, kws in rules.items() for kw in kws),
+                key=lambda rule: -len(rule[0])
+            )
+            for tipo, rules in KEYWORD_RULES.items()
+        }
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS examples (
+                tipo TEXT NOT NULL,
+                descripcion TEXT NOT NULL,
+                categoria TEXT NOT NULL
+            )"""
+        )
+        for tipo, descripcion, categoria in self._db.execute("SELECT tipo, descripcion, categoria FROM examples"):
+            self._models[tipo].learn(_features(descripcion.split()), categoria)
+
+    def learn(self, descripcion: str, tipo: str, categoria: str):
+        """Registrar una categorización confirmada"""
+        tipo = "gasto" if tipo == "gasto" else "ingreso"
+        normalized = normalize_description(descripcion)
+        if not normalized:
+            return
+        self._models[tipo].learn(_features(normalized.split()), categoria)
+        self._db.execute(
+            "INSERT INTO examples (tipo, descripcion, categoria) VALUES (?, ?, ?)",
+            (tipo, normalized, categoria)
+        )
+
+    def classify(self, descripcion: str, tipo: str, categorias: List[str]) -> Optional[Dict]:
+        """
+        Clasificar localmente una transacción
+
+        Returns:
+            {"categoria", "confidence", "reasoning"} o None si no hay predicción
+        """
+        tipo = "gasto" if tipo == "gasto" else "ingreso"
+        tokens = normalize_description(descripcion).split()
+        if not tokens:
+            return None
+
+        # 1. Reglas de comercio/palabra clave; una palabra genérica no gana
+        # a un comercio concreto que aparezca después en la lista
+        weak = None
+        for rule_tokens, categoria in self._rules.get(tipo, []):
+            n = len(rule_tokens)
+            if categoria in categorias and any(
+                tokens[i:i + n] == rule_tokens for i in range(len(tokens) - n + 1)
+            ):
+                keyword = " ".join(rule_tokens)
+                rule = {
+                    "categoria": categoria,
+                    "confidence": RULE_CONFIDENCE,
+                    "reasoning": f"Regla local: '{keyword}' → {categoria}"
+                }
+                if keyword not in AMBIGUOUS_KEYWORDS:
+                    return rule
+                if weak is None:
+                    weak = {**rule, "confidence": AMBIGUOUS_RULE_CONFIDENCE}
+
+        # 2. Naive Bayes entrenado con categorizaciones confirmadas
+        model = self._models.get(tipo)
+        if model is None or model.examples < self.min_examples:
+            return weak
+        prediction = model.predict(_features(tokens))
+        if prediction is None or prediction[0] not in categorias:
+            return weak
+        categoria, probability = prediction
+        if weak is not None and weak["confidence"] >= probability:
+            return weak
+        return {
+            "categoria": categoria,
+            "confidence": round(probability, 4),
+            "reasoning": f"Clasificador local (Naive Bayes, {model.examples} ejemplos)"
+        }
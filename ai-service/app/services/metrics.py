@@ -0,0 +1,186 @@
+import os
+import time
+import asyncio
+from contextlib import contextmanager
+from prometheus_client import Counter, Histogram, Gauge, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
+
+# Intervalo de muestreo del retraso del event loop
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv('EVENT_LOOP_LAG_INTERVAL', 0.5))
+
+# Precio por millón de tokens (USD): <PROVIDER>_PRICE_INPUT / <PROVIDER>_PRICE_OUTPUT
+PROVIDER_PRICES = {
+    'deepseek': (0.27, 1.10),
+    'gemini': (0.0, 0.0),
+}
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 45, 90)
+
+HTTP_REQUEST_DURATION = Histogram(
+    'ai_http_request_duration_seconds',
+    'Latencia de las solicitudes HTTP por ruta (hasta el inicio de la respuesta)',
+    ['method', 'route', 'status'],
+    buckets=_LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    'ai_http_requests_in_progress',
+    'Solicitudes HTTP en curso'
+)
+STAGE_DURATION = Histogram(
+    'ai_analyzer_stage_duration_seconds',
+    'Duración de cada etapa del análisis',
+    ['operation', 'stage'],
+    buckets=_LATENCY_BUCKETS
+)
+PROVIDER_REQUEST_DURATION = Histogram(
+    'ai_provider_request_duration_seconds',
+    'Latencia de cada intento de llamada al proveedor',
+    ['provider', 'outcome'],
+    buckets=_LATENCY_BUCKETS
+)
+PROVIDER_TOKENS = Counter(
+    'ai_provider_tokens_total',
+    'Tokens consumidos por proveedor',
+    ['provider', 'kind']
+)
+PROVIDER_COST = Counter(
+    'ai_provider_cost_usd_total',
+    'Costo estimado en USD por proveedor',
+    ['provider']
+)
+STRUCTURED_OUTPUTS = Counter(
+    'ai_structured_output_total',
+    'Respuestas estructuradas por esquema y resultado del parseo '
+    '(direct, extracted, repaired, invalid; retry_ok/retry_failed tras el reintento)',
+    ['schema', 'result']
+)
+STARTUP_SECONDS = Gauge(
+    'ai_startup_seconds',
+    'Tiempo desde la importación de la app hasta estar lista para servir'
+)
+ADMISSION_DECISIONS = Counter(
+    'ai_admission_decisions_total',
+    'Decisiones del control de admisión '
+    '(admitted, queued, degraded, rejected_user, rejected_global, expired)',
+    ['decision']
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    'ai_admission_in_flight',
+    'Solicitudes admitidas en curso que pueden llamar al modelo'
+)
+EVENT_LOOP_LAG = Histogram(
+    'ai_event_loop_lag_seconds',
+    'Retraso del event loop respecto al intervalo de muestreo',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+def _price(provider: str):
+    default_input, default_output = PROVIDER_PRICES.get(provider, (0.0, 0.0))
+    return (
+        float(os.getenv(f'{provider.upper()}_PRICE_INPUT', default_input)),
+        float(os.getenv(f'{provider.upper()}_PRICE_OUTPUT', default_output)),
+    )
+
+def record_usage(provider: str, prompt_tokens: int, completion_tokens: int):
+    """Sumar tokens y costo estimado de una llamada"""
+    PROVIDER_TOKENS.labels(provider, 'prompt').inc(prompt_tokens)
+    PROVIDER_TOKENS.labels(provider, 'completion').inc(completion_tokens)
+    price_input, price_output = _price(provider)
+    PROVIDER_COST.labels(provider).inc((prompt_tokens * price_input + completion_tokens * price_output) / 1_000_000)
+
+@contextmanager
+def stage(operation: str, name: str):
+    """Medir una etapa: with stage("complete", "context_build"): ..."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.labels(operation, name).observe(time.perf_counter() - start)
+
+async def metrics_middleware(request, call_next):
+    """Latencia por plantilla de ruta (no por URL, para acotar las etiquetas)"""
+    start = time.perf_counter()
+    status = 500
+    HTTP_REQUESTS_IN_PROGRESS.inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_REQUESTS_IN_PROGRESS.dec()
+        route = request.scope.get('route')
+        HTTP_REQUEST_DURATION.labels(
+            request.method,
+            getattr(route, 'path', 'unmatched'),
+            str(status)
+        ).observe(time.perf_counter() - start)
+
+async def monitor_event_loop_lag(interval: float = EVENT_LOOP_LAG_INTERVAL):
+    """Medir cuánto tarda el loop en despertar respecto a lo pedido"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
+
+class AnalyzerCollector:
+    """Expone en cada scrape las estadísticas de cachés, cola y proveedores del analizador"""
+
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+
+    def collect(self):
+        caches = {
+            'analysis': self.analyzer.analysis_cache.stats(),
+            'categorization': self.analyzer.categorization_cache.stats(),
+        }
+        requests = CounterMetricFamily('ai_cache_requests', 'Consultas a las cachés por resultado', labels=['cache', 'result'])
+        hit_rate = GaugeMetricFamily('ai_cache_hit_rate', 'Tasa de aciertos de las cachés', labels=['cache'])
+        size = GaugeMetricFamily('ai_cache_entries', 'Entradas en memoria de las cachés', labels=['cache'])
+        for name, stats in caches.items():
+            for result in ('hits', 'misses', 'shared'):
+                if result in stats:
+                    requests.add_metric([name, result], stats[result])
+            hit_rate.add_metric([name], stats.get('hit_rate', 0.0))
+            size.add_metric([name], stats.get('size', stats.get('memory_size', 0)))
+        yield requests
+        yield hit_rate
+        yield size
+
+        queue = self.analyzer.ai_service.queue_stats()
+        depth = GaugeMetricFamily('ai_queue_depth', 'Solicitudes esperando turno', labels=['priority'])
+        for priority, value in queue['queue_depth'].items():
+            depth.add_metric([priority], value)
+        yield depth
+        wait = GaugeMetricFamily('ai_queue_wait_p95_seconds', 'Espera p95 reciente en la cola', labels=['priority'])
+        for priority, value in queue['wait_p95_ms'].items():
+            wait.add_metric([priority], value / 1000)
+        yield wait
+        yield CounterMetricFamily('ai_queue_coalesced', 'Solicitudes que compartieron una llamada en vuelo', value=queue['coalesced'])
+        yield CounterMetricFamily('ai_queue_batched_items', 'Elementos procesados en micro-lotes', value=queue['batched_items'])
+
+        compute = self.analyzer.compute_pool.stats()
+        tasks = CounterMetricFamily('ai_compute_tasks', 'Cálculos locales por lugar de ejecución', labels=['where'])
+        for where in ('inline', 'offloaded', 'failures'):
+            tasks.add_metric([where], compute[where])
+        yield tasks
+
+        router = self.analyzer.ai_service.stats()
+        breaker = GaugeMetricFamily('ai_provider_breaker_open', 'Circuit breaker abierto (1) o no (0)', labels=['provider'])
+        for name, stats in router['providers'].items():
+            breaker.add_metric([name], 1 if stats['breaker'] == 'open' else 0)
+        yield breaker
+
+_collector = None
+
+def register_analyzer(analyzer):
+    """Publicar las estadísticas del analizador (una sola vez por proceso)"""
+    global _collector
+    if _collector is None:
+        _collector = AnalyzerCollector(analyzer)
+        REGISTRY.register(_collector)
+    _collector.analyzer = analyzer
+
+def render_metrics():
+    """Texto en formato de exposición de Prometheus"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
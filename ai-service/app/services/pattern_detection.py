@@ -0,0 +1,242 @@
+import os
+import re
+from typing import Dict, List, Tuple
+import numpy as np
+from app.services.transaction_table import TransactionTable
+
+# Pagos recurrentes: ocurrencias mínimas y variación relativa del monto aceptada
+RECURRING_MIN_OCCURRENCES = int(os.getenv("RECURRING_MIN_OCCURRENCES", 3))
+RECURRING_AMOUNT_TOLERANCE = float(os.getenv("RECURRING_AMOUNT_TOLERANCE", 0.2))
+# Gastos inusuales: puntaje z robusto (mediana/MAD) y gastos mínimos por categoría
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", 3.5))
+ANOMALY_MIN_SAMPLES = int(os.getenv("ANOMALY_MIN_SAMPLES", 5))
+# Hallazgos devueltos de cada tipo
+PATTERN_MAX_RESULTS = int(os.getenv("PATTERN_MAX_RESULTS", 20))
+# Hallazgos de cada tipo incluidos en el contexto de los análisis
+PATTERN_CONTEXT_ITEMS = int(os.getenv("PATTERN_CONTEXT_ITEMS", 3))
+
+# (periodicidad, días del periodo, tolerancia en días)
+PERIODS = (
+    ("semanal", 7, 1),
+    ("quincenal", 15, 2),
+    ("mensual", 30.44, 3),
+    ("bimestral", 60.88, 5),
+    ("trimestral", 91.31, 7),
+    ("semestral", 182.62, 10),
+    ("anual", 365.25, 15),
+)
+_DAYS_PER_MONTH = 30.44
+# Escalas a la desviación estándar de una normal: 0.6745 * z = desvío / MAD; desviación media absoluta * 1.2533
+_MAD_SCALE = 0.6745
+_MEAN_AD_SCALE = 1.253314
+
+_ACCENTS = str.maketrans("áéíóúüàèìòù", "aeiouuaeiou")
+# Separador al normalizar muchas descripciones en una sola cadena
+_SEP = "\x00"
+_NOT_LETTERS = re.compile(r"[^a-zñ\x00]+")
+
+def merchant_key(text: str) -> str:
+    """
+    Clave de comercio para agrupar pagos: 'NETFLIX.COM 12/03 #4411' -> 'netflix com'
+
+    No es categorization_cache.normalize_description: aquí solo quedan letras
+    (los dígitos se quitan carácter por carácter, "CFE0123" -> "cfe"), con
+    una expresión regular que corre en bloque sobre todo el historial; la
+    caché descarta la palabra entera que tiene dígitos ("cfe0123" -> "").
+    Ninguna de las dos claves se usa en el lugar de la otra.
+    """
+    return _merchant_keys([text])[0]
+
+def _merchant_keys(texts: List[str]) -> List[str]:
+    """
+    Claves de comercio de muchas descripciones a la vez
+
+    Se unen en una sola cadena para que minúsculas, acentos y la expresión
+    regular pasen una vez por el texto en C en lugar de una vez por fila.
+    """
+    joined = _SEP.join(t or "" for t in texts)
+    if joined.count(_SEP) != len(texts) - 1:
+        # Alguna descripción contiene el separador: normalizarlas por separado
+        return [_merchant_keys([t.replace(_SEP, " ")])[0] if t else "" for t in texts]
+    joined = joined.lower()
+    if not joined.isascii():
+        joined = joined.translate(_ACCENTS)
+    return [part.strip() for part in _NOT_LETTERS.sub(" ", joined).split(_SEP)]
+
+def _group_median(codes: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """Mediana de values por código en un solo ordenamiento (NaN en grupos vacíos)"""
+    counts = np.bincount(codes, minlength=n_groups)
+    if len(values) == 0:
+        return np.full(n_groups, np.nan)
+    ordered = values[np.lexsort((values, codes))]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    lo = np.clip(starts + (counts - 1) // 2, 0, len(values) - 1)
+    hi = np.clip(starts + counts // 2, 0, len(values) - 1)
+    return np.where(counts > 0, (ordered[lo] + ordered[hi]) / 2, np.nan)
+
+def _group_keys(gastos: TransactionTable) -> Tuple[np.ndarray, List[str], List[str]]:
+    """
+    Agrupar los gastos por (clave de comercio, categoría)
+
+    Cada descripción distinta se normaliza una sola vez y se interna en un
+    índice hash; la clave de grupo combina ese código con el de la categoría.
+
+    Returns:
+        (grupo de cada fila, descripción de cada grupo, categoría de cada grupo)
+    """
+    descripciones = gastos.descripciones.tolist()
+    unique = list(dict.fromkeys(descripciones))
+    normalized: Dict[str, int] = {}
+    raw_codes = {
+        raw: normalized.setdefault(norm, len(normalized))
+        for raw, norm in zip(unique, _merchant_keys(unique))
+    }
+    desc_codes = np.fromiter(map(raw_codes.__getitem__, descripciones), dtype=np.int64, count=len(descripciones))
+    cat_codes, categorias = gastos.label_codes("Sin categoría")
+
+    keys = desc_codes * max(len(categorias), 1) + cat_codes
+    _, first, groups = np.unique(keys, return_index=True, return_inverse=True)
+    nombres = [descripciones[i] or "" for i in first.tolist()]
+    grupo_categorias = [categorias[c] for c in cat_codes[first].tolist()]
+    return groups.reshape(-1), nombres, grupo_categorias
+
+def _period(intervalo: float, dispersion: float):
+    """Periodicidad que corresponde a la mediana y la MAD de los intervalos, o None"""
+    for nombre, dias, tolerancia in PERIODS:
+        if abs(intervalo - dias) <= tolerancia and dispersion <= tolerancia:
+            return nombre
+    return None
+
+def detect_recurring(gastos: TransactionTable) -> List[Dict]:
+    """
+    Pagos periódicos (suscripciones, servicios, arriendo)
+
+    Agrupa por clave de comercio y categoría, ordena cada grupo por
+    fecha y mide los intervalos entre cargos consecutivos. Un grupo es
+    recurrente si la mediana de los intervalos cae en un periodo conocido,
+    los intervalos son regulares (MAD dentro de la tolerancia) y el monto es
+    estable. Medianas y MAD se calculan para todos los grupos a la vez.
+    Ordenado por vigencia y costo mensual equivalente.
+    """
+    if len(gastos) == 0:
+        return []
+    groups, nombres, categorias = _group_keys(gastos)
+    n_groups = len(nombres)
+    counts = np.bincount(groups, minlength=n_groups)
+    fin_datos = int(gastos.dias.max())
+
+    # Las filas de grupos con pocas ocurrencias no pueden ser recurrentes
+    keep = counts[groups] >= RECURRING_MIN_OCCURRENCES
+    if not keep.any():
+        return []
+    groups, dias, montos = groups[keep], gastos.dias[keep].astype(np.int64), gastos.montos[keep]
+
+    order = np.lexsort((dias, groups))
+    sorted_groups = groups[order]
+    same = sorted_groups[1:] == sorted_groups[:-1]
+    interval_groups = sorted_groups[1:][same]
+    intervals = np.diff(dias[order])[same].astype(np.float64)
+
+    intervalo = _group_median(interval_groups, intervals, n_groups)
+    dispersion = _group_median(interval_groups, np.abs(intervals - intervalo[interval_groups]), n_groups)
+    monto = _group_median(groups, montos, n_groups)
+    variacion = _group_median(groups, np.abs(montos - monto[groups]), n_groups)
+    ultimo = np.full(n_groups, np.iinfo(np.int64).min)
+    np.maximum.at(ultimo, groups, dias)
+
+    with np.errstate(invalid="ignore"):
+        candidates = np.flatnonzero(
+            (counts >= RECURRING_MIN_OCCURRENCES)
+            & (monto > 0)
+            & (variacion <= RECURRING_AMOUNT_TOLERANCE * monto)
+        )
+    recurrentes = []
+    for g in candidates.tolist():
+        periodicidad = _period(intervalo[g], dispersion[g])
+        if periodicidad is None:
+            continue
+        proximo = int(ultimo[g] + round(intervalo[g]))
+        recurrentes.append({
+            "descripcion": nombres[g],
+            "categoria": categorias[g],
+            "periodicidad": periodicidad,
+            "intervalo_dias": round(float(intervalo[g]), 1),
+            "monto": round(float(monto[g]), 2),
+            "ocurrencias": int(counts[g]),
+            "ultima_fecha": str(np.datetime64(int(ultimo[g]), "D")),
+            "proxima_fecha": str(np.datetime64(proximo, "D")),
+            "costo_mensual": round(float(monto[g] * _DAYS_PER_MONTH / intervalo[g]), 2),
+            # Sigue vigente si el último cargo no está atrasado más de medio periodo
+            "activa": bool(fin_datos <= ultimo[g] + 1.5 * intervalo[g]),
+        })
+    recurrentes.sort(key=lambda r: (r["activa"], r["costo_mensual"]), reverse=True)
+    return recurrentes
+
+def detect_anomalies(gastos: TransactionTable, limit: int = None) -> List[Dict]:
+    """
+    Gastos inusualmente altos para su categoría
+
+    Puntaje z robusto 0.6745 * (monto - mediana) / MAD de la categoría
+    (Iglewicz-Hoaglin), calculado para todos los gastos en una pasada; si la
+    MAD es 0 se usa la desviación media absoluta. Solo categorías con al
+    menos ANOMALY_MIN_SAMPLES gastos. Ordenado por puntaje; solo se
+    reconstruyen las primeras limit filas.
+    """
+    if len(gastos) == 0:
+        return []
+    codes, categorias = gastos.label_codes("Sin categoría")
+    n_cats = len(categorias)
+    counts = np.bincount(codes, minlength=n_cats)
+    mediana = _group_median(codes, gastos.montos, n_cats)
+    desvio = np.abs(gastos.montos - mediana[codes])
+    mad = _group_median(codes, desvio, n_cats) / _MAD_SCALE
+    mean_ad = np.bincount(codes, weights=desvio, minlength=n_cats) / np.maximum(counts, 1) * _MEAN_AD_SCALE
+    escala = np.where(mad > 0, mad, mean_ad)[codes]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        puntaje = np.where(escala > 0, (gastos.montos - mediana[codes]) / escala, 0.0)
+    flagged = np.flatnonzero((puntaje > ANOMALY_Z_THRESHOLD) & (counts[codes] >= ANOMALY_MIN_SAMPLES))
+    flagged = flagged[np.argsort(puntaje[flagged], kind="stable")[::-1]][:limit]
+
+    inusuales = []
+    for i in flagged.tolist():
+        t = gastos.row(i)
+        med = float(mediana[codes[i]])
+        inusuales.append({
+            "id": t.id,
+            "fecha": t.fecha,
+            "monto": t.monto,
+            "categoria": categorias[codes[i]],
+            "descripcion": t.descripcion,
+            "mediana_categoria": round(med, 2),
+            "veces_mediana": round(t.monto / med, 1) if med > 0 else None,
+            "puntaje": round(float(puntaje[i]), 1),
+        })
+    return inusuales
+
+def detect_patterns(table: TransactionTable, limit: int = PATTERN_MAX_RESULTS) -> Dict:
+    """Pagos recurrentes y gastos inusuales del historial completo (sin IA), hasta limit de cada uno"""
+    gastos = table.gastos()
+    recurrentes = detect_recurring(gastos)
+    activos = [r for r in recurrentes if r["activa"]]
+    return {
+        "recurrentes": recurrentes[:limit],
+        "inusuales": detect_anomalies(gastos, limit),
+        "recurrentes_activos": len(activos),
+        "gasto_recurrente_mensual": round(sum(r["costo_mensual"] for r in activos), 2),
+    }
+
+def format_patterns(patrones: Dict, limit: int) -> str:
+    """Secciones compactas del contexto con los hallazgos más relevantes"""
+    context = ""
+    activos = [r for r in patrones["recurrentes"] if r["activa"]]
+    if activos:
+        context += f"\n🔁 PAGOS RECURRENTES: {patrones['recurrentes_activos']} (${patrones['gasto_recurrente_mensual']:,.2f}/mes)\n"
+        for r in activos[:limit]:
+            context += f"   • {r['descripcion'] or r['categoria']} ({r['categoria']}): ${r['monto']:,.2f} {r['periodicidad']}\n"
+    if patrones["inusuales"]:
+        context += "\n⚠️ GASTOS INUSUALES:\n"
+        for a in patrones["inusuales"][:limit]:
+            veces = f"{a['veces_mediana']}x la mediana" if a["veces_mediana"] else f"puntaje {a['puntaje']}"
+            context += f"   • {a['fecha']}: ${a['monto']:,.2f} en {a['categoria']} ({veces}) - {a['descripcion'] or 'N/A'}\n"
+    return context
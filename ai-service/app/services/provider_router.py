@@ -0,0 +1,335 @@
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Dict, List, AsyncIterator, Optional
+from app.services.metrics import PROVIDER_REQUEST_DURATION
+
+# Plazo total por solicitud (incluye reintentos y cobertura)
+AI_REQUEST_DEADLINE = float(os.getenv('AI_REQUEST_DEADLINE', 45))
+
+# Reintentos con backoff exponencial y jitter completo
+AI_MAX_RETRIES = int(os.getenv('AI_MAX_RETRIES', 2))
+AI_RETRY_BASE_DELAY = float(os.getenv('AI_RETRY_BASE_DELAY', 0.5))
+AI_RETRY_MAX_DELAY = float(os.getenv('AI_RETRY_MAX_DELAY', 4))
+
+# Solicitud de cobertura (hedge) al otro proveedor cuando la primera tarda
+# más que el percentil AI_HEDGE_PERCENTILE de su latencia reciente
+AI_HEDGE_ENABLED = os.getenv('AI_HEDGE_ENABLED', 'true').lower() == 'true'
+AI_HEDGE_PERCENTILE = float(os.getenv('AI_HEDGE_PERCENTILE', 95))
+AI_HEDGE_MIN_DELAY = float(os.getenv('AI_HEDGE_MIN_DELAY', 1.0))
+AI_HEDGE_DEFAULT_DELAY = float(os.getenv('AI_HEDGE_DEFAULT_DELAY', 8.0))
+AI_HEDGE_MIN_SAMPLES = int(os.getenv('AI_HEDGE_MIN_SAMPLES', 20))
+
+# Circuit breaker: fallos consecutivos para abrir y tiempo antes de volver a probar
+AI_BREAKER_FAILURES = int(os.getenv('AI_BREAKER_FAILURES', 5))
+AI_BREAKER_COOLDOWN = float(os.getenv('AI_BREAKER_COOLDOWN', 30))
+
+# Ventana de estadísticas por proveedor y tasa de error que lo degrada; los
+# resultados más viejos que AI_STATS_MAX_AGE no cuentan, así un proveedor
+# degradado vuelve a ser preferido cuando pasa el tiempo
+AI_STATS_WINDOW = int(os.getenv('AI_STATS_WINDOW', 200))
+AI_STATS_MAX_AGE = float(os.getenv('AI_STATS_MAX_AGE', 120))
+AI_UNHEALTHY_ERROR_RATE = float(os.getenv('AI_UNHEALTHY_ERROR_RATE', 0.5))
+
+# Errores transitorios: vale la pena reintentar en el mismo proveedor
+_RETRYABLE_ERRORS = {
+    'TimeoutError', 'APITimeoutError', 'APIConnectionError', 'RateLimitError',
+    'InternalServerError', 'ConnectError', 'ReadTimeout', 'ConnectTimeout',
+    'RemoteProtocolError', 'ResourceExhausted', 'ServiceUnavailable',
+    'DeadlineExceeded',
+}
+
+def is_retryable(error: Exception) -> bool:
+    """Errores de red, límite de tasa (429) o del servidor (5xx)"""
+    if type(error).__name__ in _RETRYABLE_ERRORS:
+        return True
+    status = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    """
+    Circuit breaker por proveedor
+
+    closed: pasan todas las solicitudes. Tras AI_BREAKER_FAILURES fallos
+    consecutivos pasa a open y no se usa el proveedor durante el cooldown;
+    después queda half-open: el siguiente éxito lo cierra y el siguiente
+    fallo lo vuelve a abrir.
+    """
+
+    def __init__(self, failures: int = AI_BREAKER_FAILURES, cooldown: float = AI_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return 'open'
+        return 'half_open'
+
+    def allow(self) -> bool:
+        return self.state != 'open'
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == 'half_open' or self.consecutive_failures >= self.failures:
+            if self.state != 'open':
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+
+class ProviderStats:
+    """Latencias y resultados recientes de un proveedor"""
+
+    def __init__(self, window: int = AI_STATS_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record(self, ok: bool, latency: Optional[float] = None):
+        self.requests += 1
+        self.outcomes.append((time.monotonic(), ok))
+        if not ok:
+            self.errors += 1
+        elif latency is not None:
+            self.latencies.append(latency)
+
+    @property
+    def error_rate(self) -> float:
+        limit = time.monotonic() - AI_STATS_MAX_AGE
+        recent = [ok for at, ok in self.outcomes if at >= limit]
+        if not recent:
+            return 0.0
+        return 1 - sum(recent) / len(recent)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def hedge_delay(self) -> float:
+        """Espera antes de enviar la cobertura: percentil alto de la latencia reciente"""
+        if len(self.latencies) < AI_HEDGE_MIN_SAMPLES:
+            return AI_HEDGE_DEFAULT_DELAY
+        return max(AI_HEDGE_MIN_DELAY, self.percentile(AI_HEDGE_PERCENTILE))
+
+class ProviderRouter:
+    """
+    Enrutamiento entre proveedores de IA
+
+    - Orden por salud: el proveedor principal mientras su breaker esté cerrado
+      y su tasa de error sea baja; si no, el más sano y rápido.
+    - Plazo por solicitud, reintentos con backoff y jitter solo en errores
+      transitorios, y failover al siguiente proveedor.
+    - Cobertura: si el primero tarda más que su p95 reciente, se envía la misma
+      solicitud al otro proveedor y se usa la primera respuesta.
+    """
+
+    def __init__(self, providers: List, primary: str):
+        self.providers = {p.name: p for p in providers}
+        self.primary = primary if primary in self.providers else providers[0].name
+        self.breakers = {name: CircuitBreaker() for name in self.providers}
+        self.stats_by_provider = {name: ProviderStats() for name in self.providers}
+
+    def ordered(self) -> List:
+        """Proveedores en orden de preferencia según breaker, errores y latencia"""
+        def score(name):
+            stats = self.stats_by_provider[name]
+            return (
+                not self.breakers[name].allow(),
+                stats.error_rate >= AI_UNHEALTHY_ERROR_RATE,
+                name != self.primary,
+                stats.percentile(50) or 0.0,
+            )
+        return [self.providers[name] for name in sorted(self.providers, key=score)]
+
+    async def complete(self, messages, temperature, max_tokens, session_id=None, response_schema=None) -> str:
+        """Completion con plazo, reintentos, cobertura y failover (response_schema: modo JSON del proveedor)"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + AI_REQUEST_DEADLINE
+        candidates = self.ordered()
+        errors = []
+
+        while candidates:
+            provider = candidates.pop(0)
+            first = asyncio.create_task(
+                self._attempt(provider, messages, temperature, max_tokens, session_id, deadline, response_schema)
+            )
+            tasks = {first: provider}
+
+            try:
+                # Cobertura: esperar el p95 del proveedor antes de lanzar el siguiente
+                backup = next((c for c in candidates if self.breakers[c.name].allow()), None)
+                if AI_HEDGE_ENABLED and backup is not None:
+                    delay = min(self.stats_by_provider[provider.name].hedge_delay(), deadline - loop.time())
+                    done, _ = await asyncio.wait({first}, timeout=max(0.0, delay))
+                    if not done:
+                        candidates.remove(backup)
+                        self.stats_by_provider[backup.name].hedges += 1
+                        hedge = asyncio.create_task(
+                            self._attempt(backup, messages, temperature, max_tokens, session_id, deadline, response_schema)
+                        )
+                        tasks[hedge] = backup
+
+                while tasks:
+                    done, _ = await asyncio.wait(
+                        tasks, timeout=max(0.0, deadline - loop.time()),
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if not done:
+                        raise asyncio.TimeoutError(f"Plazo de {AI_REQUEST_DEADLINE:.0f}s agotado")
+                    for task in done:
+                        winner = tasks.pop(task)
+                        if task.exception() is None:
+                            if task is not first:
+                                self.stats_by_provider[winner.name].hedge_wins += 1
+                            return task.result()
+                        errors.append(f"{winner.name}: {task.exception()}")
+            finally:
+                # La solicitud perdedora se cancela para no seguir consumiendo tokens
+                for task in tasks:
+                    if task.done():
+                        task.exception()
+                    else:
+                        task.cancel()
+
+            if loop.time() >= deadline:
+                break
+
+        raise Exception("; ".join(errors) or "Ningún proveedor disponible")
+
+    async def _attempt(self, provider, messages, temperature, max_tokens, session_id, deadline, response_schema=None) -> str:
+        """Llamar a un proveedor con reintentos dentro del plazo"""
+        loop = asyncio.get_running_loop()
+        breaker = self.breakers[provider.name]
+        stats = self.stats_by_provider[provider.name]
+
+        for attempt in range(AI_MAX_RETRIES + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"circuito abierto para {provider.name}")
+            async with provider.semaphore:
+                start = loop.time()
+                try:
+                    result = await asyncio.wait_for(
+                        provider.complete(messages, temperature, max_tokens, session_id, response_schema),
+                        timeout=max(0.0, deadline - start)
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    stats.record(False)
+                    breaker.record_failure()
+                    PROVIDER_REQUEST_DURATION.labels(provider.name, 'error').observe(loop.time() - start)
+                    error = e
+                else:
+                    stats.record(True, loop.time() - start)
+                    PROVIDER_REQUEST_DURATION.labels(provider.name, 'ok').observe(loop.time() - start)
+                    breaker.record_success()
+                    return result
+
+            if not is_retryable(error) or attempt == AI_MAX_RETRIES:
+                raise error
+            backoff = random.uniform(0, min(AI_RETRY_MAX_DELAY, AI_RETRY_BASE_DELAY * 2 ** attempt))
+            if loop.time() + backoff >= deadline:
+                raise error
+            await asyncio.sleep(backoff)
+
+    async def stream(self, messages, temperature, max_tokens, session_id=None) -> AsyncIterator[str]:
+        """
+        Streaming con failover
+
+        El plazo, los reintentos y el failover aplican hasta el primer fragmento;
+        una vez enviado texto al cliente ya no se cambia de proveedor.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + AI_REQUEST_DEADLINE
+        errors = []
+
+        for provider in self.ordered():
+            breaker = self.breakers[provider.name]
+            stats = self.stats_by_provider[provider.name]
+
+            for attempt in range(AI_MAX_RETRIES + 1):
+                if not breaker.allow():
+                    errors.append(f"{provider.name}: circuito abierto")
+                    break
+                async with provider.semaphore:
+                    stream = provider.stream(messages, temperature, max_tokens, session_id)
+                    try:
+                        try:
+                            first = await asyncio.wait_for(
+                                stream.__anext__(), timeout=max(0.0, deadline - loop.time())
+                            )
+                        except StopAsyncIteration:
+                            first = None
+                        except asyncio.CancelledError:
+                            raise
+                        except Exception as e:
+                            stats.record(False)
+                            breaker.record_failure()
+                            error = e
+                        else:
+                            if first is not None:
+                                yield first
+                                try:
+                                    async for delta in stream:
+                                        yield delta
+                                except Exception:
+                                    stats.record(False)
+                                    breaker.record_failure()
+                                    raise
+                            stats.record(True)
+                            breaker.record_success()
+                            return
+                    finally:
+                        await stream.aclose()
+
+                errors.append(f"{provider.name}: {error}")
+                if not is_retryable(error) or attempt == AI_MAX_RETRIES:
+                    break
+                backoff = random.uniform(0, min(AI_RETRY_MAX_DELAY, AI_RETRY_BASE_DELAY * 2 ** attempt))
+                if loop.time() + backoff >= deadline:
+                    break
+                await asyncio.sleep(backoff)
+
+            if loop.time() >= deadline:
+                break
+
+        raise Exception("; ".join(errors) or "Ningún proveedor disponible")
+
+    def stats(self) -> Dict:
+        return {
+            "primary": self.primary,
+            "order": [p.name for p in self.ordered()],
+            "providers": {
+                name: {
+                    "model": self.providers[name].model_name,
+                    "breaker": self.breakers[name].state,
+                    "breaker_opened": self.breakers[name].times_opened,
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "error_rate": round(stats.error_rate, 3),
+                    "p50_ms": round((stats.percentile(50) or 0) * 1000, 1),
+                    "p95_ms": round((stats.percentile(95) or 0) * 1000, 1),
+                    "hedges": stats.hedges,
+                    "hedge_wins": stats.hedge_wins,
+                }
+                for name, stats in self.stats_by_provider.items()
+            },
+        }
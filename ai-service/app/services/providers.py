@@ -0,0 +1,193 @@
+import os
+import asyncio
+from typing import List, Dict, AsyncIterator, Optional
+from app.services.conversation_history import estimate_tokens
+from app.services.metrics import record_usage
+from app.services.fake_provider import FakeProvider
+
+# Límites de concurrencia y pool de conexiones
+AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', 32))
+AI_MAX_CONNECTIONS = int(os.getenv('AI_MAX_CONNECTIONS', 64))
+AI_KEEPALIVE_CONNECTIONS = int(os.getenv('AI_KEEPALIVE_CONNECTIONS', 20))
+AI_KEEPALIVE_EXPIRY = float(os.getenv('AI_KEEPALIVE_EXPIRY', 30))
+AI_REQUEST_TIMEOUT = float(os.getenv('AI_REQUEST_TIMEOUT', 60))
+
+def _provider_concurrency(provider: str) -> int:
+    """Límite de solicitudes simultáneas para un proveedor (ej. GEMINI_MAX_CONCURRENCY)"""
+    return int(os.getenv(f'{provider.upper()}_MAX_CONCURRENCY', AI_MAX_CONCURRENCY))
+
+def _split_system(messages: List[Dict]):
+    """Separar los system prompts (unidos) del resto de mensajes"""
+    system_parts = [msg['content'] for msg in messages if msg['role'] == 'system']
+    chat_messages = [msg for msg in messages if msg['role'] != 'system']
+    return ("\n\n".join(system_parts) or None), chat_messages
+
+class GeminiProvider:
+    """Cliente asíncrono de Gemini con sesiones de chat reutilizables"""
+
+    name = 'gemini'
+    model_name = 'gemini-2.0-flash-exp'
+
+    def __init__(self, api_key: str):
+        import google.generativeai as genai
+        from app.services.gemini_sessions import GeminiSessionPool
+
+        genai.configure(api_key=api_key)
+        # El transporte asíncrono (gRPC asyncio) mantiene el canal abierto entre llamadas
+        self.sessions = GeminiSessionPool(self.model_name)
+        # Semáforo: limita las completions en vuelo sin bloquear el event loop
+        self.max_concurrency = _provider_concurrency(self.name)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def complete(self, messages, temperature, max_tokens, session_id=None, response_schema=None) -> str:
+        """Completion usando Gemini (con response_schema responde JSON que cumple el esquema)"""
+        system_prompt, chat_messages = _split_system(messages)
+        chat = await self.sessions.checkout(session_id, system_prompt, chat_messages)
+
+        generation_config = {
+            'temperature': temperature,
+            'max_output_tokens': max_tokens,
+        }
+        if response_schema is not None:
+            generation_config['response_mime_type'] = 'application/json'
+            generation_config['response_schema'] = response_schema
+
+        # Generar respuesta (solo se envía el último mensaje; el resto ya está en la sesión)
+        response = await chat.send_message_async(
+            chat_messages[-1]['content'],
+            generation_config=generation_config
+        )
+
+        self.sessions.checkin(session_id, chat, system_prompt, chat_messages, response.text)
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None:
+            record_usage(self.name, usage.prompt_token_count, usage.candidates_token_count)
+        return response.text
+
+    async def stream(self, messages, temperature, max_tokens, session_id=None) -> AsyncIterator[str]:
+        """Streaming usando Gemini"""
+        system_prompt, chat_messages = _split_system(messages)
+        chat = await self.sessions.checkout(session_id, system_prompt, chat_messages)
+
+        response = await chat.send_message_async(
+            chat_messages[-1]['content'],
+            generation_config={
+                'temperature': temperature,
+                'max_output_tokens': max_tokens,
+            },
+            stream=True
+        )
+        parts = []
+        completed = False
+        usage = None
+        try:
+            async for chunk in response:
+                usage = getattr(chunk, 'usage_metadata', None) or usage
+                if chunk.parts:
+                    parts.append(chunk.text)
+                    yield chunk.text
+            completed = True
+        finally:
+            # Cerrar el iterador gRPC; la llamada se cancela al liberarse
+            iterator = getattr(response, '_iterator', None)
+            if hasattr(iterator, 'aclose'):
+                await iterator.aclose()
+            if usage is not None:
+                record_usage(self.name, usage.prompt_token_count, usage.candidates_token_count)
+            # Una sesión con respuesta incompleta no se reutiliza
+            if completed:
+                self.sessions.checkin(session_id, chat, system_prompt, chat_messages, "".join(parts))
+
+    async def close(self):
+        pass
+
+class DeepSeekProvider:
+    """Cliente asíncrono de DeepSeek (API compatible con OpenAI) con pool de conexiones"""
+
+    name = 'deepseek'
+    model_name = 'deepseek-chat'
+
+    def __init__(self, api_key: str):
+        import httpx
+        from openai import AsyncOpenAI
+
+        # Cliente HTTP compartido con pool de conexiones y keep-alive
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=AI_MAX_CONNECTIONS,
+                max_keepalive_connections=AI_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=AI_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(AI_REQUEST_TIMEOUT, connect=10.0)
+        )
+        # Los reintentos los maneja el router, no el SDK
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url='https://api.deepseek.com/v1',
+            http_client=self.http_client,
+            max_retries=0
+        )
+        self.max_concurrency = _provider_concurrency(self.name)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def complete(self, messages, temperature, max_tokens, session_id=None, response_schema=None) -> str:
+        """Completion usando DeepSeek (con response_schema activa el modo JSON; el esquema va en el prompt)"""
+        extra = {'response_format': {'type': 'json_object'}} if response_schema is not None else {}
+        response = await self.client.chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **extra
+        )
+        if response.usage is not None:
+            record_usage(self.name, response.usage.prompt_tokens, response.usage.completion_tokens)
+        return response.choices[0].message.content
+
+    async def stream(self, messages, temperature, max_tokens, session_id=None) -> AsyncIterator[str]:
+        """Streaming usando DeepSeek"""
+        stream = await self.client.chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        generated = 0
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    generated += len(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Cerrar la respuesta HTTP detiene la generación en el proveedor
+            await stream.response.aclose()
+            # El streaming no reporta uso: se estima con el largo del texto
+            record_usage(
+                self.name,
+                sum(estimate_tokens(m['content']) for m in messages),
+                generated // 4
+            )
+
+    async def close(self):
+        """Cerrar el pool de conexiones"""
+        await self.http_client.aclose()
+
+PROVIDER_CLASSES = {
+    'gemini': (GeminiProvider, 'GEMINI_API_KEY'),
+    'deepseek': (DeepSeekProvider, 'DEEPSEEK_API_KEY'),
+    # Sin red ni API key: solo como proveedor principal (AI_PROVIDER=fake)
+    'fake': (FakeProvider, None),
+}
+
+def create_provider(name: str, required: bool = True) -> Optional[object]:
+    """Crear un proveedor si su API key está configurada"""
+    provider_class, key_var = PROVIDER_CLASSES[name]
+    if key_var is None:
+        return provider_class() if required else None
+    api_key = os.getenv(key_var)
+    if not api_key:
+        if required:
+            raise ValueError(f"{key_var} no está configurada")
+        return None
+    return provider_class(api_key)
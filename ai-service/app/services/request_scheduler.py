@@ -0,0 +1,274 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+# Límite de tasa hacia los proveedores (solicitudes/segundo y ráfaga); 0 = sin límite
+AI_RATE_LIMIT = float(os.getenv('AI_RATE_LIMIT', 10))
+AI_RATE_BURST = int(os.getenv('AI_RATE_BURST', 20))
+
+# Ventana para juntar solicitudes compatibles en un solo prompt
+AI_BATCH_WINDOW_MS = float(os.getenv('AI_BATCH_WINDOW_MS', 25))
+
+# Prioridades: menor valor sale primero de la cola
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# Tiempos de espera recientes guardados por prioridad
+_WAIT_SAMPLES = 500
+
+class TokenBucket:
+    """Token bucket: `rate` tokens por segundo con capacidad `burst`"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Esperar hasta tener un token disponible y consumirlo"""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def try_acquire(self) -> float:
+        """Consumir un token sin esperar: 0 si lo hubo, si no los segundos hasta el próximo"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        self.tokens = min(self.burst, self.tokens + 1)
+
+class SharedTask:
+    """
+    Cálculo compartido por varios llamadores (single-flight)
+
+    Corre en una tarea propia, no en la del llamador que lo inició, y cada
+    llamador lo espera a través de shield: si uno se cancela (el cliente se
+    desconectó) los demás siguen esperando el resultado. La tarea solo se
+    cancela cuando ya no queda nadie esperándola.
+    """
+
+    def __init__(self, coro: Awaitable[Any]):
+        self.task = asyncio.ensure_future(coro)
+        self.task.add_done_callback(_retrieve_exception)
+        self.waiters = 0
+
+    async def wait(self) -> Any:
+        self.waiters += 1
+        try:
+            return await asyncio.shield(self.task)
+        finally:
+            self.waiters -= 1
+            if self.waiters == 0 and not self.task.done():
+                self.task.cancel()
+
+def _retrieve_exception(task: asyncio.Future):
+    """Marcar el error como recuperado aunque todos los llamadores se hayan ido"""
+    if not task.cancelled():
+        task.exception()
+
+class _Batch:
+    def __init__(self):
+        self.items: List[Any] = []
+        self.futures: List[asyncio.Future] = []
+        self.timer = None
+
+class RequestScheduler:
+    """
+    Planificador de solicitudes hacia los proveedores de IA
+
+    - Cola de prioridad + token bucket: cuando se alcanza el límite de tasa,
+      el siguiente token va a la solicitud de mayor prioridad (el chat antes
+      que la categorización en segundo plano).
+    - Solicitudes idénticas en vuelo comparten una sola llamada.
+    - Micro-lotes: elementos compatibles que llegan dentro de una ventana
+      corta se procesan juntos con un solo handler (un solo prompt).
+    """
+
+    def __init__(self, rate: float = AI_RATE_LIMIT, burst: int = AI_RATE_BURST, batch_window_ms: float = AI_BATCH_WINDOW_MS):
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.batch_window = batch_window_ms / 1000
+        self._queue: list = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher = None
+        self._in_flight: Dict[Hashable, SharedTask] = {}
+        self._batches: Dict[Hashable, _Batch] = {}
+        # Referencias a los lotes en curso: el loop solo guarda referencias débiles a las tareas
+        self._batch_tasks: set = set()
+        self.admitted = {p: 0 for p in PRIORITY_NAMES}
+        self.waits = {p: deque(maxlen=_WAIT_SAMPLES) for p in PRIORITY_NAMES}
+        self.max_depth = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.batched_items = 0
+
+    async def admit(self, priority: int = PRIORITY_NORMAL):
+        """Esperar el turno de una solicitud según prioridad y límite de tasa"""
+        start = time.monotonic()
+        if self.bucket is not None:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queue, (priority, next(self._seq), future))
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._ensure_dispatcher()
+            self._wakeup.set()
+            # Si el llamador se cancela, el dispatcher descarta la entrada
+            await future
+        self.admitted[priority] += 1
+        self.waits[priority].append(time.monotonic() - start)
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def _dispatch(self):
+        """Entregar cada token a la solicitud de mayor prioridad en espera"""
+        while True:
+            while not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            await self.bucket.acquire()
+            while self._queue:
+                _, _, future = heapq.heappop(self._queue)
+                if not future.done():
+                    future.set_result(None)
+                    break
+            else:
+                # Todas las entradas restantes estaban canceladas
+                self.bucket.refund()
+
+    async def coalesce(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Compartir la llamada en curso con la misma clave o iniciarla (ver SharedTask)"""
+        shared = self._in_flight.get(key)
+        if shared is not None:
+            self.coalesced += 1
+        else:
+            shared = self._in_flight[key] = SharedTask(compute())
+            shared.task.add_done_callback(lambda _: self._forget(key, shared))
+        return await shared.wait()
+
+    def _forget(self, key: Hashable, shared: SharedTask):
+        if self._in_flight.get(key) is shared:
+            del self._in_flight[key]
+
+    async def batch(
+        self,
+        key: Hashable,
+        item: Any,
+        handler: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_size: int
+    ) -> Any:
+        """
+        Agregar un elemento al lote abierto con la misma clave
+
+        El lote se procesa al cumplirse la ventana o al llegar a max_size;
+        handler recibe la lista de elementos y devuelve un resultado por
+        elemento en el mismo orden.
+        """
+        loop = asyncio.get_running_loop()
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = _Batch()
+            self._batches[key] = batch
+            batch.timer = loop.call_later(self.batch_window, self._flush, key, batch, handler)
+
+        future = loop.create_future()
+        batch.items.append(item)
+        batch.futures.append(future)
+        if len(batch.items) >= max_size:
+            batch.timer.cancel()
+            self._flush(key, batch, handler)
+        return await future
+
+    def _flush(self, key: Hashable, batch: _Batch, handler):
+        if self._batches.get(key) is batch:
+            del self._batches[key]
+        self.batches += 1
+        self.batched_items += len(batch.items)
+        task = asyncio.get_running_loop().create_task(self._run_batch(batch, handler))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch: _Batch, handler):
+        # Todos los llamadores se cancelaron mientras el lote esperaba: no llamar al modelo
+        if all(future.done() for future in batch.futures):
+            return
+        try:
+            results = await handler(batch.items)
+        except asyncio.CancelledError:
+            # Cancelar el lote (al apagar) cancela a quienes lo esperan, sin dejarlos colgados
+            for future in batch.futures:
+                future.cancel()
+            raise
+        except Exception as e:
+            self._fail_batch(batch, e)
+            return
+        if len(results) != len(batch.futures):
+            # Con zip, los elementos sin resultado esperarían para siempre
+            self._fail_batch(batch, Exception(
+                f"El lote devolvió {len(results)} resultados para {len(batch.futures)} elementos"
+            ))
+            return
+        for future, result in zip(batch.futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    @staticmethod
+    def _fail_batch(batch: _Batch, error: Exception):
+        for future in batch.futures:
+            if not future.done():
+                future.set_exception(error)
+                future.exception()
+
+    async def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+
+    def stats(self) -> Dict:
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future in self._queue:
+            if not future.done():
+                depth[PRIORITY_NAMES[priority]] += 1
+
+        def wait_ms(samples, p):
+            if not samples:
+                return 0.0
+            ordered = sorted(samples)
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 1)
+
+        return {
+            "rate_limit": self.bucket.rate if self.bucket else None,
+            "burst": self.bucket.burst if self.bucket else None,
+            "queue_depth": depth,
+            "max_queue_depth": self.max_depth,
+            "admitted": {PRIORITY_NAMES[p]: n for p, n in self.admitted.items()},
+            "wait_p50_ms": {PRIORITY_NAMES[p]: wait_ms(s, 50) for p, s in self.waits.items()},
+            "wait_p95_ms": {PRIORITY_NAMES[p]: wait_ms(s, 95) for p, s in self.waits.items()},
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+            "batches": self.batches,
+            "batched_items": self.batched_items,
+            "open_batches": len(self._batches),
+        }
@@ -0,0 +1,130 @@
+import os
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+from app.services.shared_cache import create_cache_backend
+from app.services.request_scheduler import SharedTask
+
+# Caché de análisis: segundos de vida y número máximo de respuestas
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", 600))
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", 1000))
+
+def fingerprint(*parts: str) -> str:
+    """Hash estable de las partes que definen una respuesta"""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+class ResponseCache:
+    """
+    Caché de respuestas con TTL y de-duplicación de solicitudes en vuelo
+
+    Si llegan varias solicitudes con la misma clave mientras la primera
+    sigue esperando al proveedor, todas comparten esa única llamada; el
+    cálculo corre aparte, así que si la primera se cancela las demás
+    reciben igual el resultado (y solo un resultado exitoso se guarda).
+    Con un respaldo compartido (CACHE_BACKEND=sqlite) la LRU del proceso
+    es el primer nivel y las respuestas de otros workers se leen del
+    respaldo; la de-duplicación en vuelo sigue siendo por proceso.
+    """
+
+    def __init__(
+        self,
+        ttl: float = ANALYSIS_CACHE_TTL,
+        max_size: int = ANALYSIS_CACHE_SIZE,
+        namespace: str = "analysis",
+        backend=None
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._in_flight: Dict[str, SharedTask] = {}
+        # Sin respaldo compartido (None) la LRU del proceso es la única copia
+        self.backend = backend if backend is not None else create_cache_backend(namespace, max_size)
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.backend_hits = 0
+
+    def get(self, key: str) -> Any:
+        """Valor guardado o None si no existe o expiró"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if time.monotonic() <= expires_at:
+                self._entries.move_to_end(key)
+                return value
+            del self._entries[key]
+
+        if self.backend is not None:
+            stored = self.backend.get(key)
+            if stored is not None:
+                value, remaining = stored
+                self.backend_hits += 1
+                self._remember(key, value, remaining)
+                return value
+        return None
+
+    def lookup(self, key: str) -> Any:
+        """Como get, pero cuenta el acierto (para quien no va a calcular el valor si falta)"""
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        self._remember(key, value, self.ttl)
+        if self.backend is not None:
+            self.backend.set(key, value, self.ttl)
+
+    def _remember(self, key: str, value: Any, ttl: float):
+        """Guardar en la LRU del proceso respetando el tamaño máximo"""
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Devolver el valor guardado, esperar al cálculo en curso o calcularlo"""
+        value = self.lookup(key)
+        if value is not None:
+            return value
+
+        shared = self._in_flight.get(key)
+        if shared is not None:
+            self.shared += 1
+        else:
+            self.misses += 1
+            shared = self._in_flight[key] = SharedTask(self._compute_and_store(key, compute))
+            shared.task.add_done_callback(lambda _: self._forget(key, shared))
+        return await shared.wait()
+
+    async def _compute_and_store(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        value = await compute()
+        self.set(key, value)
+        return value
+
+    def _forget(self, key: str, shared: SharedTask):
+        if self._in_flight.get(key) is shared:
+            del self._in_flight[key]
+
+    def invalidate(self):
+        self._entries.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses + self.shared
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "hit_rate": round((self.hits + self.shared) / total, 4) if total else 0.0,
+            "size": len(self._entries),
+            "in_flight": len(self._in_flight),
+            "backend": self.backend.name if self.backend is not None else "memory",
+            "backend_hits": self.backend_hits,
+        }
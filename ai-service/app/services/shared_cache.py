@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import sqlite3
+from typing import Any, Optional, Tuple
+
+# Respaldo de las cachés del analizador: memory (solo la LRU de cada proceso) o
+# sqlite (compartido entre los workers de uvicorn de la misma máquina)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "data/shared_cache.db")
+
+class SQLiteCacheBackend:
+    """
+    Entradas con vencimiento en un archivo SQLite compartido por los procesos
+
+    Cada worker de uvicorn abre el mismo archivo (WAL: lectores y un escritor
+    a la vez), así que una respuesta calculada por un worker sirve a todos.
+    Los valores se guardan como JSON; el vencimiento es de reloj de pared
+    para que sea comparable entre procesos.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, namespace: str, max_size: int, path: str = SHARED_CACHE_PATH):
+        self.namespace = namespace
+        self.max_size = max_size
+        self._writes = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache_entries(namespace, expires_at)")
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """(valor, segundos de vida restantes) o None si no existe o expiró"""
+        row = self._db.execute(
+            "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        remaining = row[1] - time.time()
+        if remaining <= 0:
+            return None
+        return json.loads(row[0]), remaining
+
+    def set(self, key: str, value: Any, ttl: float):
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (self.namespace, key, json.dumps(value, ensure_ascii=False), now + ttl)
+        )
+
+        # Poda periódica: entradas vencidas y las más próximas a vencer sobre el límite
+        self._writes += 1
+        if self._writes % 200 == 0:
+            self._evict(now)
+
+    def clear(self) -> int:
+        return self._db.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,)).rowcount
+
+    def size(self) -> int:
+        return self._db.execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+
+    def _evict(self, now: float):
+        self._db.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at < ?", (self.namespace, now)
+        )
+        self._db.execute(
+            """DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                SELECT key FROM cache_entries WHERE namespace = ?
+                ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.namespace, self.namespace, self.max_size)
+        )
+
+CACHE_BACKENDS = {
+    "sqlite": SQLiteCacheBackend,
+}
+
+def create_cache_backend(namespace: str, max_size: int, backend: str = None):
+    """
+    Respaldo compartido configurado por CACHE_BACKEND (namespace separa las claves de cada caché)
+
+    Devuelve None con CACHE_BACKEND=memory: la caché usa solo su LRU en memoria.
+    """
+    backend = backend or CACHE_BACKEND
+    if backend == "memory":
+        return None
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"CACHE_BACKEND inválido: {backend} (usa memory, {', '.join(CACHE_BACKENDS)})")
+    return CACHE_BACKENDS[backend](namespace, max_size)
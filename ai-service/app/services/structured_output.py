@@ -0,0 +1,160 @@
+import re
+import json
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional, Tuple, Type
+from pydantic import BaseModel, ValidationError
+
+# Cadenas JSON completas o comas antes de un cierre (fuera de las cadenas)
+_STRING_OR_TRAILING_COMMA = re.compile(r'"(?:\\.|[^"\\])*"|,(?=\s*[}\]])')
+# Caracteres que importan al buscar el cierre de un objeto/arreglo
+_STRUCTURAL = re.compile(r'["\\{}\[\]]')
+_FENCED = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+_OPENERS = re.compile(r"[{\[]")
+
+class StructuredOutputError(ValueError):
+    """La respuesta del modelo no contiene JSON válido para el esquema pedido"""
+
+def strip_trailing_commas(text: str) -> str:
+    """Quitar comas finales en objetos y arreglos sin tocar el contenido de las cadenas"""
+    return _STRING_OR_TRAILING_COMMA.sub(lambda m: m.group(0) if m.group(0)[0] == '"' else "", text)
+
+def _balanced_end(text: str, start: int) -> int:
+    """Índice del cierre que equilibra la apertura en start, o -1 si no cierra"""
+    depth = 0
+    in_string = False
+    escaped = -1  # posición del carácter escapado por una barra dentro de una cadena
+    for match in _STRUCTURAL.finditer(text, start):
+        pos = match.start()
+        if pos == escaped:
+            continue
+        char = match.group(0)
+        if in_string:
+            if char == "\\":
+                escaped = pos + 1
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return pos
+    return -1
+
+def _candidates(text: str) -> Iterator[str]:
+    """Fragmentos que podrían ser JSON: bloques ```json``` y luego objetos/arreglos equilibrados"""
+    for block in _FENCED.findall(text):
+        yield block.strip()
+    pos = 0
+    while True:
+        match = _OPENERS.search(text, pos)
+        if match is None:
+            return
+        end = _balanced_end(text, match.start())
+        if end < 0:
+            # Sin cierre (respuesta truncada): probar desde la siguiente apertura
+            pos = match.start() + 1
+            continue
+        yield text[match.start():end + 1]
+        pos = end + 1
+
+def iter_json(text: str) -> Iterator[Tuple[Any, str]]:
+    """
+    Valores JSON encontrados en el texto, con cómo se obtuvieron
+
+    Primero el texto completo ('direct'); después cada bloque ```json``` u
+    objeto con llaves equilibradas ('extracted') y, si no parsea, el mismo
+    fragmento sin comas finales ('repaired').
+    """
+    stripped = text.strip()
+    try:
+        yield json.loads(stripped), "direct"
+        return
+    except json.JSONDecodeError:
+        pass
+    seen = set()
+    for candidate in _candidates(stripped):
+        if candidate in seen:
+            continue
+        seen.add(candidate)
+        try:
+            yield json.loads(candidate), "extracted"
+            continue
+        except json.JSONDecodeError:
+            pass
+        repaired = strip_trailing_commas(candidate)
+        if repaired != candidate:
+            try:
+                yield json.loads(repaired), "repaired"
+            except json.JSONDecodeError:
+                pass
+
+def parse_structured(text: str, response_model: Optional[Type[BaseModel]] = None) -> Tuple[Dict, str]:
+    """
+    Primer objeto JSON del texto que cumple el esquema
+
+    Returns:
+        (diccionario validado, 'direct' | 'extracted' | 'repaired')
+
+    Raises:
+        StructuredOutputError: si ningún fragmento es un objeto válido
+    """
+    error = "no se encontró un objeto JSON"
+    for value, how in iter_json(text or ""):
+        if not isinstance(value, dict):
+            error = "se esperaba un objeto JSON"
+            continue
+        if response_model is None:
+            return value, how
+        try:
+            return response_model.model_validate(value).model_dump(), how
+        except ValidationError as e:
+            error = "; ".join(
+                f"{'.'.join(str(p) for p in err['loc']) or 'raíz'}: {err['msg']}" for err in e.errors()[:5]
+            )
+    raise StructuredOutputError(error)
+
+@lru_cache(maxsize=64)
+def json_schema(response_model: Type[BaseModel]) -> Dict:
+    """
+    Esquema del modelo en el subconjunto OpenAPI que aceptan los proveedores
+
+    Resuelve las referencias, convierte Optional en nullable y descarta
+    títulos y valores por defecto (Gemini rechaza las claves que no conoce).
+    Se calcula una vez por modelo: no modificar el resultado.
+    """
+    schema = response_model.model_json_schema()
+    defs = schema.get("$defs", {})
+
+    def convert(node: Dict) -> Dict:
+        if "$ref" in node:
+            node = defs[node["$ref"].split("/")[-1]]
+        if "anyOf" in node:
+            options = [o for o in node["anyOf"] if o.get("type") != "null"]
+            result = convert(options[0])
+            if len(options) < len(node["anyOf"]):
+                result["nullable"] = True
+            return result
+        result = {"type": node.get("type", "string")}
+        for key in ("description", "enum"):
+            if key in node:
+                result[key] = node[key]
+        if "properties" in node:
+            result["properties"] = {name: convert(value) for name, value in node["properties"].items()}
+            if node.get("required"):
+                result["required"] = list(node["required"])
+        if "items" in node:
+            result["items"] = convert(node["items"])
+        return result
+
+    return convert(schema)
+
+def repair_prompt(error: str) -> str:
+    """Instrucción para que el modelo corrija su respuesta anterior"""
+    return (
+        f"Tu respuesta anterior no es JSON válido para el formato pedido ({error}). "
+        "Responde SOLO con el JSON corregido, sin texto adicional ni bloques de código."
+    )
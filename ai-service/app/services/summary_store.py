@@ -0,0 +1,240 @@
+import os
+import heapq
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional
+from app.models import Transaction, FinancialData, Budget
+
+# Usuarios que se mantienen en memoria y transacciones recientes por tipo
+SUMMARY_STORE_MAX_USERS = int(os.getenv("SUMMARY_STORE_MAX_USERS", 10000))
+SUMMARY_RECENT_SIZE = int(os.getenv("SUMMARY_RECENT_SIZE", 20))
+
+class _Aggregate:
+    """Suma y conteo por clave (texto o tupla), eliminando la clave cuando su conteo llega a cero"""
+
+    def __init__(self):
+        self.sums: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, int] = defaultdict(int)
+
+    def add(self, key: str, monto: float, sign: int = 1):
+        self.sums[key] += sign * monto
+        self.counts[key] += sign
+        if self.counts[key] <= 0:
+            del self.sums[key]
+            del self.counts[key]
+
+    def merge(self, other: "_Aggregate"):
+        for key, monto in other.sums.items():
+            self.sums[key] += monto
+            self.counts[key] += other.counts[key]
+
+    def sorted_items(self) -> List[tuple]:
+        return sorted(self.sums.items(), key=lambda x: x[1], reverse=True)
+
+class UserFinancialSummary:
+    """
+    Resumen financiero incremental de un usuario
+
+    Mantiene totales, sumas por categoría/fuente, cubetas mensuales y las
+    transacciones más recientes; se actualiza con deltas en O(cambios).
+    """
+
+    def __init__(self, recent_size: int = SUMMARY_RECENT_SIZE):
+        self.recent_size = recent_size
+        self.total_gastos = 0.0
+        self.total_ingresos = 0.0
+        self.num_gastos = 0
+        self.num_ingresos = 0
+        self.por_categoria = _Aggregate()
+        self.por_fuente = _Aggregate()
+        self.por_categoria_mes = _Aggregate()
+        self.mensual: Dict[str, Dict[str, float]] = defaultdict(lambda: {"gastos": 0.0, "ingresos": 0.0})
+        # Transacciones por (mes, tipo): una cubeta mensual se elimina al quedar vacía
+        self._mensual_counts: Dict[tuple, int] = defaultdict(int)
+        self.recent_gastos: List[Transaction] = []
+        self.recent_ingresos: List[Transaction] = []
+        self.presupuestos: List[Budget] = []
+
+    @classmethod
+    def from_financial_data(cls, data: FinancialData) -> "UserFinancialSummary":
+        """Construir el resumen a partir del historial completo"""
+        summary = cls()
+        summary.apply(added=[*data.gastos, *data.ingresos])
+        summary.presupuestos = list(data.presupuestos)
+        return summary
+
+    def apply(self, added: List[Transaction] = (), removed: List[Transaction] = ()) -> int:
+        """
+        Aplicar transacciones agregadas y eliminadas
+
+        Eliminar una transacción que el resumen no tiene (ninguna con su
+        categoría o fuente en ese mes) no cambia nada: restarla dejaría los
+        totales por debajo de los reales. Devuelve cuántas se ignoraron.
+        """
+        ignored = 0
+        for t in removed:
+            if self._contains(t):
+                self._update(t, -1)
+            else:
+                ignored += 1
+        for t in added:
+            self._update(t, 1)
+        return ignored
+
+    def merge(self, other: "UserFinancialSummary"):
+        """Sumar otro resumen (p. ej. una carga en streaming ya terminada); los presupuestos no se tocan"""
+        self.total_gastos += other.total_gastos
+        self.total_ingresos += other.total_ingresos
+        self.num_gastos += other.num_gastos
+        self.num_ingresos += other.num_ingresos
+        self.por_categoria.merge(other.por_categoria)
+        self.por_fuente.merge(other.por_fuente)
+        self.por_categoria_mes.merge(other.por_categoria_mes)
+        for key, montos in other.mensual.items():
+            mes = self.mensual[key]
+            mes["gastos"] += montos["gastos"]
+            mes["ingresos"] += montos["ingresos"]
+        for key, n in other._mensual_counts.items():
+            self._mensual_counts[key] += n
+        for recent, extra in ((self.recent_gastos, other.recent_gastos), (self.recent_ingresos, other.recent_ingresos)):
+            recent.extend(extra)
+            if len(recent) > 2 * self.recent_size:
+                recent[:] = heapq.nlargest(self.recent_size, recent, key=lambda r: r.fecha)
+
+    def _contains(self, t: Transaction) -> bool:
+        """El resumen tiene alguna transacción con la categoría/fuente, mes y tipo de t"""
+        mes = t.fecha[:7]
+        tipo = "gasto" if t.tipo == "gasto" else "ingreso"
+        if self._mensual_counts.get((mes, tipo), 0) <= 0:
+            return False
+        if tipo == "gasto":
+            return (t.categoria or "Sin categoría", mes) in self.por_categoria_mes.counts
+        return (t.fuente or "Sin fuente") in self.por_fuente.counts
+
+    def _update(self, t: Transaction, sign: int):
+        monto = float(t.monto)
+        mes = self.mensual[t.fecha[:7]]
+        self._mensual_counts[(t.fecha[:7], "gasto" if t.tipo == "gasto" else "ingreso")] += sign
+        if t.tipo == "gasto":
+            self.total_gastos += sign * monto
+            self.num_gastos += sign
+            self.por_categoria.add(t.categoria or "Sin categoría", monto, sign)
+            self.por_categoria_mes.add((t.categoria or "Sin categoría", t.fecha[:7]), monto, sign)
+            mes["gastos"] += sign * monto
+            self._update_recent(self.recent_gastos, t, sign)
+        else:
+            self.total_ingresos += sign * monto
+            self.num_ingresos += sign
+            self.por_fuente.add(t.fuente or "Sin fuente", monto, sign)
+            mes["ingresos"] += sign * monto
+            self._update_recent(self.recent_ingresos, t, sign)
+        if sign < 0:
+            self._prune_month(t.fecha[:7])
+
+    def _prune_month(self, mes: str):
+        """Eliminar la cubeta de un mes que ya no tiene transacciones"""
+        for tipo in ("gasto", "ingreso"):
+            if self._mensual_counts.get((mes, tipo), 0) > 0:
+                return
+            self._mensual_counts.pop((mes, tipo), None)
+        self.mensual.pop(mes, None)
+
+    def _update_recent(self, recent: List[Transaction], t: Transaction, sign: int):
+        """
+        Mantener las N transacciones más recientes (por fecha)
+
+        Al eliminar una transacción reciente el búfer puede quedar con menos
+        de N elementos hasta la siguiente carga completa del historial.
+        """
+        if sign < 0:
+            for i, r in enumerate(recent):
+                if (t.id is not None and r.id == t.id) or (t.id is None and r == t):
+                    del recent[i]
+                    break
+            return
+        recent.append(t)
+        # Recortar al doble del tamaño para amortizar el costo en cargas grandes
+        if len(recent) > 2 * self.recent_size:
+            recent[:] = heapq.nlargest(self.recent_size, recent, key=lambda r: r.fecha)
+
+    def metrics(self, recent_gastos: int = 5, recent_ingresos: int = 3) -> Dict:
+        """Métricas en el mismo formato que compute_financial_metrics"""
+        saldo = self.total_ingresos - self.total_gastos
+        return {
+            "total_ingresos": self.total_ingresos,
+            "total_gastos": self.total_gastos,
+            "saldo": saldo,
+            "savings_rate": (saldo / self.total_ingresos * 100) if self.total_ingresos > 0 else 0,
+            "num_transacciones": self.num_gastos + self.num_ingresos,
+            "gastos_por_categoria": self.por_categoria.sorted_items(),
+            "ingresos_por_fuente": self.por_fuente.sorted_items(),
+            "ultimos_gastos": heapq.nlargest(recent_gastos, self.recent_gastos, key=lambda t: t.fecha),
+            "ultimos_ingresos": heapq.nlargest(recent_ingresos, self.recent_ingresos, key=lambda t: t.fecha),
+            "gastos_por_categoria_mes": dict(self.por_categoria_mes.sums),
+        }
+
+    def to_dict(self) -> Dict:
+        """Representación serializable del resumen"""
+        metrics = self.metrics()
+        return {
+            "total_ingresos": metrics["total_ingresos"],
+            "total_gastos": metrics["total_gastos"],
+            "saldo": metrics["saldo"],
+            "savings_rate": metrics["savings_rate"],
+            "num_transacciones": metrics["num_transacciones"],
+            "gastos_por_categoria": dict(metrics["gastos_por_categoria"]),
+            "ingresos_por_fuente": dict(metrics["ingresos_por_fuente"]),
+            "mensual": {mes: dict(v) for mes, v in sorted(self.mensual.items())},
+            "ultimos_gastos": [t.model_dump() for t in metrics["ultimos_gastos"]],
+            "ultimos_ingresos": [t.model_dump() for t in metrics["ultimos_ingresos"]],
+            "presupuestos": [p.model_dump() for p in self.presupuestos],
+        }
+
+class SummaryStore:
+    """Resúmenes financieros por user_id, con expulsión LRU"""
+
+    def __init__(self, max_users: int = SUMMARY_STORE_MAX_USERS):
+        self.max_users = max_users
+        self._summaries: "OrderedDict[str, UserFinancialSummary]" = OrderedDict()
+
+    def get(self, user_id: str) -> Optional[UserFinancialSummary]:
+        summary = self._summaries.get(user_id)
+        if summary is not None:
+            self._summaries.move_to_end(user_id)
+        return summary
+
+    def replace(self, user_id: str, data: FinancialData) -> UserFinancialSummary:
+        """Reconstruir el resumen de un usuario desde su historial completo"""
+        summary = UserFinancialSummary.from_financial_data(data)
+        self._put(user_id, summary)
+        return summary
+
+    def put(self, user_id: str, summary: UserFinancialSummary) -> UserFinancialSummary:
+        """Guardar un resumen ya construido (p. ej. por la ingesta en streaming)"""
+        self._put(user_id, summary)
+        return summary
+
+    def apply_delta(
+        self,
+        user_id: str,
+        added: List[Transaction],
+        removed: List[Transaction],
+        presupuestos: Optional[List[Budget]] = None
+    ) -> UserFinancialSummary:
+        """Aplicar cambios al resumen de un usuario (lo crea si no existe)"""
+        summary = self.get(user_id)
+        if summary is None:
+            summary = UserFinancialSummary()
+            self._put(user_id, summary)
+        summary.apply(added=added, removed=removed)
+        if presupuestos is not None:
+            summary.presupuestos = list(presupuestos)
+        return summary
+
+    def delete(self, user_id: str) -> bool:
+        return self._summaries.pop(user_id, None) is not None
+
+    def _put(self, user_id: str, summary: UserFinancialSummary):
+        self._summaries[user_id] = summary
+        self._summaries.move_to_end(user_id)
+        while len(self._summaries) > self.max_users:
+            self._summaries.popitem(last=False)
@@ -0,0 +1,172 @@
+from operator import attrgetter
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from app.models import Transaction, FinancialData
+
+# Índice de mes (año * 12 + mes - 1) del 1970-01, origen de datetime64[M]
+_EPOCH_MONTH = 1970 * 12
+_NO_ID = np.iinfo(np.int64).min
+
+def month_label(index: int) -> str:
+    """Índice de mes (año * 12 + mes - 1) -> 'YYYY-MM'"""
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+def _intern(values: List, index: Dict) -> np.ndarray:
+    """Códigos enteros de values; index (valor -> código) recibe los valores nuevos en orden de aparición"""
+    new = dict.fromkeys(values)
+    if index:
+        new = [v for v in new if v not in index]
+    index.update(zip(new, range(len(index), len(index) + len(new))))
+    return np.fromiter(map(index.__getitem__, values), dtype=np.int32, count=len(values))
+
+def _parse_days(fechas: List[str]) -> np.ndarray:
+    """Fechas 'YYYY-MM-DD...' (o 'YYYY-MM') -> días desde 1970-01-01"""
+    fechas = [f[:10] for f in fechas]
+    try:
+        return np.array(fechas, dtype="datetime64[D]").astype(np.int32)
+    except ValueError:
+        for fecha in fechas:
+            try:
+                np.datetime64(fecha, "D")
+            except ValueError:
+                raise ValueError(f"Fecha inválida: {fecha!r}")
+        raise
+
+class TransactionTable:
+    """
+    Transacciones en columnas (struct-of-arrays) para los cálculos del analizador
+
+    Cada columna es un arreglo NumPy: días desde 1970-01-01 (int32), montos
+    (float64), gasto/ingreso (bool), id (int64) y códigos int32 de la
+    etiqueta (categoría de los gastos, fuente de los ingresos) internada en
+    un vocabulario. Ordenar por fecha y agrupar por mes o etiqueta son
+    operaciones sobre enteros, y cada transacción ocupa ~30 bytes más su
+    descripción en lugar de un objeto de Pydantic con todas sus cadenas.
+    Las descripciones suelen ser casi únicas y solo se muestran para unas
+    pocas filas: se guardan como referencias, sin internar. `row(i)`
+    reconstruye una Transaction cuando hay que mostrarla.
+    """
+
+    __slots__ = ("dias", "montos", "es_gasto", "ids", "etiquetas", "descripciones", "vocab_etiquetas")
+
+    def __init__(
+        self,
+        dias: np.ndarray,
+        montos: np.ndarray,
+        es_gasto: np.ndarray,
+        ids: np.ndarray,
+        etiquetas: np.ndarray,
+        descripciones: np.ndarray,
+        vocab_etiquetas: List[Optional[str]]
+    ):
+        self.dias = dias
+        self.montos = montos
+        self.es_gasto = es_gasto
+        self.ids = ids
+        self.etiquetas = etiquetas
+        self.descripciones = descripciones
+        self.vocab_etiquetas = vocab_etiquetas
+
+    @classmethod
+    def from_transactions(cls, transactions: Sequence[Transaction], es_gasto: Optional[bool] = None) -> "TransactionTable":
+        """
+        Convertir transacciones validadas (una pasada en C por columna)
+
+        es_gasto fija el tipo de todas las filas; si es None se toma de t.tipo.
+        """
+        n = len(transactions)
+        if es_gasto is None:
+            gasto = np.fromiter(map(attrgetter("tipo"), transactions), dtype="U7", count=n) == "gasto"
+            etiquetas = [t.categoria if g else t.fuente for t, g in zip(transactions, gasto.tolist())]
+        else:
+            gasto = np.full(n, es_gasto, dtype=bool)
+            etiquetas = list(map(attrgetter("categoria" if es_gasto else "fuente"), transactions))
+        vocab_etiquetas = {}
+        return cls(
+            dias=_parse_days(list(map(attrgetter("fecha"), transactions))),
+            montos=np.fromiter(map(attrgetter("monto"), transactions), dtype=np.float64, count=n),
+            es_gasto=gasto,
+            ids=np.fromiter((_NO_ID if t.id is None else t.id for t in transactions), dtype=np.int64, count=n),
+            etiquetas=_intern(etiquetas, vocab_etiquetas),
+            descripciones=np.fromiter(map(attrgetter("descripcion"), transactions), dtype=object, count=n),
+            vocab_etiquetas=list(vocab_etiquetas),
+        )
+
+    @classmethod
+    def from_financial_data(cls, data: FinancialData) -> "TransactionTable":
+        """Gastos e ingresos de FinancialData en una sola tabla (el tipo lo da la lista)"""
+        gastos = cls.from_transactions(data.gastos, es_gasto=True)
+        if not data.ingresos:
+            return gastos
+        return gastos.concat(cls.from_transactions(data.ingresos, es_gasto=False))
+
+    def concat(self, other: "TransactionTable") -> "TransactionTable":
+        """Unir dos tablas recodificando las etiquetas de other"""
+        etiquetas = {v: i for i, v in enumerate(self.vocab_etiquetas)}
+        remap_etiquetas = _intern(other.vocab_etiquetas, etiquetas)
+
+        return TransactionTable(
+            dias=np.concatenate([self.dias, other.dias]),
+            montos=np.concatenate([self.montos, other.montos]),
+            es_gasto=np.concatenate([self.es_gasto, other.es_gasto]),
+            ids=np.concatenate([self.ids, other.ids]),
+            etiquetas=np.concatenate([self.etiquetas, remap_etiquetas[other.etiquetas]]),
+            descripciones=np.concatenate([self.descripciones, other.descripciones]),
+            vocab_etiquetas=list(etiquetas),
+        )
+
+    def __len__(self) -> int:
+        return len(self.montos)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes de las columnas (sin el vocabulario ni el texto de las descripciones)"""
+        return sum(getattr(self, c).nbytes for c in ("dias", "montos", "es_gasto", "ids", "etiquetas", "descripciones"))
+
+    def take(self, selector) -> "TransactionTable":
+        """Subconjunto de filas (máscara booleana o índices), con los mismos vocabularios"""
+        return TransactionTable(
+            self.dias[selector], self.montos[selector], self.es_gasto[selector], self.ids[selector],
+            self.etiquetas[selector], self.descripciones[selector],
+            self.vocab_etiquetas
+        )
+
+    def gastos(self) -> "TransactionTable":
+        return self.take(self.es_gasto)
+
+    def ingresos(self) -> "TransactionTable":
+        return self.take(~self.es_gasto)
+
+    def meses(self) -> np.ndarray:
+        """Índice de mes de cada fila (año * 12 + mes - 1)"""
+        return self.dias.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64) + _EPOCH_MONTH
+
+    def label_codes(self, default: str):
+        """
+        Códigos de etiqueta con los vacíos reemplazados por default
+
+        Returns:
+            (códigos por fila, nombres de cada código)
+        """
+        index: Dict[str, int] = {}
+        remap = np.fromiter(
+            (index.setdefault(v or default, len(index)) for v in self.vocab_etiquetas),
+            dtype=np.int32, count=len(self.vocab_etiquetas)
+        )
+        return remap[self.etiquetas], list(index)
+
+    def row(self, i: int) -> Transaction:
+        """Reconstruir la transacción de la fila i"""
+        i = int(i)
+        gasto = bool(self.es_gasto[i])
+        etiqueta = self.vocab_etiquetas[self.etiquetas[i]]
+        raw_id = int(self.ids[i])
+        return Transaction.model_construct(
+            id=None if raw_id == _NO_ID else raw_id,
+            monto=float(self.montos[i]),
+            categoria=etiqueta if gasto else None,
+            fuente=None if gasto else etiqueta,
+            descripcion=self.descripciones[i],
+            fecha=str(np.datetime64(int(self.dias[i]), "D")),
+            tipo="gasto" if gasto else "ingreso",
+        )
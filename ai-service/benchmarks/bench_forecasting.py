@@ -0,0 +1,85 @@
+"""
+Benchmark del motor de pronóstico sobre historiales sintéticos
+
+Uso (desde ai-service/):
+    python -m benchmarks.bench_forecasting
+    python -m benchmarks.bench_forecasting --years 1 3 10 --per-month 300
+"""
+import argparse
+import math
+import random
+import time
+from typing import List
+
+from app.models import Transaction
+from app.services.forecasting import forecast_spending
+
+CATEGORIES = {
+    # categoría: (monto base mensual, tendencia mensual, amplitud estacional)
+    "Alimentación": (6000, 15, 0.10),
+    "Transporte": (2500, 5, 0.05),
+    "Vivienda": (9000, 20, 0.0),
+    "Servicios": (1800, 3, 0.20),
+    "Entretenimiento": (1200, 2, 0.35),
+    "Salud": (700, 1, 0.15),
+    "Educación": (1500, 0, 0.50),
+    "Ropa": (900, 1, 0.45),
+}
+
+def synthetic_history(years: int, per_month: int, seed: int = 7) -> List[Transaction]:
+    """Gastos con tendencia, estacionalidad anual y ruido, repartidos por mes"""
+    rng = random.Random(seed)
+    transactions = []
+    start_year = 2026 - years
+    names = list(CATEGORIES)
+    for m in range(years * 12):
+        year, month = start_year + m // 12, m % 12 + 1
+        for i in range(per_month):
+            categoria = names[i % len(names)]
+            base, trend, season = CATEGORIES[categoria]
+            monthly = (base + trend * m) * (1 + season * math.sin(2 * math.pi * month / 12))
+            share = len(names) / per_month
+            transactions.append(Transaction(
+                monto=round(max(0.0, monthly * share * rng.uniform(0.7, 1.3)), 2),
+                categoria=categoria,
+                descripcion=f"compra {i}",
+                fecha=f"{year:04d}-{month:02d}-{rng.randint(1, 28):02d}",
+                tipo="gasto",
+            ))
+    return transactions
+
+def run(years_list: List[int], per_month: int, months_ahead: int, repeat: int):
+    print(f"{'años':>5} {'transacciones':>14} {'ms (mediana)':>13} {'MAPE total 3m':>14}")
+    for years in years_list:
+        history = synthetic_history(years, per_month)
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            forecast_spending(history, months_ahead)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+
+        # Precisión: entrenar sin los últimos 3 meses y comparar contra ellos
+        mape = float("nan")
+        if years * 12 > 6:
+            cutoff = f"{2026 - years + (years * 12 - 3) // 12:04d}-{(years * 12 - 3) % 12 + 1:02d}"
+            train = [t for t in history if t.fecha[:7] < cutoff]
+            actual = {}
+            for t in history:
+                if t.fecha[:7] >= cutoff:
+                    actual[t.fecha[:7]] = actual.get(t.fecha[:7], 0) + t.monto
+            predicted = {p["mes"]: p["monto"] for p in forecast_spending(train, 3)["total"]}
+            errors = [abs(predicted[m] - a) / a for m, a in actual.items() if m in predicted and a]
+            mape = 100 * sum(errors) / len(errors) if errors else float("nan")
+
+        print(f"{years:>5} {len(history):>14} {timings[len(timings) // 2]:>13.2f} {mape:>13.1f}%")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--per-month", type=int, default=200)
+    parser.add_argument("--months-ahead", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.years, args.per_month, args.months_ahead, args.repeat)
@@ -0,0 +1,78 @@
+"""
+Benchmark del pool de cómputo: cuánto bloquean el loop los cálculos locales
+
+Lanza análisis locales (métricas + patrones) sobre historiales grandes
+mientras una tarea mide el retraso del loop cada 5 ms, con cada modo de
+COMPUTE_EXECUTOR. En modo inline el retraso máximo es el tiempo completo
+del cálculo; fuera del loop debería quedarse en unos pocos milisegundos.
+
+Uso (desde ai-service/):
+    python -m benchmarks.bench_offload
+    python -m benchmarks.bench_offload --sizes 50000 200000 --concurrency 4 --workers 2
+"""
+import time
+import asyncio
+import argparse
+from typing import List
+
+from app.services.compute_pool import ComputePool, EXECUTOR_MODES
+from app.services.financial_metrics import compute_financial_metrics
+from app.services.pattern_detection import detect_patterns
+from app.services.transaction_table import TransactionTable
+from benchmarks.bench_service import synthetic_financial_data
+
+TICK = 0.005
+
+async def measure(pool: ComputePool, table: TransactionTable, concurrency: int) -> dict:
+    """Tiempo total y retraso del loop mientras corren `concurrency` análisis"""
+    lags: List[float] = []
+    done = asyncio.Event()
+
+    async def ticker():
+        loop = asyncio.get_running_loop()
+        while not done.is_set():
+            start = loop.time()
+            await asyncio.sleep(TICK)
+            lags.append(max(0.0, loop.time() - start - TICK) * 1000)
+
+    async def analysis():
+        await asyncio.gather(
+            pool.run(compute_financial_metrics, table),
+            pool.run(detect_patterns, table, 5),
+        )
+
+    monitor = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK * 2)
+    start = time.perf_counter()
+    await asyncio.gather(*(analysis() for _ in range(concurrency)))
+    elapsed = (time.perf_counter() - start) * 1000
+    done.set()
+    await monitor
+
+    lags.sort()
+    return {
+        "total_ms": elapsed,
+        "lag_p95_ms": lags[int(len(lags) * 0.95)] if lags else 0.0,
+        "lag_max_ms": lags[-1] if lags else 0.0,
+    }
+
+async def run(sizes: List[int], concurrency: int, workers: int, modes: List[str]):
+    print(f"{'modo':>8} {'transacciones':>14} {'total ms':>10} {'lag p95 ms':>11} {'lag máx ms':>11}")
+    for n in sizes:
+        table = TransactionTable.from_financial_data(synthetic_financial_data(n))
+        for mode in modes:
+            pool = ComputePool(mode=mode, workers=workers, min_rows=0)
+            # Calentar: arrancar los procesos no cuenta en la medición
+            await pool.run(compute_financial_metrics, table.take(slice(0, 10)))
+            result = await measure(pool, table, concurrency)
+            pool.shutdown()
+            print(f"{mode:>8} {n:>14} {result['total_ms']:>10.1f} {result['lag_p95_ms']:>11.1f} {result['lag_max_ms']:>11.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20000, 100000])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--modes", nargs="+", choices=EXECUTOR_MODES, default=list(EXECUTOR_MODES))
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.concurrency, args.workers, args.modes))
@@ -0,0 +1,288 @@
+"""
+Benchmark del servicio sin red, con el proveedor simulado (AI_PROVIDER=fake)
+
+Mide el costo propio del servicio separado de la latencia del proveedor:
+armado del contexto, extracción de viñetas, parseo de respuestas
+estructuradas y rutas completas a distintos tamaños y concurrencias.
+
+Uso (desde ai-service/):
+    python -m benchmarks.bench_service
+    python -m benchmarks.bench_service --only context bullets
+    python -m benchmarks.bench_service --sizes 100 1000 10000 100000 --concurrency 1 8 32
+    python -m benchmarks.bench_service --latency-ms 300 --jitter-ms 150 --distribution lognormal
+    python -m benchmarks.bench_service --output v1.json
+    python -m benchmarks.bench_service --compare v1.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from typing import Callable, Dict, List
+
+# Configuración sin red ni estado compartido, antes de importar la app
+_tmp = tempfile.mkdtemp(prefix="bench_ai_")
+os.environ.setdefault("AI_PROVIDER", "fake")
+os.environ.setdefault("AI_RATE_LIMIT", "0")
+os.environ.setdefault("ANALYSIS_CACHE_TTL", "0")
+# Sin cuotas ni degradación: se mide el costo de las rutas, no el control de admisión
+os.environ.setdefault("ADMISSION_USER_RATE", "0")
+os.environ.setdefault("ADMISSION_USER_CONCURRENCY", "0")
+os.environ.setdefault("ADMISSION_GLOBAL_RATE", "0")
+os.environ.setdefault("ADMISSION_MAX_CONCURRENCY", "10000")
+os.environ.setdefault("CATEGORIZATION_CACHE_PATH", os.path.join(_tmp, "categorization_cache.db"))
+os.environ.setdefault("LOCAL_CLASSIFIER_PATH", os.path.join(_tmp, "local_classifier.db"))
+
+import httpx
+
+from app.models import Transaction, FinancialData
+from app.services.ai_service import AIService
+from app.services.fake_provider import FakeProvider, ANALYSIS_TEXT, DISTRIBUTIONS, JSON_FORMATS
+from app.services.financial_analyzer import FinancialAnalyzer, CATEGORIAS
+
+BENCHMARKS = ("context", "bullets", "structured", "routes")
+DESCRIPCIONES = ["oxxo", "uber", "renta depto", "cfe luz", "cine", "farmacia", "colegiatura", "zara", "amazon", "restaurante"]
+
+def synthetic_financial_data(n: int, seed: int = 7) -> FinancialData:
+    """n transacciones (80% gastos) repartidas en 12 meses"""
+    rng = random.Random(seed)
+    gastos, ingresos = [], []
+    for i in range(n):
+        fecha = f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        if i % 5:
+            gastos.append(Transaction(
+                id=i,
+                monto=round(rng.uniform(20, 3000), 2),
+                categoria=rng.choice(CATEGORIAS["gasto"]),
+                descripcion=f"{rng.choice(DESCRIPCIONES)} {i}",
+                fecha=fecha,
+                tipo="gasto",
+            ))
+        else:
+            ingresos.append(Transaction(
+                id=i,
+                monto=round(rng.uniform(5000, 40000), 2),
+                fuente=rng.choice(CATEGORIAS["ingreso"]),
+                descripcion=f"pago {i}",
+                fecha=fecha,
+                tipo="ingreso",
+            ))
+    return FinancialData(gastos=gastos, ingresos=ingresos, presupuestos=[
+        {"categoria": c, "monto_limite": 5000, "mes": "2026-12"} for c in CATEGORIAS["gasto"][:4]
+    ])
+
+def summarize(name: str, params: Dict, timings: List[float], ops: int, elapsed: float) -> Dict:
+    """Latencias en ms (p50/p95/p99) y operaciones por segundo"""
+    ordered = sorted(timings)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000
+    return {
+        "benchmark": name,
+        "params": params,
+        "ops_per_s": round(ops / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(pick(50), 3),
+        "p95_ms": round(pick(95), 3),
+        "p99_ms": round(pick(99), 3),
+    }
+
+def time_sync(fn: Callable, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def bench_context(analyzer: FinancialAnalyzer, sizes: List[int], repeat: int) -> List[Dict]:
+    results = []
+    for n in sizes:
+        data = synthetic_financial_data(n)
+        timings = time_sync(lambda: analyzer._prepare_financial_context(data), repeat)
+        results.append(summarize("context", {"transactions": n}, timings, repeat, sum(timings)))
+    return results
+
+def bench_bullets(analyzer: FinancialAnalyzer, repeat: int) -> List[Dict]:
+    results = []
+    for copies in (1, 10, 100):
+        text = "\n\n".join([ANALYSIS_TEXT] * copies)
+        timings = time_sync(
+            lambda: analyzer._extract_bullet_points(text, ["recomendaciones", "acciones", "sugerencias"]),
+            repeat * 10
+        )
+        results.append(summarize("bullets", {"chars": len(text)}, timings, len(timings), sum(timings)))
+    return results
+
+async def bench_structured(analyzer: FinancialAnalyzer, repeat: int) -> List[Dict]:
+    """Parseo de respuestas estructuradas (proveedor sin latencia) por formato y tamaño de lote"""
+    provider = analyzer.ai_service.router.providers["fake"]
+    saved = (provider.latency_ms, provider.jitter_ms, provider.json_format)
+    provider.latency_ms, provider.jitter_ms = 0, 0
+    results = []
+    try:
+        for json_format in JSON_FORMATS:
+            provider.json_format = json_format
+            for batch in (1, 50):
+                transactions = [{"descripcion": f"zz compra {i}", "monto": 10.0 + i} for i in range(batch)]
+                timings = []
+                for _ in range(repeat * 10):
+                    start = time.perf_counter()
+                    try:
+                        await analyzer._categorize_chunk("gasto", transactions)
+                    except Exception:
+                        # prose: sin JSON incluso tras el reintento de reparación
+                        pass
+                    timings.append(time.perf_counter() - start)
+                results.append(summarize(
+                    "structured", {"format": json_format, "batch": batch}, timings, len(timings), sum(timings)
+                ))
+    finally:
+        provider.latency_ms, provider.jitter_ms, provider.json_format = saved
+    return results
+
+def _route_bodies(route: str, data: FinancialData, requests: int) -> List[bytes]:
+    """Cuerpos pre-serializados, distintos entre sí para no compartir llamadas en vuelo"""
+    gastos_ingresos = json.dumps(data.model_dump(include={"gastos", "ingresos"}), ensure_ascii=False)[1:-1]
+    bodies = []
+    for i in range(requests):
+        presupuesto = json.dumps({"categoria": "Bench", "monto_limite": i + 1, "mes": "2026-12"})
+        financial_data = f'{{"presupuestos":[{presupuesto}],{gastos_ingresos}}}'
+        if route == "analyze":
+            body = f'{{"analysis_type":"complete","financial_data":{financial_data}}}'
+        elif route == "analyze-spending":
+            body = f'{{"analysis_type":"spending","financial_data":{financial_data}}}'
+        elif route == "chat-financial":
+            body = f'{{"message":"¿Cómo puedo ahorrar más? ({i})","financial_data":{financial_data}}}'
+        else:
+            body = json.dumps({"transactions": [
+                {"descripcion": f"{t.descripcion} #{i}", "monto": t.monto, "tipo": "gasto"} for t in data.gastos
+            ]}, ensure_ascii=False)
+        bodies.append(body.encode("utf-8"))
+    return bodies
+
+ROUTES = {
+    "analyze": "/api/ai/analyze",
+    "analyze-spending": "/api/ai/analyze",
+    "chat-financial": "/api/ai/chat-financial",
+    "categorize-batch": "/api/ai/categorize/batch",
+}
+
+async def bench_routes(sizes: List[int], concurrency: List[int], requests: int, routes: List[str]) -> List[Dict]:
+    """Rutas completas en proceso (ASGI, sin sockets) con el proveedor simulado"""
+    from app.main import app
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for route in routes:
+            for n in sizes:
+                data = synthetic_financial_data(n)
+                for level in concurrency:
+                    bodies = _route_bodies(route, data, requests)
+                    queue = list(bodies)
+                    timings, failures = [], 0
+
+                    async def worker():
+                        nonlocal failures
+                        while queue:
+                            body = queue.pop()
+                            start = time.perf_counter()
+                            response = await client.post(
+                                ROUTES[route], content=body, headers={"content-type": "application/json"}
+                            )
+                            timings.append(time.perf_counter() - start)
+                            if response.status_code != 200:
+                                failures += 1
+
+                    start = time.perf_counter()
+                    await asyncio.gather(*(worker() for _ in range(level)))
+                    elapsed = time.perf_counter() - start
+                    result = summarize(route, {"transactions": n, "concurrency": level}, timings, len(timings), elapsed)
+                    result["failures"] = failures
+                    results.append(result)
+                    print_result(result)
+    return results
+
+def print_result(result: Dict, baseline: Dict = None):
+    params = " ".join(f"{k}={v}" for k, v in result["params"].items())
+    line = (
+        f"{result['benchmark']:<17} {params:<36} {result['ops_per_s']:>10.1f} ops/s "
+        f"p50 {result['p50_ms']:>9.3f} ms  p95 {result['p95_ms']:>9.3f} ms  p99 {result['p99_ms']:>9.3f} ms"
+    )
+    if result.get("failures"):
+        line += f"  fallos {result['failures']}"
+    if baseline:
+        delta_p50 = (result["p50_ms"] / baseline["p50_ms"] - 1) * 100 if baseline["p50_ms"] else 0.0
+        delta_ops = (result["ops_per_s"] / baseline["ops_per_s"] - 1) * 100 if baseline["ops_per_s"] else 0.0
+        line += f"  Δp50 {delta_p50:+.1f}%  Δops {delta_ops:+.1f}%"
+    print(line)
+
+def _key(result: Dict) -> str:
+    return result["benchmark"] + json.dumps(result["params"], sort_keys=True)
+
+async def main(args):
+    provider = FakeProvider(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        distribution=args.distribution,
+        seed=args.seed
+    )
+    only = args.only or list(BENCHMARKS)
+    results = []
+
+    if set(only) & {"context", "bullets", "structured"}:
+        analyzer = FinancialAnalyzer(AIService([provider]))
+        if "context" in only:
+            results += bench_context(analyzer, args.sizes, args.repeat)
+        if "bullets" in only:
+            results += bench_bullets(analyzer, args.repeat)
+        if "structured" in only:
+            results += await bench_structured(analyzer, args.repeat)
+        await analyzer.ai_service.close()
+        for result in results:
+            print_result(result)
+
+    if "routes" in only:
+        # El analizador de la app usa su propio proveedor simulado: se configura igual
+        from app.routes import ai_routes
+        fake = ai_routes.get_analyzer().ai_service.router.providers["fake"]
+        fake.latency_ms, fake.jitter_ms, fake.distribution = provider.latency_ms, provider.jitter_ms, provider.distribution
+        results += await bench_routes(
+            [n for n in args.sizes if n <= args.max_route_size], args.concurrency, args.requests, args.routes
+        )
+
+    report = {
+        "python": sys.version.split()[0],
+        "fake_provider": {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "distribution": args.distribution},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {_key(r): r for r in json.load(f)["results"]}
+        print(f"\nComparación contra {args.compare}:")
+        for result in results:
+            print_result(result, baseline.get(_key(result)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--max-route-size", type=int, default=10000, help="tamaño máximo para las rutas completas")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=64, help="solicitudes por escenario de rutas")
+    parser.add_argument("--routes", nargs="+", choices=list(ROUTES), default=["analyze", "analyze-spending", "chat-financial"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="constant")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="guardar los resultados en JSON")
+    parser.add_argument("--compare", help="comparar contra un JSON guardado con --output")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,61 @@
+"""
+Tiempo de arranque en frío del servicio contra un presupuesto
+
+Cada corrida es un proceso nuevo que importa la app y ejecuta su lifespan
+(como uvicorn antes de aceptar conexiones). Termina con código 1 si la
+mediana excede el presupuesto, para usarlo en CI.
+
+Uso (desde ai-service/):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 10 --budget-ms 1500 --warmup startup
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+_PROBE = """
+import time, json, asyncio
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+async def run():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+ready = asyncio.run(run())
+import sys
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "ready_ms": (ready - start) * 1000,
+    "sdk_loaded": any(m in sys.modules for m in ("google.generativeai", "openai")),
+}))
+"""
+
+def measure(runs: int, warmup: str) -> list:
+    env = {**os.environ, "AI_WARMUP": warmup}
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE], env=env, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return samples
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", 1500)))
+    parser.add_argument("--warmup", choices=["off", "startup", "background"], default="off")
+    args = parser.parse_args()
+
+    samples = measure(args.runs, args.warmup)
+    median = lambda key: sorted(s[key] for s in samples)[len(samples) // 2]
+    print(f"{'importación (ms)':>18} {'listo (ms)':>12} {'SDK cargados':>14}")
+    for s in samples:
+        print(f"{s['import_ms']:>18.0f} {s['ready_ms']:>12.0f} {str(s['sdk_loaded']):>14}")
+    ready = median("ready_ms")
+    print(f"\nMediana hasta listo: {ready:.0f} ms (presupuesto {args.budget_ms:.0f} ms)")
+    sys.exit(0 if ready <= args.budget_ms else 1)
@@ -0,0 +1,32 @@
+import os
+import tempfile
+
+# Antes de importar la app: proveedor simulado, sin API keys (nada sale a la
+# red aunque exista un .env) y bases de SQLite en un directorio temporal
+_DATA_DIR = tempfile.mkdtemp(prefix="ai-service-tests-")
+os.environ["AI_PROVIDER"] = "fake"
+os.environ["GEMINI_API_KEY"] = ""
+os.environ["DEEPSEEK_API_KEY"] = ""
+os.environ["CACHE_BACKEND"] = "memory"
+for var, filename in (
+    ("JOBS_DB_PATH", "jobs.db"),
+    ("CATEGORIZATION_CACHE_PATH", "categorization_cache.db"),
+    ("LOCAL_CLASSIFIER_PATH", "local_classifier.db"),
+    ("SHARED_CACHE_PATH", "shared_cache.db"),
+):
+    os.environ[var] = os.path.join(_DATA_DIR, filename)
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routes import ai_routes
+
+@pytest.fixture
+def client(monkeypatch):
+    """Cliente de la app con analizador, admisión y cola de trabajos nuevos"""
+    monkeypatch.setattr(ai_routes, "_analyzer", None)
+    monkeypatch.setattr(ai_routes, "_admission", None)
+    monkeypatch.setattr(ai_routes, "_jobs", None)
+    with TestClient(app) as test_client:
+        yield test_client
@@ -0,0 +1,24 @@
+from app.routes import ai_routes
+from app.services.admission import AdmissionController
+
+# Sin regla local ni caché: la respuesta viene del proveedor simulado
+BODY = {"descripcion": "qwerty zxcv", "monto": 20, "tipo": "gasto"}
+
+def test_categorize_with_the_fake_provider(client):
+    response = client.post("/api/ai/categorize", json=BODY)
+    assert response.status_code == 200
+    assert response.json()["reasoning"] == "Simulado"
+
+def test_batch_answers_one_result_per_transaction(client):
+    transactions = [{**BODY, "descripcion": f"qwerty {i}"} for i in range(3)]
+    response = client.post("/api/ai/categorize/batch", json={"transactions": transactions})
+    assert response.status_code == 200
+    assert len(response.json()["results"]) == 3
+
+def test_each_user_has_its_own_quota(client, monkeypatch):
+    monkeypatch.setattr(ai_routes, "_admission", AdmissionController(user_rate=1, user_burst=1))
+
+    assert client.post("/api/ai/categorize", json=BODY, headers={"X-User-Id": "u1"}).status_code == 200
+    assert client.post("/api/ai/categorize", json=BODY, headers={"X-User-Id": "u1"}).status_code == 429
+    assert client.post("/api/ai/categorize", json=BODY, headers={"X-User-Id": "u2"}).status_code == 200
+    assert client.post("/api/ai/categorize", json={**BODY, "user_id": "u3"}).status_code == 200
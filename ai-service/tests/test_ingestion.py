@@ -0,0 +1,93 @@
+import json
+import pytest
+
+from app.services.ingestion import StreamingIngestor
+
+NDJSON = {"content-type": "application/x-ndjson"}
+
+def ndjson(*rows) -> bytes:
+    return "\n".join(json.dumps(row) for row in rows).encode("utf-8")
+
+def row(**fields):
+    return {"id": 1, "monto": 10, "fecha": "2024-05-01", "tipo": "gasto", "categoria": "Alimentación", **fields}
+
+@pytest.mark.parametrize("bad", [
+    row(id=[2]),
+    row(id=True),
+    row(categoria=["a"]),
+    row(descripcion={"a": 1}),
+    row(tipo=["gasto"]),
+    row(tipo="otro"),
+    row(monto="nan"),
+    row(monto="abc"),
+    row(fecha="2024-02-30"),
+    row(fecha="05/01/2024"),
+])
+def test_invalid_rows_are_rejected_and_the_rest_ingested(bad):
+    ingestor = StreamingIngestor("ndjson")
+    ingestor.feed(ndjson(row(id=1), bad, row(id=3, monto=5)))
+    summary = ingestor.finish()
+
+    assert ingestor.ingested == 2
+    assert ingestor.rejected == 1
+    assert ingestor.errors[0].startswith("línea 2:")
+    assert summary.total_gastos == 15
+
+def test_rows_split_across_chunks():
+    data = ndjson(*(row(id=i) for i in range(50)))
+    ingestor = StreamingIngestor("ndjson")
+    for start in range(0, len(data), 7):
+        ingestor.feed(data[start:start + 7])
+    assert ingestor.finish().num_gastos == 50
+    assert ingestor.rejected == 0
+
+def test_csv_quoted_multiline_field():
+    ingestor = StreamingIngestor("csv")
+    ingestor.feed(b'monto;fecha;tipo;descripcion\n10;2024-05-01;gasto;"dos\nlineas"\n5;2024-05-02;gasto;otra\n')
+    summary = ingestor.finish()
+    assert ingestor.ingested == 2
+    assert summary.total_gastos == 15
+
+def test_csv_unclosed_quote_is_capped(monkeypatch):
+    from app.services import ingestion
+    monkeypatch.setattr(ingestion, "INGEST_MAX_LINE_BYTES", 200)
+    lines = ["monto,fecha,tipo,descripcion", '10,2024-05-01,gasto,"sin cerrar']
+    lines += [f"{i},2024-05-01,gasto,fila" for i in range(1, 40)]
+    ingestor = StreamingIngestor("csv")
+    ingestor.feed("\n".join(lines).encode("utf-8"))
+    ingestor.finish()
+
+    assert ingestor.rejected == 1
+    assert "comillas" in ingestor.errors[0]
+    # La ingesta sigue después del registro rechazado
+    assert ingestor.ingested > 30
+
+def test_bad_rows_answer_200_with_the_rejections(client):
+    response = client.post("/api/ai/summary/u1/ingest", content=ndjson(row(), row(id=[2])), headers=NDJSON)
+    assert response.status_code == 200
+    assert response.json()["rejected"] == 1
+    assert response.json()["summary"]["num_transacciones"] == 1
+
+def test_failed_append_leaves_the_stored_summary_unchanged(client, monkeypatch):
+    from app.routes import ai_routes
+
+    class FailsOnSecondChunk(StreamingIngestor):
+        def feed(self, chunk: bytes):
+            if self.bytes:
+                raise ValueError("flujo cortado")
+            super().feed(chunk)
+
+    client.post("/api/ai/summary/u1/ingest", content=ndjson(row()), headers=NDJSON)
+    monkeypatch.setattr(ai_routes, "StreamingIngestor", FailsOnSecondChunk)
+
+    chunks = iter([ndjson(row(id=2, monto=100)) + b"\n", ndjson(row(id=3, monto=100))])
+    response = client.post("/api/ai/summary/u1/ingest?mode=append", content=chunks, headers=NDJSON)
+
+    assert response.status_code == 400
+    assert client.get("/api/ai/summary/u1").json()["total_gastos"] == 10
+
+def test_append_adds_to_the_stored_summary(client):
+    client.post("/api/ai/summary/u1/ingest", content=ndjson(row()), headers=NDJSON)
+    response = client.post("/api/ai/summary/u1/ingest?mode=append", content=ndjson(row(id=2, monto=4)), headers=NDJSON)
+    assert response.json()["summary"]["total_gastos"] == 14
+    assert response.json()["summary"]["num_transacciones"] == 2
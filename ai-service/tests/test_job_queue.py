@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+
+from app.services import job_queue
+from app.services.job_queue import IdempotencyConflict, JobManager, JobStore
+
+def run(coro):
+    return asyncio.run(coro)
+
+def make_manager(handler=None):
+    calls = []
+
+    async def default_handler(payload):
+        calls.append(payload)
+        return {"echo": payload["n"]}
+
+    manager = JobManager({"echo": handler or default_handler}, store=JobStore(":memory:"), workers=1)
+    return manager, calls
+
+def test_same_idempotency_key_reuses_the_job():
+    async def scenario():
+        manager, calls = make_manager()
+        first = manager.submit("echo", {"n": 1}, "clave")
+        done = await manager.wait(first["id"], 2)
+        again = manager.submit("echo", {"n": 1}, "clave")
+        await manager.close()
+        return first, done, again, calls
+
+    first, done, again, calls = run(scenario())
+    assert done["status"] == "succeeded"
+    assert done["result"] == {"echo": 1}
+    assert again["id"] == first["id"]
+    assert again["reused"] is True
+    assert calls == [{"n": 1}]
+
+def test_idempotency_key_with_another_payload_conflicts():
+    async def scenario():
+        manager, _ = make_manager()
+        manager.submit("echo", {"n": 1}, "clave")
+        try:
+            with pytest.raises(IdempotencyConflict):
+                manager.submit("echo", {"n": 2}, "clave")
+        finally:
+            await manager.close()
+
+    run(scenario())
+
+def test_failed_job_runs_again_with_the_same_key():
+    attempts = []
+
+    async def flaky(payload):
+        attempts.append(payload)
+        if len(attempts) == 1:
+            raise ValueError("falla la primera vez")
+        return "ok"
+
+    async def scenario():
+        manager, _ = make_manager(flaky)
+        first = await manager.wait(manager.submit("echo", {"n": 1}, "clave")["id"], 2)
+        second = await manager.wait(manager.submit("echo", {"n": 1}, "clave")["id"], 2)
+        await manager.close()
+        return first, second
+
+    first, second = run(scenario())
+    assert first["status"] == "failed"
+    assert second["status"] == "succeeded"
+    assert second["id"] != first["id"]
+    assert len(attempts) == 2
+
+def test_on_enqueue_is_skipped_when_the_job_is_reused():
+    async def scenario():
+        manager, _ = make_manager()
+        charged = []
+        job = manager.submit("echo", {"n": 1}, "clave", on_enqueue=lambda: charged.append(1))
+        await manager.wait(job["id"], 2)
+        manager.submit("echo", {"n": 1}, "clave", on_enqueue=lambda: charged.append(1))
+        await manager.close()
+        return charged
+
+    assert run(scenario()) == [1]
+
+def test_unfinished_job_from_a_previous_boot_is_failed(tmp_path, monkeypatch):
+    path = str(tmp_path / "jobs.db")
+    job = JobStore(path).create("echo", {"n": 1}, "hash", None)
+
+    # Mismo pid, otro arranque (p. ej. pid 1 en un contenedor reiniciado)
+    monkeypatch.setattr(job_queue, "BOOT_ID", "otro-arranque")
+    recovered = JobStore(path).get(job["id"])
+
+    assert recovered["status"] == "failed"
+    assert recovered["status_code"] == 503
+
+def test_unfinished_job_from_this_boot_stays_queued(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job = store.create("echo", {"n": 1}, "hash", None)
+    assert store.get(job["id"])["status"] == "queued"
+
+def test_resubmitting_a_finished_job_does_not_use_quota(client, monkeypatch):
+    from app.routes import ai_routes
+    from app.services.admission import AdmissionController
+
+    monkeypatch.setattr(ai_routes, "_admission", AdmissionController(user_rate=1, user_burst=1))
+    body = {"transactions": [{"descripcion": "oxxo", "monto": 10, "tipo": "gasto"}]}
+    headers = {"Idempotency-Key": "clave", "X-User-Id": "u1"}
+
+    codes = [client.post("/api/ai/jobs/categorize-batch", json=body, headers=headers).status_code for _ in range(5)]
+    assert codes == [202] * 5
+
+    # Un trabajo nuevo sí descuenta, y la cuota ya se usó
+    other = client.post("/api/ai/jobs/categorize-batch", json=body, headers={"Idempotency-Key": "otra", "X-User-Id": "u1"})
+    assert other.status_code == 429
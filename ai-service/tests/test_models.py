@@ -0,0 +1,25 @@
+import pytest
+from pydantic import ValidationError
+
+from app.models import Budget, Transaction
+
+def budget(mes):
+    return Budget(categoria="Alimentación", monto_limite=100, mes=mes)
+
+@pytest.mark.parametrize("mes", ["2024-01", "2024-12", "2024-12-31"])
+def test_budget_month_accepted(mes):
+    assert budget(mes).mes == mes
+
+@pytest.mark.parametrize("mes", ["2024-123", "2024-01garbage", "2024-13", "2024-00", "2024-1", "x2024-01", "2024-01-1"])
+def test_budget_month_rejected(mes):
+    with pytest.raises(ValidationError):
+        budget(mes)
+
+@pytest.mark.parametrize("fecha", ["2024-05", "2024-05-01", "2024-05-01T10:00:00", "2024-02-29"])
+def test_transaction_date_accepted(fecha):
+    assert Transaction(monto=1, fecha=fecha, tipo="gasto").fecha == fecha
+
+@pytest.mark.parametrize("fecha", ["2023-02-29", "2024-13-01", "01/05/2024", ""])
+def test_transaction_date_rejected(fecha):
+    with pytest.raises(ValidationError):
+        Transaction(monto=1, fecha=fecha, tipo="gasto")
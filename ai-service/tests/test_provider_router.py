@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+
+from app.services import provider_router
+from app.services.fake_provider import FakeProvider
+from app.services.provider_router import CircuitBreaker, ProviderRouter
+
+MESSAGES = [{"role": "user", "content": "hola"}]
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(provider_router.time, "monotonic", clock)
+    return clock
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failures=3, cooldown=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.times_opened == 1
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failures=2, cooldown=10)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+def test_breaker_is_half_open_after_the_cooldown_and_closes_on_success(clock):
+    breaker = CircuitBreaker(failures=1, cooldown=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def test_failure_while_half_open_reopens(clock):
+    breaker = CircuitBreaker(failures=3, cooldown=10)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 10
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.times_opened == 2
+    clock.now += 9
+    assert breaker.state == "open"
+
+def make_provider(name, error_rate):
+    provider = FakeProvider(latency_ms=0, jitter_ms=0, distribution="constant", error_rate=error_rate, seed=1)
+    provider.name = name
+    return provider
+
+def test_router_fails_over_and_stops_calling_an_open_provider(monkeypatch):
+    monkeypatch.setattr(provider_router, "AI_MAX_RETRIES", 0)
+    monkeypatch.setattr(provider_router, "AI_HEDGE_ENABLED", False)
+    broken, healthy = make_provider("primario", 1.0), make_provider("respaldo", 0.0)
+    router = ProviderRouter([broken, healthy], primary="primario")
+    router.breakers["primario"] = CircuitBreaker(failures=1, cooldown=60)
+
+    async def scenario():
+        return [await router.complete(MESSAGES, 0.3, 100) for _ in range(4)]
+
+    assert all(asyncio.run(scenario()))
+    assert broken.calls == 1
+    assert healthy.calls == 4
+    assert router.breakers["primario"].state == "open"
+    assert router.ordered()[0] is healthy
+
+def test_router_raises_when_every_provider_fails(monkeypatch):
+    monkeypatch.setattr(provider_router, "AI_MAX_RETRIES", 0)
+    monkeypatch.setattr(provider_router, "AI_HEDGE_ENABLED", False)
+    router = ProviderRouter([make_provider("a", 1.0), make_provider("b", 1.0)], primary="a")
+
+    with pytest.raises(Exception, match="a: error simulado; b: error simulado"):
+        asyncio.run(router.complete(MESSAGES, 0.3, 100))
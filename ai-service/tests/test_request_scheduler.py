@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+
+from app.services.request_scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, RequestScheduler
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_batch_results_go_to_their_callers():
+    handled = []
+
+    async def handler(items):
+        handled.append(list(items))
+        await asyncio.sleep(0)
+        return [item * 10 for item in items]
+
+    async def scenario():
+        scheduler = RequestScheduler(rate=0, batch_window_ms=20)
+        return await asyncio.gather(*(scheduler.batch("k", i, handler, max_size=10) for i in range(5)))
+
+    assert run(scenario()) == [0, 10, 20, 30, 40]
+    assert handled == [[0, 1, 2, 3, 4]]
+
+def test_batch_flushes_at_max_size():
+    async def handler(items):
+        return list(items)
+
+    async def scenario():
+        scheduler = RequestScheduler(rate=0, batch_window_ms=20)
+        results = await asyncio.gather(*(scheduler.batch("k", i, handler, max_size=2) for i in range(5)))
+        return results, scheduler.batches
+
+    results, batches = run(scenario())
+    assert results == [0, 1, 2, 3, 4]
+    assert batches == 3
+
+def test_batch_result_length_mismatch_fails_every_caller():
+    async def handler(items):
+        return items[:-1]
+
+    async def scenario():
+        scheduler = RequestScheduler(rate=0, batch_window_ms=5)
+        calls = [scheduler.batch("k", i, handler, max_size=10) for i in range(3)]
+        return await asyncio.wait_for(asyncio.gather(*calls, return_exceptions=True), 1)
+
+    results = run(scenario())
+    assert len(results) == 3
+    assert all(isinstance(r, Exception) and "2 resultados para 3" in str(r) for r in results)
+
+def test_batch_handler_error_is_shared():
+    async def handler(items):
+        raise ValueError("falló el modelo")
+
+    async def scenario():
+        scheduler = RequestScheduler(rate=0, batch_window_ms=5)
+        calls = [scheduler.batch("k", i, handler, max_size=10) for i in range(2)]
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    assert [str(r) for r in run(scenario())] == ["falló el modelo"] * 2
+
+def test_coalesced_call_survives_the_first_caller_cancelling():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "ok"
+
+    async def scenario():
+        scheduler = RequestScheduler(rate=0)
+        leader = asyncio.ensure_future(scheduler.coalesce("k", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(scheduler.coalesce("k", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower, scheduler.coalesced
+
+    assert run(scenario()) == ("ok", 1)
+    assert calls == [1]
+
+def test_interactive_requests_are_admitted_first():
+    order = []
+
+    async def scenario():
+        scheduler = RequestScheduler(rate=1000, burst=1)
+        # Consumir el token inicial para que las siguientes esperen en la cola
+        await scheduler.admit(PRIORITY_BACKGROUND)
+
+        async def admit(priority, name):
+            await scheduler.admit(priority)
+            order.append(name)
+
+        waiting = [
+            asyncio.ensure_future(admit(PRIORITY_BACKGROUND, "fondo")),
+            asyncio.ensure_future(admit(PRIORITY_INTERACTIVE, "chat")),
+        ]
+        await asyncio.gather(*waiting)
+        await scheduler.close()
+
+    run(scenario())
+    assert order == ["chat", "fondo"]
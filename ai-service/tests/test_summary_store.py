@@ -0,0 +1,71 @@
+from app.models import Transaction
+from app.services.summary_store import SummaryStore, UserFinancialSummary
+
+def gasto(id, monto, fecha="2024-05-01", categoria="Alimentación"):
+    return Transaction(id=id, monto=monto, fecha=fecha, tipo="gasto", categoria=categoria)
+
+def ingreso(id, monto, fecha="2024-05-01", fuente="Salario"):
+    return Transaction(id=id, monto=monto, fecha=fecha, tipo="ingreso", fuente=fuente)
+
+def test_removing_a_transaction_never_added_is_ignored():
+    summary = UserFinancialSummary()
+    summary.apply(added=[gasto(1, 10), ingreso(2, 100)])
+
+    ignored = summary.apply(removed=[
+        gasto(3, 50, fecha="2024-06-01"),
+        gasto(4, 50, categoria="Transporte"),
+        ingreso(5, 80, fuente="Bono"),
+    ])
+
+    assert ignored == 3
+    assert summary.total_gastos == 10
+    assert summary.total_ingresos == 100
+    assert summary.num_gastos == 1
+    assert summary.to_dict()["mensual"] == {"2024-05": {"gastos": 10, "ingresos": 100}}
+
+def test_removing_an_added_transaction():
+    summary = UserFinancialSummary()
+    summary.apply(added=[gasto(1, 10), gasto(2, 5)])
+
+    assert summary.apply(removed=[gasto(1, 10)]) == 0
+    assert summary.total_gastos == 5
+    assert [t.id for t in summary.recent_gastos] == [2]
+
+def test_empty_month_is_pruned():
+    summary = UserFinancialSummary()
+    summary.apply(added=[gasto(1, 10, fecha="2024-04-01"), gasto(2, 5)])
+    summary.apply(removed=[gasto(1, 10, fecha="2024-04-01")])
+
+    assert list(summary.to_dict()["mensual"]) == ["2024-05"]
+    assert summary.to_dict()["gastos_por_categoria"] == {"Alimentación": 5}
+
+def test_month_with_income_left_is_kept():
+    summary = UserFinancialSummary()
+    summary.apply(added=[gasto(1, 10), ingreso(2, 100)])
+    summary.apply(removed=[gasto(1, 10)])
+
+    assert summary.to_dict()["mensual"] == {"2024-05": {"gastos": 0, "ingresos": 100}}
+
+def test_merge_matches_applying_everything():
+    first, second = UserFinancialSummary(), UserFinancialSummary()
+    first.apply(added=[gasto(1, 10), ingreso(2, 100)])
+    second.apply(added=[gasto(3, 7, fecha="2024-06-01"), gasto(4, 3)])
+    first.merge(second)
+
+    expected = UserFinancialSummary()
+    expected.apply(added=[gasto(1, 10), ingreso(2, 100), gasto(3, 7, fecha="2024-06-01"), gasto(4, 3)])
+    assert first.to_dict() == expected.to_dict()
+
+    # Lo combinado también se puede eliminar
+    assert first.apply(removed=[gasto(3, 7, fecha="2024-06-01")]) == 0
+    assert "2024-06" not in first.to_dict()["mensual"]
+
+def test_store_evicts_the_least_recently_used_user():
+    store = SummaryStore(max_users=2)
+    store.apply_delta("a", [gasto(1, 1)], [])
+    store.apply_delta("b", [gasto(1, 1)], [])
+    store.get("a")
+    store.apply_delta("c", [gasto(1, 1)], [])
+
+    assert store.get("b") is None
+    assert store.get("a") is not None